@@ -23,3 +23,6 @@ HERO_MAP = {
 RADIANT_TEAM = 0 # Team side 0
 DIRE_TEAM = 1    # Team side 1
 
+
+# BP 图片批量渲染 (Excel 导出) 的进程数，0 = 自动 (CPU 核数 - 1)
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "0"))
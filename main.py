@@ -1,6 +1,10 @@
+import threading
 import streamlit as st
 from database import init_db
-from views import input_page, match_list, analysis_page, settings_page, player_manager, patch_page, expert_mode
+from services.hero_assets import sync_hero_assets
+from services.hero_manager import HeroManager
+from views import input_page, match_list, analysis_page, meta_page, draft_page, settings_page, player_manager, patch_page, expert_mode
+from views.components import ATLAS_VARIANTS
 
 # Page Config
 st.set_page_config(
@@ -15,6 +19,22 @@ try:
 except Exception as e:
     st.error(f"数据库初始化失败: {e}")
 
+def _sync_hero_assets():
+    try:
+        stats = sync_hero_assets(HeroManager().get_all_heroes(), variants=ATLAS_VARIANTS)
+        print(f"Hero assets: {stats}")
+    except Exception as e:
+        print(f"Hero asset sync failed: {e}")
+
+@st.cache_resource(show_spinner=False)
+def start_hero_asset_sync():
+    """Once per process: fetch missing / changed hero portraits and icons in the background, ahead of rendering."""
+    thread = threading.Thread(target=_sync_hero_assets, name="hero-asset-sync", daemon=True)
+    thread.start()
+    return thread
+
+start_hero_asset_sync()
+
 def main():
     st.sidebar.title("Sentry 战术分析")
     
@@ -22,6 +42,8 @@ def main():
         "数据录入": input_page,
         "比赛列表": match_list,
         "统计分析": analysis_page,
+        "版本生态": meta_page,
+        "实时 BP": draft_page,
         "选手管理": player_manager,
         "版本管理": patch_page,
         "专家模式": expert_mode,
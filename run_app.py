@@ -4,6 +4,7 @@ import shutil
 import time
 import webbrowser
 import threading
+import multiprocessing
 
 def resolve_path(path):
     if getattr(sys, 'frozen', False):
@@ -25,6 +26,9 @@ def open_browser():
         print(f"请手动访问: {url}")
 
 if __name__ == "__main__":
+    # Excel export renders BP images in spawned worker processes (services/render_pool.py);
+    # in the frozen exe those workers re-launch this executable and must stop here
+    multiprocessing.freeze_support()
     print("正在初始化程序...")
     
     # Ensure CWD is set to the directory of the executable for persistence
@@ -73,6 +77,8 @@ if __name__ == "__main__":
         # Issue with st.run in frozen env: it might not auto-open correctly.
         # Let's try headless=true and use webbrowser module manually in a thread.
         "--server.port=8501",
+        # BP images / hero thumbnails are served from ./static (see views/components.py)
+        "--server.enableStaticServing=true",
     ]
     
     print("正在启动 Streamlit 服务...")
@@ -0,0 +1,20 @@
+import os
+import sys
+
+# Add project root to path to allow imports
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+os.chdir(BASE_DIR)
+
+from services.hero_atlas import ATLAS_DIR, build_hero_atlas
+from views.components import ATLAS_VARIANTS
+
+def main():
+    print(f"Packing hero portraits into {ATLAS_DIR} ...")
+    count = build_hero_atlas(ATLAS_VARIANTS)
+    for w, h, is_ban in ATLAS_VARIANTS:
+        print(f" - {w}x{h}{' (ban)' if is_ban else ''}")
+    print(f"Success! Packed {count} heroes.")
+
+if __name__ == "__main__":
+    main()
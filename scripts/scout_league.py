@@ -0,0 +1,79 @@
+import argparse
+import os
+import sys
+from datetime import datetime
+
+# Add project root to path to allow imports
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from database import SessionLocal
+from services.patch_manager import PatchManager
+from services.scouting import run_scouting, teams_in_league
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量生成联赛 / 多支战队的侦察报告 (多进程)")
+    parser.add_argument("--league", type=int, action="append", default=[], help="联赛 ID，可重复；未指定 --team 时取联赛内全部战队")
+    parser.add_argument("--team", action="append", default=[], help="战队名，可重复")
+    parser.add_argument("--patch", help="只统计该版本开始之后的比赛")
+    parser.add_argument("--since", help="起始日期 YYYY-MM-DD (优先于 --patch)")
+    parser.add_argument("--all-leagues", action="store_true", help="统计战队在所有联赛的比赛 (默认只统计 --league 指定的联赛)")
+    parser.add_argument("--workers", type=int, default=None, help="进程数 (默认 CPU 核数)")
+    parser.add_argument("--label", help="输出目录名 (默认按联赛 / 日期生成)")
+    parser.add_argument("--force", action="store_true", help="忽略已有报告，全部重新计算")
+    args = parser.parse_args()
+
+    # DATA_DIR / sqlite paths are relative to the project root
+    os.chdir(BASE_DIR)
+
+    start_date = None
+    if args.since:
+        start_date = datetime.strptime(args.since, "%Y-%m-%d").date()
+    elif args.patch:
+        start_date = PatchManager().get_patch_date(args.patch)
+        if not start_date:
+            print(f"Unknown patch: {args.patch}")
+            return
+
+    teams = list(args.team)
+    if not teams and args.league:
+        db = SessionLocal()
+        try:
+            for league_id in args.league:
+                teams.extend(t for t in teams_in_league(db, league_id) if t not in teams)
+        finally:
+            db.close()
+
+    if not teams:
+        print("No teams to scout. Use --league and/or --team.")
+        return
+
+    league_ids = [] if args.all_leagues else args.league
+    label = args.label or "_".join(
+        [f"league{l}" for l in args.league] or ["teams"]
+    ) + f"_{datetime.now().strftime('%Y%m%d')}"
+
+    print(f"Scouting {len(teams)} teams...")
+
+    def on_done(result):
+        if "error" in result:
+            print(f"  [FAIL] {result['team']}: {result['error']}")
+        else:
+            state = "cached" if result["cached"] else "done"
+            print(f"  [{state}] {result['team']} ({result['games']} matches)")
+
+    out_dir = run_scouting(
+        teams,
+        label,
+        start_date=start_date,
+        league_ids=league_ids,
+        workers=args.workers,
+        force=args.force,
+        on_done=on_done
+    )
+    print(f"Reports written to {out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+import os
+import sys
+
+# Add project root to path to allow imports
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+os.chdir(BASE_DIR)
+
+from services.hero_assets import sync_hero_assets
+from services.hero_manager import HeroManager
+from views.components import ATLAS_VARIANTS
+
+def main():
+    force = "--force" in sys.argv[1:]
+    hm = HeroManager()
+    heroes = hm.get_all_heroes()
+    print(f"Checking assets for {len(heroes)} heroes{' (forced re-download)' if force else ''} ...")
+    stats = sync_hero_assets(heroes, force=force, variants=ATLAS_VARIANTS)
+    print(f"Up to date: {stats['up_to_date']}, downloaded: {stats['downloaded']}, failed: {stats['failed']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+import threading
+from collections import OrderedDict
+from typing import Optional, Sequence, Tuple
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+Color = Tuple[int, int, int, int]
+
+MAX_CACHED_TEXT = 2048
+
+
+def _div255(x: np.ndarray) -> np.ndarray:
+    """round(x / 255) for uint16 x <= 255 * 255, without an integer division (in place)"""
+    x += 128
+    x += x >> 8
+    x >>= 8
+    return x
+
+
+def _blend(dst: np.ndarray, src: np.ndarray, alpha: np.ndarray):
+    """dst = src * alpha + dst * (1 - alpha)，与 PIL paste(im, box, mask) 一致 (四个通道都混合)，原地修改"""
+    a = alpha.astype(np.uint16)[..., None]
+    dst[...] = _div255(src.astype(np.uint16) * a + dst.astype(np.uint16) * (255 - a))
+
+
+class TemplateLayer:
+    """
+    BP 模板的预计算图层: 模板 alpha 作为遮罩，预乘后的模板像素，以及 "没有任何英雄" 时的整张底图。
+    合成时先复制底图，再只重算放了英雄的槽位: out = under * (255 - a) + tpl * a，
+    其中 under (英雄按自身 alpha 铺在背景色上) 按英雄缓存。
+    """
+
+    def __init__(self, template: np.ndarray, background: Color, max_cached_heroes: int = 1024):
+        self.shape = template.shape
+        alpha = template[..., 3:4].astype(np.uint16)
+        # Expanded to 4 channels: same-shape products are much faster than broadcasting a trailing 1
+        self.inv_alpha = np.ascontiguousarray(np.broadcast_to(255 - alpha, self.shape))
+        self.premult = template.astype(np.uint16) * alpha         # <= 255 * 255
+        self.background = np.array(background, dtype=np.uint16)
+        self.base = _div255(self.background * self.inv_alpha + self.premult).astype(np.uint8)
+        self._max_cached = max_cached_heroes
+        self._lock = threading.Lock()
+        self._under: "OrderedDict[object, np.ndarray]" = OrderedDict()
+
+    def new_canvas(self) -> np.ndarray:
+        return np.empty(self.shape, dtype=np.uint8)
+
+    def _flatten(self, key, pixels: np.ndarray) -> np.ndarray:
+        """英雄像素按自身 alpha 铺到背景色上 (PIL paste 语义)，按 key 缓存"""
+        with self._lock:
+            under = self._under.get(key)
+            if under is not None:
+                self._under.move_to_end(key)
+                return under
+        ha = np.repeat(pixels[..., 3:4], 4, axis=2).astype(np.uint16)
+        under = _div255(pixels * ha + self.background * (255 - ha)).astype(np.uint8)
+        with self._lock:
+            self._under[key] = under
+            while len(self._under) > self._max_cached:
+                self._under.popitem(last=False)
+        return under
+
+    def clear_cache(self):
+        with self._lock:
+            self._under.clear()
+
+    def compose(self, slots: Sequence[Tuple[int, int, object, np.ndarray]], out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        slots: [(x, y, key, RGBA 像素)]，画在模板下方，槽位之间互不重叠；key 唯一标识像素内容 (用于缓存)。
+        out 给定时在其上原地合成 (复用画布)，否则新建。
+        """
+        if out is None:
+            out = self.new_canvas()
+        np.copyto(out, self.base)
+        for x, y, key, pixels in slots:
+            h, w = pixels.shape[:2]
+            region = out[y:y + h, x:x + w]
+            h, w = region.shape[:2]
+            under = self._flatten(key, pixels)[:h, :w]
+            # Template over the hero: the second PIL paste, restricted to this slot
+            acc = under * self.inv_alpha[y:y + h, x:x + w]
+            acc += self.premult[y:y + h, x:x + w]
+            region[...] = _div255(acc)
+        return out
+
+
+class TextLayer:
+    """一段文字光栅化后的覆盖率遮罩 (L) 及其相对锚点的偏移"""
+
+    def __init__(self, text: str, font: ImageFont.ImageFont, anchor: Optional[str] = None):
+        probe = ImageDraw.Draw(Image.new("L", (1, 1)))
+        x0, y0, x1, y1 = probe.textbbox((0, 0), text, font=font, anchor=anchor)
+        self.offset = (x0, y0)
+        mask = Image.new("L", (max(x1 - x0, 1), max(y1 - y0, 1)), 0)
+        ImageDraw.Draw(mask).text((-x0, -y0), text, fill=255, font=font, anchor=anchor)
+        self.mask = np.asarray(mask)
+
+    def draw(self, canvas: np.ndarray, xy: Tuple[int, int], color: Color):
+        """以 color 画到 canvas 上 (按覆盖率混合)，超出画布部分裁掉"""
+        x, y = xy[0] + self.offset[0], xy[1] + self.offset[1]
+        h, w = self.mask.shape
+        cx0, cy0 = max(x, 0), max(y, 0)
+        cx1, cy1 = min(x + w, canvas.shape[1]), min(y + h, canvas.shape[0])
+        if cx0 >= cx1 or cy0 >= cy1:
+            return
+        mask = self.mask[cy0 - y:cy1 - y, cx0 - x:cx1 - x]
+        region = canvas[cy0:cy1, cx0:cx1]
+        _blend(region, np.broadcast_to(np.array(color, dtype=np.uint8), region.shape), mask)
+
+
+_text_lock = threading.Lock()
+_text_layers: "OrderedDict[Tuple[str, int, Optional[str]], TextLayer]" = OrderedDict()
+
+
+def text_layer(text: str, font: ImageFont.ImageFont, anchor: Optional[str] = None) -> TextLayer:
+    """按 (文字, 字体, 锚点) 缓存的文字图层，同一队名只光栅化一次"""
+    key = (text, id(font), anchor)
+    with _text_lock:
+        layer = _text_layers.get(key)
+        if layer is not None:
+            _text_layers.move_to_end(key)
+            return layer
+    layer = TextLayer(text, font, anchor)
+    with _text_lock:
+        _text_layers[key] = layer
+        while len(_text_layers) > MAX_CACHED_TEXT:
+            _text_layers.popitem(last=False)
+    return layer
+
+
+def blit(canvas: np.ndarray, x: int, y: int, pixels: np.ndarray):
+    """不带遮罩的整块复制 (PIL paste(im, box) 语义)，超出画布部分裁掉"""
+    h, w = pixels.shape[:2]
+    region = canvas[y:y + h, x:x + w]
+    region[...] = pixels[:region.shape[0], :region.shape[1]]
+
+
+_canvas_local = threading.local()
+
+
+def scratch_canvas(shape: Tuple[int, ...]) -> np.ndarray:
+    """线程内复用的画布 (内容不保证)，只用于合成后立即编码的场景"""
+    canvases = getattr(_canvas_local, "canvases", None)
+    if canvases is None:
+        canvases = _canvas_local.canvases = {}
+    canvas = canvases.get(shape)
+    if canvas is None:
+        canvas = canvases[shape] = np.empty(shape, dtype=np.uint8)
+    return canvas
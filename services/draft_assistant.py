@@ -0,0 +1,158 @@
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from sqlalchemy.orm import Session
+from services.hero_matrix import HERO_CAPACITY, SYN_GAMES, SYN_WINS, VS_GAMES, VS_WINS, get_hero_matrix
+from services.team_stats import TeamMatchFilter, TeamStatsAccumulator, iter_match_drafts, player_display_name, resolve_main_players
+
+# Pseudo-games pulling small samples towards 50% in partner / counter scores
+PRIOR_GAMES = 10
+
+# Score weights
+PICK_WEIGHTS = {"partner": 1.0, "counter": 1.0, "history": 0.3, "comfort": 0.1}
+BAN_WEIGHTS = {"opp_history": 0.5, "opp_comfort": 0.1, "threat": 1.0, "opp_partner": 1.0}
+
+
+def _smoothed_edge(games: np.ndarray, wins: np.ndarray) -> np.ndarray:
+    """平滑后的胜率 - 50%"""
+    return (wins + PRIOR_GAMES * 0.5) / (games + PRIOR_GAMES) - 0.5
+
+
+@dataclass
+class TeamProfile:
+    """一支战队在所选时间范围内按英雄展开的历史 (下标 = hero_id)"""
+    team_name: str
+    games: int
+    picks: np.ndarray
+    pick_wins: np.ndarray
+    bans: np.ndarray
+    comfort: np.ndarray                  # 主力选手在该英雄上的最多场次
+    comfort_player: Dict[int, str]       # hero_id -> 选手名
+
+
+def build_team_profile(db: Session, team_name: str, start_date: Optional[date]) -> TeamProfile:
+    stats = TeamStatsAccumulator(recent_limit=0)
+    stats.add_all(iter_match_drafts(db, TeamMatchFilter(team_name, start_date).query(db)))
+
+    def dense(counts: Dict[int, int]) -> np.ndarray:
+        arr = np.zeros(HERO_CAPACITY, dtype=np.float64)
+        for hid, cnt in counts.items():
+            if 0 < hid < HERO_CAPACITY:
+                arr[hid] = cnt
+        return arr
+
+    comfort = np.zeros(HERO_CAPACITY, dtype=np.float64)
+    comfort_player: Dict[int, str] = {}
+    for acc_id in resolve_main_players(stats, db, team_name).values():
+        name = player_display_name(db, acc_id)
+        for hid, s in stats.player_heroes.get(acc_id, {}).items():
+            if 0 < hid < HERO_CAPACITY and s['picks'] > comfort[hid]:
+                comfort[hid] = s['picks']
+                comfort_player[hid] = name
+
+    return TeamProfile(
+        team_name=team_name,
+        games=stats.total,
+        picks=dense(stats.pick_counts),
+        pick_wins=dense(stats.pick_wins),
+        bans=dense(stats.own_ban_counts),
+        comfort=comfort,
+        comfort_player=comfort_player
+    )
+
+
+@dataclass
+class DraftContext:
+    """
+    实时 BP 助手的全部预计算数据，页面打开 (或切换战队 / 版本) 时构建一次。
+    之后每一手只做 O(英雄数) 的向量运算。
+    """
+    mine: TeamProfile
+    opp: TeamProfile
+    patches: Tuple[str, ...]
+    syn_edge: np.ndarray    # (H, H) 同队平滑胜率 - 50%
+    vs_edge: np.ndarray     # (H, H) [a, b]: a 对阵 b 的平滑胜率 - 50%
+    hero_mask: np.ndarray   # (H,) bool, 已知英雄
+
+
+def build_draft_context(
+    db: Session,
+    my_team: str,
+    opp_team: str,
+    start_date: Optional[date],
+    patches: Sequence[str],
+    hero_ids: Iterable[int]
+) -> DraftContext:
+    dense = get_hero_matrix().dense(patches or None).astype(np.float64)
+    mask = np.zeros(HERO_CAPACITY, dtype=bool)
+    for hid in hero_ids:
+        if 0 < hid < HERO_CAPACITY:
+            mask[hid] = True
+    return DraftContext(
+        mine=build_team_profile(db, my_team, start_date),
+        opp=build_team_profile(db, opp_team, start_date),
+        patches=tuple(patches),
+        syn_edge=_smoothed_edge(dense[SYN_GAMES], dense[SYN_WINS]),
+        vs_edge=_smoothed_edge(dense[VS_GAMES], dense[VS_WINS]),
+        hero_mask=mask
+    )
+
+
+@dataclass
+class Recommendations:
+    hero_ids: List[int]             # 按综合分排序
+    score: np.ndarray               # 以下数组下标均为 hero_id
+    partner: np.ndarray
+    counter: np.ndarray
+    threat: np.ndarray
+    opp_partner: np.ndarray
+
+
+def recommend(
+    ctx: DraftContext,
+    my_picks: Sequence[int],
+    opp_picks: Sequence[int],
+    used: Iterable[int],
+    is_pick: bool,
+    n: int = 20
+) -> Recommendations:
+    """
+    我方当前一手的候选英雄。is_pick=True 按 "选" 打分 (搭档 + 克制 + 本队历史 + 熟练度)，
+    否则按 "禁" 打分 (对手历史 + 对手熟练度 + 克制我方阵容 + 与对手阵容的搭配)。
+    """
+    my_idx = [h for h in my_picks if 0 < h < HERO_CAPACITY]
+    opp_idx = [h for h in opp_picks if 0 < h < HERO_CAPACITY]
+    zeros = np.zeros(HERO_CAPACITY)
+
+    partner = ctx.syn_edge[:, my_idx].mean(axis=1) if my_idx else zeros
+    counter = ctx.vs_edge[:, opp_idx].mean(axis=1) if opp_idx else zeros
+    threat = ctx.vs_edge[:, my_idx].mean(axis=1) if my_idx else zeros
+    opp_partner = ctx.syn_edge[:, opp_idx].mean(axis=1) if opp_idx else zeros
+
+    if is_pick:
+        w = PICK_WEIGHTS
+        history = ctx.mine.picks / max(ctx.mine.games, 1)
+        score = (w["partner"] * partner + w["counter"] * counter
+                 + w["history"] * history + w["comfort"] * np.log1p(ctx.mine.comfort))
+    else:
+        w = BAN_WEIGHTS
+        opp_history = ctx.opp.picks / max(ctx.opp.games, 1)
+        score = (w["opp_history"] * opp_history + w["opp_comfort"] * np.log1p(ctx.opp.comfort)
+                 + w["threat"] * threat + w["opp_partner"] * opp_partner)
+
+    available = ctx.hero_mask.copy()
+    for hid in used:
+        if 0 < hid < HERO_CAPACITY:
+            available[hid] = False
+    masked = np.where(available, score, -np.inf)
+    top = np.argsort(masked)[::-1][:n]
+
+    return Recommendations(
+        hero_ids=[int(h) for h in top if available[h]],
+        score=score,
+        partner=partner,
+        counter=counter,
+        threat=threat,
+        opp_partner=opp_partner
+    )
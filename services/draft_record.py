@@ -0,0 +1,229 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from services.match_events import get_data_version
+
+
+# Captain's Mode (7.35+) turn order, 1-based, same sequence as the BP image layout
+# (build_coord_map in views/components.py). The first-pick team takes order 8, the first pick.
+CM_FIRST_PICK_BANS = (1, 3, 7, 10, 11, 19, 22)
+CM_FIRST_PICK_PICKS = (8, 14, 15, 18, 23)
+CM_SECOND_PICK_BANS = (2, 4, 5, 6, 12, 20, 21)
+CM_SECOND_PICK_PICKS = (9, 13, 16, 17, 24)
+CM_NUM_ORDERS = 24
+
+
+def cm_turn(order: int) -> Tuple[bool, bool]:
+    """1-based 顺位 -> (是否先选方行动, 是否 Pick)"""
+    if order in CM_FIRST_PICK_PICKS:
+        return True, True
+    if order in CM_FIRST_PICK_BANS:
+        return True, False
+    return False, order in CM_SECOND_PICK_PICKS
+
+
+@dataclass(frozen=True)
+class DraftAction:
+    """单个 Pick/Ban 动作 (与 PickBan 字段同名，可直接替代 ORM 对象使用)"""
+    order: int        # 0-based 全局顺序，与 PickBan.order 一致
+    hero_id: int
+    is_pick: bool
+    team_side: int    # 0=Radiant, 1=Dire
+
+
+@dataclass(frozen=True)
+class PlayerSlot:
+    """单个选手表现的只读快照"""
+    account_id: Optional[int]
+    player_name: str
+    hero_id: int
+    position: int
+    team_side: int
+    net_worth: int
+    gpm: int
+
+
+@dataclass(frozen=True)
+class DraftRecord:
+    """
+    一场比赛 (一个视角，即一条 Match 记录) 派生出的 BP 事实。
+    每个 Match 只构建一次，分析页、比赛列表、BP 图片与 Excel 模版共用。
+    """
+    match_pk: int
+    match_id: str
+    team_name: str
+    opponent_name: str
+    match_time: datetime
+    league_id: Optional[int]
+    is_scrim: bool
+    patch_version: str
+    is_radiant: bool
+    win: bool
+    first_pick: bool
+
+    actions: Tuple[DraftAction, ...]      # 全部 BP，按 order 排序
+    my_picks: Tuple[DraftAction, ...]
+    opp_picks: Tuple[DraftAction, ...]
+    my_bans: Tuple[DraftAction, ...]
+    opp_bans: Tuple[DraftAction, ...]
+    my_pick_ids: Tuple[int, ...]
+    opp_pick_ids: Tuple[int, ...]
+
+    players: Tuple[PlayerSlot, ...]       # 按录入顺序 (PlayerPerformance.id)
+    my_pos_heroes: Tuple[Optional[int], ...]   # 下标 0-4 对应 1-5 号位的英雄
+    opp_pos_heroes: Tuple[Optional[int], ...]
+
+    @property
+    def my_side(self) -> int:
+        return 0 if self.is_radiant else 1
+
+    @property
+    def opp_side(self) -> int:
+        return 1 if self.is_radiant else 0
+
+    @property
+    def radiant_name(self) -> str:
+        return self.team_name if self.is_radiant else self.opponent_name
+
+    @property
+    def dire_name(self) -> str:
+        return self.opponent_name if self.is_radiant else self.team_name
+
+    @property
+    def radiant_first(self) -> bool:
+        return self.is_radiant == self.first_pick
+
+    @property
+    def radiant_win(self) -> bool:
+        return self.is_radiant == self.win
+
+    @property
+    def winner_name(self) -> str:
+        return self.team_name if self.win else self.opponent_name
+
+    def side_won(self, side: int) -> bool:
+        return (side == self.my_side) == self.win
+
+    def side_actions(self, side: int, is_pick: bool) -> Tuple[DraftAction, ...]:
+        if side == self.my_side:
+            return self.my_picks if is_pick else self.my_bans
+        return self.opp_picks if is_pick else self.opp_bans
+
+    def pick_order(self, hero_id: int) -> Optional[int]:
+        """英雄的 1-based 选人顺位 (双方)"""
+        for a in self.my_picks + self.opp_picks:
+            if a.hero_id == hero_id:
+                return a.order + 1
+        return None
+
+    def pos_map(self, mine: bool = True) -> Dict[int, int]:
+        """{位置 (1-5): hero_id}"""
+        heroes = self.my_pos_heroes if mine else self.opp_pos_heroes
+        return {i + 1: hid for i, hid in enumerate(heroes) if hid}
+
+    def side_players(self, side: int) -> Tuple[PlayerSlot, ...]:
+        return tuple(p for p in self.players if p.team_side == side)
+
+
+def _pos_heroes(players: Iterable[PlayerSlot], side: int) -> Tuple[Optional[int], ...]:
+    slots: List[Optional[int]] = [None] * 5
+    for p in players:
+        if p.team_side == side and p.position and 1 <= p.position <= 5:
+            slots[p.position - 1] = p.hero_id
+    return tuple(slots)
+
+
+def build_draft_record(match) -> DraftRecord:
+    """从 ORM Match (及其 pick_bans / players) 构建 DraftRecord"""
+    my_side = 0 if match.is_radiant else 1
+
+    actions = tuple(
+        DraftAction(order=pb.order, hero_id=pb.hero_id, is_pick=bool(pb.is_pick), team_side=pb.team_side)
+        for pb in sorted(match.pick_bans, key=lambda x: x.order)
+    )
+    my_picks = tuple(a for a in actions if a.is_pick and a.team_side == my_side)
+    opp_picks = tuple(a for a in actions if a.is_pick and a.team_side != my_side)
+    my_bans = tuple(a for a in actions if not a.is_pick and a.team_side == my_side)
+    opp_bans = tuple(a for a in actions if not a.is_pick and a.team_side != my_side)
+
+    players = tuple(
+        PlayerSlot(
+            account_id=p.account_id,
+            player_name=p.player_name,
+            hero_id=p.hero_id,
+            position=p.position or 0,
+            team_side=p.team_side,
+            net_worth=p.net_worth or 0,
+            gpm=p.gpm or 0
+        )
+        for p in sorted(match.players, key=lambda x: x.id)
+    )
+
+    return DraftRecord(
+        match_pk=match.id,
+        match_id=match.match_id,
+        team_name=match.team_name,
+        opponent_name=match.opponent_name,
+        match_time=match.match_time,
+        league_id=match.league_id,
+        is_scrim=bool(match.is_scrim),
+        patch_version=match.patch_version or "",
+        is_radiant=bool(match.is_radiant),
+        win=bool(match.win),
+        first_pick=bool(match.first_pick),
+        actions=actions,
+        my_picks=my_picks,
+        opp_picks=opp_picks,
+        my_bans=my_bans,
+        opp_bans=opp_bans,
+        my_pick_ids=tuple(a.hero_id for a in my_picks),
+        opp_pick_ids=tuple(a.hero_id for a in opp_picks),
+        players=players,
+        my_pos_heroes=_pos_heroes(players, my_side),
+        opp_pos_heroes=_pos_heroes(players, 1 - my_side)
+    )
+
+
+# --- Process-wide cache: match PK -> DraftRecord, valid for one data version ---
+# Bounded LRU so that streaming over the whole history keeps memory constant.
+MAX_CACHED_DRAFTS = 5000
+
+_cache_lock = threading.Lock()
+_cache: "OrderedDict[int, DraftRecord]" = OrderedDict()
+_cache_version = None
+
+
+def _cache_get(match_pk: int, version: int) -> Optional[DraftRecord]:
+    # Caller holds _cache_lock
+    global _cache_version
+    if _cache_version != version:
+        _cache.clear()
+        _cache_version = version
+        return None
+    record = _cache.get(match_pk)
+    if record is not None:
+        _cache.move_to_end(match_pk)
+    return record
+
+
+def get_draft(match) -> DraftRecord:
+    """按 (Match 主键, 数据版本) 缓存的 DraftRecord"""
+    version = get_data_version()
+    with _cache_lock:
+        record = _cache_get(match.id, version)
+    if record is None:
+        record = build_draft_record(match)
+        with _cache_lock:
+            if _cache_version == version:
+                _cache[match.id] = record
+                if len(_cache) > MAX_CACHED_DRAFTS:
+                    _cache.popitem(last=False)
+    return record
+
+
+def peek_draft(match_pk: int) -> Optional[DraftRecord]:
+    """只查缓存，不构建 (缓存未命中或版本过期时返回 None)"""
+    with _cache_lock:
+        return _cache_get(match_pk, get_data_version())
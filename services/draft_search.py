@@ -0,0 +1,182 @@
+import threading
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+from services.draft_record import DraftRecord
+from services.match_index import IncrementalIndex
+
+# Hero ids are bit positions; 256 bits = 32 bytes per set
+HERO_CAPACITY = 256
+_SET_BYTES = HERO_CAPACITY // 8
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def hero_bitset(hero_ids: Iterable[int]) -> np.ndarray:
+    """英雄集合 -> 32 字节位图 (uint8)"""
+    bits = np.zeros(HERO_CAPACITY, dtype=bool)
+    for hid in hero_ids:
+        if 0 < hid < HERO_CAPACITY:
+            bits[hid] = True
+    return np.packbits(bits)
+
+
+def _popcount(rows: np.ndarray) -> np.ndarray:
+    """逐行位数: (..., 32) uint8 -> (...) int32"""
+    if hasattr(np, "bitwise_count"):  # NumPy >= 2.0: hardware popcount on 4 x uint64
+        return np.bitwise_count(np.ascontiguousarray(rows).view(np.uint64)).sum(axis=-1, dtype=np.int32)
+    return _POPCOUNT[rows].sum(axis=-1, dtype=np.int32)
+
+
+@dataclass(frozen=True)
+class SimilarDraft:
+    match_pk: int
+    match_id: str
+    side: int               # 与查询阵容最相似的一方 (0=Radiant, 1=Dire)
+    team_name: str          # 该方战队
+    opponent_name: str
+    match_time: Optional[datetime]
+    win: bool               # 该方是否获胜
+    overlap: int            # 与查询 Pick 重合的英雄数
+    ban_overlap: int
+    similarity: float       # Jaccard
+
+
+class DraftSearchIndex(IncrementalIndex):
+    """
+    全库 BP 的位图索引，每场比赛一行 (双视角记录按 match_id 去重):
+    - picks[i, side]: 该方 5 个 Pick 的位图
+    - bans[i]: 双方全部 Ban 的位图
+    查询时对所有行一次性做 AND + popcount，得到每场、每方与查询阵容的 Jaccard 相似度。
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._reset()
+
+    def _reset(self):
+        self._seen = set()
+        self._buffer: List[DraftRecord] = []
+        self._pks = np.zeros(0, dtype=np.int64)
+        self._days = np.zeros(0, dtype=np.int64)
+        self._picks = np.zeros((0, 2, _SET_BYTES), dtype=np.uint8)
+        self._bans = np.zeros((0, _SET_BYTES), dtype=np.uint8)
+        self._pick_sizes = np.zeros((0, 2), dtype=np.int32)
+        self._ban_sizes = np.zeros(0, dtype=np.int32)
+        self._radiant_win = np.zeros(0, dtype=bool)
+        self._match_ids: List[str] = []
+        self._names: List[tuple] = []     # (radiant_name, dire_name)
+        self._team_codes: Dict[str, int] = {}
+        self._teams = np.zeros((0, 2), dtype=np.int32)  # team code per side
+        self._times: List[Optional[datetime]] = []
+
+    def _add(self, d: DraftRecord):
+        game_key = d.match_id or f"pk{d.match_pk}"
+        if game_key in self._seen or not d.actions:
+            return
+        self._seen.add(game_key)
+        self._buffer.append(d)
+
+    def _commit(self, db):
+        if not self._buffer:
+            return
+        drafts, self._buffer = self._buffer, []
+
+        picks = np.stack([
+            np.stack([
+                hero_bitset(a.hero_id for a in d.actions if a.is_pick and a.team_side == side)
+                for side in (0, 1)
+            ])
+            for d in drafts
+        ])
+        bans = np.stack([hero_bitset(a.hero_id for a in d.actions if not a.is_pick) for d in drafts])
+
+        self._pks = np.concatenate([self._pks, [d.match_pk for d in drafts]])
+        self._days = np.concatenate([self._days, [d.match_time.toordinal() if d.match_time else 0 for d in drafts]])
+        self._picks = np.concatenate([self._picks, picks])
+        self._bans = np.concatenate([self._bans, bans])
+        self._pick_sizes = np.concatenate([self._pick_sizes, _popcount(picks)])
+        self._ban_sizes = np.concatenate([self._ban_sizes, _popcount(bans)])
+        self._radiant_win = np.concatenate([self._radiant_win, [d.radiant_win for d in drafts]])
+        self._match_ids.extend(d.match_id for d in drafts)
+        self._names.extend((d.radiant_name, d.dire_name) for d in drafts)
+        teams = [[self._team_codes.setdefault(name, len(self._team_codes)) for name in (d.radiant_name, d.dire_name)] for d in drafts]
+        self._teams = np.concatenate([self._teams, np.asarray(teams, dtype=np.int32)])
+        self._times.extend(d.match_time for d in drafts)
+
+    def __len__(self) -> int:
+        return len(self._pks)
+
+    def search(
+        self,
+        picks: Iterable[int],
+        bans: Iterable[int] = (),
+        team: Optional[str] = None,
+        start_date: Optional[date] = None,
+        min_overlap: int = 0,
+        n: int = 50
+    ) -> List[SimilarDraft]:
+        """
+        按 Jaccard 相似度排序的历史比赛。Pick 与 Ban 视为两个不相交的集合合并计算，
+        每场取两方中更相似的一方；min_overlap 要求该方至少包含多少个查询 Pick (如 "5 选 3")。
+        team 非空时只匹配该队所在的一方。
+        """
+        q_picks = hero_bitset(picks)
+        q_bans = hero_bitset(bans)
+        q_pick_size = int(_popcount(q_picks))
+        q_ban_size = int(_popcount(q_bans))
+        if not len(self) or not (q_pick_size or q_ban_size):
+            return []
+
+        pick_inter = _popcount(self._picks & q_picks)                  # (N, 2)
+        ban_inter = _popcount(self._bans & q_bans) if q_ban_size else np.zeros(len(self), dtype=np.int32)
+        inter = pick_inter + ban_inter[:, None]
+        union = q_pick_size + self._pick_sizes - pick_inter
+        if q_ban_size:
+            union = union + (q_ban_size + self._ban_sizes - ban_inter)[:, None]
+        sim = inter / np.maximum(union, 1)
+
+        valid = pick_inter >= min_overlap
+        if team:
+            valid &= self._teams == self._team_codes.get(team, -1)
+        if start_date:
+            valid[self._days < start_date.toordinal()] = False
+        sim = np.where(valid, sim, -1.0)
+
+        side = sim.argmax(axis=1)
+        rows = np.arange(len(self))
+        best = sim[rows, side]
+        candidates = np.flatnonzero(best > 0)
+        if not candidates.size:
+            return []
+        # Most similar first, newer games break ties
+        order = np.lexsort((-self._days[candidates], -best[candidates]))
+        results = []
+        for i in candidates[order][:n]:
+            s = int(side[i])
+            rad_name, dire_name = self._names[i]
+            results.append(SimilarDraft(
+                match_pk=int(self._pks[i]),
+                match_id=self._match_ids[i],
+                side=s,
+                team_name=rad_name if s == 0 else dire_name,
+                opponent_name=dire_name if s == 0 else rad_name,
+                match_time=self._times[i],
+                win=bool(self._radiant_win[i]) == (s == 0),
+                overlap=int(pick_inter[i, s]),
+                ban_overlap=int(ban_inter[i]),
+                similarity=float(best[i])
+            ))
+        return results
+
+
+_index_lock = threading.Lock()
+_index: Optional[DraftSearchIndex] = None
+
+
+def get_draft_search() -> DraftSearchIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = DraftSearchIndex()
+    return _index.sync()
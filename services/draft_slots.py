@@ -0,0 +1,101 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Tuple
+import numpy as np
+from sqlalchemy.orm import Session
+from services.draft_record import DraftRecord
+from services.match_events import get_data_version
+from services.team_stats import TeamMatchFilter, iter_match_drafts
+
+# Captain's Mode: 24 global orders (1-based in the UI, 0-based in PickBan.order)
+NUM_SLOTS = 24
+FIRST_PICK, SECOND_PICK = 0, 1
+
+MAX_CACHED_TENSORS = 32
+
+
+@dataclass(frozen=True)
+class SlotTensor:
+    """
+    一个筛选条件下，本队在每个 BP 顺位选/禁每个英雄的次数。
+    counts[fp_or_sp, slot, hero_id]，fp_or_sp: 0=本队先选, 1=本队后选；slot 为 0-based 顺位。
+    is_pick[fp_or_sp, slot]: 该顺位本队做的是 Pick (True) 还是 Ban。
+    """
+    counts: np.ndarray      # (2, 24, H) int32
+    actions: np.ndarray     # (2, 24) int32, 本队在该顺位的动作数
+    picks: np.ndarray       # (2, 24) int32, 其中 Pick 的个数
+    games: np.ndarray       # (2,) int32, 先选 / 后选场次
+
+    def slot_is_pick(self, side: int, slot: int) -> bool:
+        return self.picks[side, slot] * 2 > self.actions[side, slot]
+
+    def team_slots(self, side: int) -> List[int]:
+        """本队在该先后手下实际行动过的顺位 (0-based)"""
+        return [int(s) for s in np.flatnonzero(self.actions[side])]
+
+    def top_heroes(self, side: int, slot: int, n: int = 5) -> List[Tuple[int, int]]:
+        row = self.counts[side, slot]
+        if not row.any():
+            return []
+        top = np.argsort(row)[::-1][:n]
+        return [(int(hid), int(row[hid])) for hid in top if row[hid] > 0]
+
+
+def build_slot_tensor(drafts: Iterable[DraftRecord]) -> SlotTensor:
+    """把所有 BP 动作展开成 (先后手, 顺位, 英雄) 三个数组，再一次性 bincount"""
+    sides: List[int] = []
+    slots: List[int] = []
+    heroes: List[int] = []
+    is_pick: List[bool] = []
+    games = [0, 0]
+
+    for d in drafts:
+        side = FIRST_PICK if d.first_pick else SECOND_PICK
+        games[side] += 1
+        for a in d.my_picks + d.my_bans:
+            if 0 <= a.order < NUM_SLOTS and a.hero_id:
+                sides.append(side)
+                slots.append(a.order)
+                heroes.append(a.hero_id)
+                is_pick.append(a.is_pick)
+
+    side_arr = np.asarray(sides, dtype=np.int64)
+    slot_arr = np.asarray(slots, dtype=np.int64)
+    hero_arr = np.asarray(heroes, dtype=np.int64)
+    pick_arr = np.asarray(is_pick, dtype=bool)
+
+    hero_dim = int(hero_arr.max()) + 1 if hero_arr.size else 1
+    flat_slot = side_arr * NUM_SLOTS + slot_arr
+    counts = np.bincount(flat_slot * hero_dim + hero_arr, minlength=2 * NUM_SLOTS * hero_dim)
+    actions = np.bincount(flat_slot, minlength=2 * NUM_SLOTS)
+    picks = np.bincount(flat_slot[pick_arr], minlength=2 * NUM_SLOTS)
+
+    return SlotTensor(
+        counts=counts.reshape(2, NUM_SLOTS, hero_dim).astype(np.int32),
+        actions=actions.reshape(2, NUM_SLOTS).astype(np.int32),
+        picks=picks.reshape(2, NUM_SLOTS).astype(np.int32),
+        games=np.asarray(games, dtype=np.int32)
+    )
+
+
+# --- Cache: (filter, data version) -> SlotTensor ---
+_cache_lock = threading.Lock()
+_cache: "OrderedDict[Tuple[TeamMatchFilter, int], SlotTensor]" = OrderedDict()
+
+
+def get_slot_tensor(db: Session, match_filter: TeamMatchFilter) -> SlotTensor:
+    """按筛选条件缓存的顺位热力图数据，数据版本变化后自动失效"""
+    key = (match_filter, get_data_version())
+    with _cache_lock:
+        tensor: Optional[SlotTensor] = _cache.get(key)
+        if tensor is not None:
+            _cache.move_to_end(key)
+            return tensor
+
+    tensor = build_slot_tensor(iter_match_drafts(db, match_filter.query(db)))
+    with _cache_lock:
+        _cache[key] = tensor
+        while len(_cache) > MAX_CACHED_TENSORS:
+            _cache.popitem(last=False)
+    return tensor
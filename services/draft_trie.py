@@ -0,0 +1,217 @@
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from services.draft_record import CM_NUM_ORDERS, DraftRecord
+from services.match_index import IncrementalIndex
+from services.patch_manager import PatchManager, find_patch
+
+UNKNOWN_PATCH = "未知版本"
+# Below this many matching games the exact prefix is too thin to trust
+MIN_PREFIX_SUPPORT = 3
+
+# Edge label, from the indexed team's point of view: (is_mine, is_pick, hero_id)
+Step = Tuple[bool, bool, int]
+
+
+class TrieNode:
+    __slots__ = ("count", "wins", "children")
+
+    def __init__(self):
+        self.count = 0
+        self.wins = 0
+        self.children: Optional[Dict[Step, "TrieNode"]] = None
+
+    def child(self, step: Step) -> "TrieNode":
+        if self.children is None:
+            self.children = {}
+        node = self.children.get(step)
+        if node is None:
+            node = self.children[step] = TrieNode()
+        return node
+
+
+@dataclass(frozen=True)
+class NextAction:
+    hero_id: int
+    is_pick: bool
+    count: int
+    wins: int
+    share: float    # 占所有候选动作的比例
+
+    @property
+    def win_rate(self) -> float:
+        return self.wins / self.count if self.count else 0.0
+
+
+@dataclass(frozen=True)
+class Prediction:
+    actions: List[NextAction]
+    matched_depth: int      # 前缀中被历史完全匹配的长度
+    games: int              # 支撑预测的历史场次
+    exact: bool             # False = 前缀没有历史，退化为按顺位统计
+
+
+class DraftTrie:
+    """
+    一支战队在一个 (版本, 先/后选) 下全部 BP 序列的前缀树。
+    每个节点记录经过的场次与胜场；另按深度记录本队动作分布，作为前缀失配时的退路。
+    """
+
+    def __init__(self):
+        self.root = TrieNode()
+        self.depth_actions: Dict[int, Dict[Tuple[bool, int], List[int]]] = {}  # depth -> (is_pick, hero) -> [count, wins]
+
+    def insert(self, steps: Sequence[Step], win: bool):
+        node = self.root
+        node.count += 1
+        if win: node.wins += 1
+        for depth, step in enumerate(steps):
+            if step[0]:
+                c = self.depth_actions.setdefault(depth, {}).setdefault((step[1], step[2]), [0, 0])
+                c[0] += 1
+                if win: c[1] += 1
+            node = node.child(step)
+            node.count += 1
+            if win: node.wins += 1
+
+    def walk(self, prefix: Sequence[Step]) -> Tuple[TrieNode, int]:
+        node = self.root
+        for depth, step in enumerate(prefix):
+            nxt = node.children.get(step) if node.children else None
+            if nxt is None:
+                return node, depth
+            node = nxt
+        return node, len(prefix)
+
+
+def _collect_next_mine(node: TrieNode, out: Dict[Tuple[bool, int], List[int]]):
+    """从 node 往下越过对手的动作，收集本队的下一个动作"""
+    if not node.children:
+        return
+    for (is_mine, is_pick, hero_id), child in node.children.items():
+        if is_mine:
+            c = out.setdefault((is_pick, hero_id), [0, 0])
+            c[0] += child.count
+            c[1] += child.wins
+        else:
+            _collect_next_mine(child, out)
+
+
+class DraftTrieIndex(IncrementalIndex):
+    """
+    所有战队的 BP 前缀树，按 (战队, 版本, 是否先选) 分开。
+    每条 Match 记录同时喂给本队和对手的前缀树 (双视角重复记录按 (战队, match_id) 去重)，
+    这样只作为对手出现过的战队也能查询。
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._timeline: List[Tuple[str, str]] = []
+        self._tries: Dict[Tuple[str, str, bool], DraftTrie] = {}
+        self._seen: Set[Tuple[str, str]] = set()
+
+    def set_patch_timeline(self, timeline: List[Tuple[str, str]]):
+        if timeline != self._timeline:
+            self._timeline = list(timeline)
+            self.invalidate()
+
+    def _reset(self):
+        self._tries = {}
+        self._seen = set()
+
+    def _add(self, d: DraftRecord):
+        if not d.actions:
+            return
+        patch = d.patch_version or find_patch(self._timeline, d.match_time) or UNKNOWN_PATCH
+        game_key = d.match_id or f"pk{d.match_pk}"
+        for team, side, first_pick, win in (
+            (d.team_name, d.my_side, d.first_pick, d.win),
+            (d.opponent_name, d.opp_side, not d.first_pick, not d.win)
+        ):
+            if not team or (team, game_key) in self._seen:
+                continue
+            self._seen.add((team, game_key))
+            key = (team, patch, first_pick)
+            trie = self._tries.get(key)
+            if trie is None:
+                trie = self._tries[key] = DraftTrie()
+            trie.insert([(a.team_side == side, a.is_pick, a.hero_id) for a in d.actions], win)
+
+    def patches(self, team: str) -> List[str]:
+        order = {name: start for start, name in self._timeline}
+        names = {patch for t, patch, _ in self._tries if t == team}
+        return sorted(names, key=lambda p: order.get(p, ""), reverse=True)
+
+    def predict(
+        self,
+        team: str,
+        first_pick: bool,
+        prefix: Sequence[Step],
+        patches: Optional[Iterable[str]] = None,
+        n: int = 10,
+        min_support: int = MIN_PREFIX_SUPPORT
+    ) -> Prediction:
+        """
+        给定当前 BP 前缀 (以 team 视角: is_mine=该队的动作)，返回该队历史上最可能的下一手。
+        前缀匹配的历史场次不足 min_support 时退化为按顺位统计；已出现在前缀里的英雄会被排除。
+        """
+        patches = set(patches) if patches else None
+        tries = [
+            trie for (t, patch, fp), trie in list(self._tries.items())
+            if t == team and fp == first_pick and (patches is None or patch in patches)
+        ]
+        used = {hero_id for _, _, hero_id in prefix}
+
+        merged: Dict[Tuple[bool, int], List[int]] = {}
+        games = 0
+        matched_depth = 0
+        full_matches = []
+        for trie in tries:
+            node, depth = trie.walk(prefix)
+            matched_depth = max(matched_depth, depth)
+            if depth == len(prefix):
+                full_matches.append(node)
+
+        exact = sum(node.count for node in full_matches) >= max(1, min_support)
+        if exact:
+            for node in full_matches:
+                games += node.count
+                _collect_next_mine(node, merged)
+        else:
+            # Fallback: what the team does at its next own slot, ignoring the order so far
+            next_depth = len(prefix)
+            for trie in tries:
+                games += trie.root.count
+                depth = next_depth
+                while depth < CM_NUM_ORDERS and depth not in trie.depth_actions:
+                    depth += 1
+                for key, (cnt, wins) in trie.depth_actions.get(depth, {}).items():
+                    c = merged.setdefault(key, [0, 0])
+                    c[0] += cnt
+                    c[1] += wins
+
+        candidates = [(k, v) for k, v in merged.items() if k[1] not in used]
+        total = sum(v[0] for _, v in candidates)
+        candidates.sort(key=lambda kv: kv[1][0], reverse=True)
+        return Prediction(
+            actions=[
+                NextAction(hero_id=hero_id, is_pick=is_pick, count=cnt, wins=wins, share=cnt / total if total else 0.0)
+                for (is_pick, hero_id), (cnt, wins) in candidates[:n]
+            ],
+            matched_depth=matched_depth,
+            games=games,
+            exact=exact
+        )
+
+
+_index_lock = threading.Lock()
+_index: Optional[DraftTrieIndex] = None
+
+
+def get_draft_tries() -> DraftTrieIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = DraftTrieIndex()
+    _index.set_patch_timeline(PatchManager().get_patch_timeline())
+    return _index.sync()
@@ -0,0 +1,176 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import requests
+from PIL import Image
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from services.hero_atlas import HERO_ASSET_DIR, Variant, build_hero_atlas, indexed_variants, invalidate_hero_atlas
+from services.render_pool import shutdown_pool
+
+DATA_DIR = "data"
+ICON_DIR = os.path.join(HERO_ASSET_DIR, "icons")
+# Source URL of every file on disk, so a URL change after a patch triggers a re-download
+MANIFEST_FILE = os.path.join(DATA_DIR, "cache", "hero_assets.json")
+
+# (kind, hero field, directory)
+ASSET_KINDS = (
+    ("portrait", "img_url", HERO_ASSET_DIR),
+    ("icon", "icon_url", ICON_DIR),
+)
+
+MAX_DOWNLOAD_WORKERS = 16
+DOWNLOAD_TIMEOUT = 10
+
+
+def hero_asset_path(hero_id: int, kind: str = "portrait") -> str:
+    for name, _, directory in ASSET_KINDS:
+        if name == kind:
+            return os.path.join(directory, f"{hero_id}.png")
+    raise ValueError(f"Unknown hero asset kind: {kind}")
+
+
+def _absolute_url(url: str) -> str:
+    # OpenDota sometimes hands out paths relative to its own host
+    return url if url.startswith("http") else f"https://api.opendota.com{url}"
+
+
+def _is_valid_image(path: str) -> bool:
+    try:
+        with Image.open(path) as img:
+            img.verify()
+        return True
+    except Exception:
+        return False
+
+
+@dataclass(frozen=True)
+class AssetTask:
+    hero_id: int
+    kind: str
+    url: str
+    path: str
+
+
+def load_manifest() -> Dict[str, Dict[str, str]]:
+    try:
+        with open(MANIFEST_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(manifest: Dict[str, Dict[str, str]]):
+    os.makedirs(os.path.dirname(MANIFEST_FILE), exist_ok=True)
+    tmp_path = f"{MANIFEST_FILE}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, MANIFEST_FILE)
+
+
+def plan_hero_assets(heroes: Iterable[Dict], manifest: Dict[str, Dict[str, str]],
+                     force: bool = False) -> Tuple[List[AssetTask], int]:
+    """
+    对比英雄列表与 assets/heroes: 缺失、损坏或来源 URL 变化的头像 / 图标需要下载。
+    清单里没有记录但文件完好的直接沿用 (写入清单，不重新下载)。
+    返回 (下载任务, 已是最新的文件数)；manifest 原地更新。
+    """
+    tasks = []
+    up_to_date = 0
+    for hero in heroes:
+        hid = hero.get("id")
+        if not hid:
+            continue
+        entry = manifest.setdefault(str(hid), {})
+        for kind, field, _ in ASSET_KINDS:
+            url = hero.get(field)
+            if not url:
+                continue
+            url = _absolute_url(url)
+            path = hero_asset_path(hid, kind)
+            known = entry.get(kind)
+            if force or (known is not None and known != url) or not os.path.exists(path) or not _is_valid_image(path):
+                tasks.append(AssetTask(hid, kind, url, path))
+            else:
+                entry[kind] = url
+                up_to_date += 1
+    return tasks, up_to_date
+
+
+def _make_session(workers: int) -> requests.Session:
+    session = requests.Session()
+    retry = Retry(total=2, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504))
+    # One keep-alive connection per worker to the CDN host
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=workers, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _download(session: requests.Session, task: AssetTask) -> Optional[str]:
+    """下载、校验并原子写入一个文件；成功返回 None，失败返回错误信息"""
+    try:
+        resp = session.get(task.url, timeout=DOWNLOAD_TIMEOUT)
+        resp.raise_for_status()
+        data = resp.content
+        with Image.open(BytesIO(data)) as img:
+            img.verify()
+            fmt = img.format
+        os.makedirs(os.path.dirname(task.path), exist_ok=True)
+        tmp_path = f"{task.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        if fmt == "PNG":
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+        else:
+            # Keep everything under assets/heroes as PNG (verify() leaves the image unusable, reopen)
+            with Image.open(BytesIO(data)) as img:
+                img.save(tmp_path, format="PNG")
+        os.replace(tmp_path, task.path)
+        return None
+    except Exception as e:
+        return str(e)
+
+
+def sync_hero_assets(heroes: Iterable[Dict], force: bool = False, variants: Optional[Sequence[Variant]] = None,
+                     workers: int = MAX_DOWNLOAD_WORKERS) -> Dict[str, int]:
+    """
+    同步英雄头像与小图标: 并发下载缺失 / 变化的文件 (共享连接池)，校验后原子写入，
+    有头像更新时按 variants (默认沿用现有图集的尺寸) 重建预缩放图集。
+    渲染路径只读本地文件，新英雄的图片只会在这里下载。
+    返回 {"up_to_date", "downloaded", "failed"}。
+    """
+    manifest = load_manifest()
+    tasks, up_to_date = plan_hero_assets(heroes, manifest, force)
+    downloaded = failed = 0
+    portraits_changed = False
+
+    if tasks:
+        session = _make_session(workers)
+        try:
+            with ThreadPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+                errors = list(executor.map(lambda t: _download(session, t), tasks))
+        finally:
+            session.close()
+        for task, error in zip(tasks, errors):
+            if error is None:
+                manifest[str(task.hero_id)][task.kind] = task.url
+                downloaded += 1
+                portraits_changed |= task.kind == "portrait"
+            else:
+                print(f"Failed to download {task.kind} for hero {task.hero_id}: {error}")
+                failed += 1
+    _save_manifest(manifest)
+
+    if portraits_changed:
+        variants = list(variants) if variants else indexed_variants()
+        if variants:
+            build_hero_atlas(variants)
+        invalidate_hero_atlas()
+        # Render workers map the previous atlas; respawn them on the next batch
+        shutdown_pool()
+
+    return {"up_to_date": up_to_date, "downloaded": downloaded, "failed": failed}
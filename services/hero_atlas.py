@@ -0,0 +1,205 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from PIL import Image
+
+DATA_DIR = "data"
+HERO_ASSET_DIR = os.path.join("assets", "heroes")
+ATLAS_DIR = os.path.join(DATA_DIR, "cache", "hero_atlas")
+INDEX_FILE = os.path.join(ATLAS_DIR, "index.json")
+FORMAT_VERSION = 1
+
+# Hero ids are used directly as the first axis
+HERO_CAPACITY = 256
+
+# (width, height, is_ban)
+Variant = Tuple[int, int, bool]
+
+
+def hero_variant(img: Image.Image, size: Optional[Tuple[int, int]] = None, is_ban: bool = False) -> Image.Image:
+    """原图 -> 缩放后的 RGBA；Ban 为灰度 (保留 alpha)"""
+    if size:
+        img = img.resize(size)
+    # Ensure RGBA mode before any further processing to avoid bad transparency mask error
+    if img.mode != 'RGBA':
+        img = img.convert('RGBA')
+    if is_ban:
+        # Convert to L then back to RGB, putting the original alpha back
+        alpha = img.split()[3]
+        img = img.convert('L').convert('RGB')
+        img.putalpha(alpha)
+    return img
+
+
+def _variant_file(variant: Variant) -> str:
+    w, h, is_ban = variant
+    return os.path.join(ATLAS_DIR, f"{w}x{h}{'_ban' if is_ban else ''}.npy")
+
+
+def source_fingerprint(asset_dir: str = HERO_ASSET_DIR) -> Dict[str, List[int]]:
+    """assets/heroes 下每张头像的 (大小, 修改时间)，用于判断图集是否过期"""
+    fp = {}
+    try:
+        entries = list(os.scandir(asset_dir))
+    except OSError:
+        return fp
+    for entry in entries:
+        stem, ext = os.path.splitext(entry.name)
+        if ext == ".png" and stem.isdigit():
+            st = entry.stat()
+            fp[stem] = [st.st_size, st.st_mtime_ns]
+    return fp
+
+
+def build_hero_atlas(variants: Iterable[Variant], asset_dir: str = HERO_ASSET_DIR) -> int:
+    """
+    把 assets/heroes 下全部头像按每种尺寸 (及 Ban 灰度版本) 预先缩放，
+    每种尺寸写成一个 (HERO_CAPACITY, h, w, 4) uint8 的 .npy 文件。返回打包的英雄数。
+    """
+    variants = [tuple(v) for v in variants]
+    fingerprint = source_fingerprint(asset_dir)
+    os.makedirs(ATLAS_DIR, exist_ok=True)
+    suffix = f".{os.getpid()}.tmp.npy"
+
+    arrays = {
+        v: np.lib.format.open_memmap(_variant_file(v) + suffix, mode="w+", dtype=np.uint8, shape=(HERO_CAPACITY, v[1], v[0], 4))
+        for v in variants
+    }
+    present = []
+    for stem in sorted(fingerprint, key=int):
+        hid = int(stem)
+        if not 0 < hid < HERO_CAPACITY:
+            continue
+        try:
+            with Image.open(os.path.join(asset_dir, f"{stem}.png")) as src:
+                src.load()
+                # Decode once, derive every variant from the same pixels
+                for v, arr in arrays.items():
+                    arr[hid] = np.asarray(hero_variant(src, (v[0], v[1]), v[2]))
+        except Exception as e:
+            print(f"Atlas: skipping hero {hid}: {e}")
+            continue
+        present.append(hid)
+
+    for v in variants:
+        # Flush and unmap before renaming (required on Windows)
+        arrays.pop(v).flush()
+    for v in variants:
+        os.replace(_variant_file(v) + suffix, _variant_file(v))
+
+    index = {
+        "format": FORMAT_VERSION,
+        "variants": [list(v) for v in variants],
+        "heroes": present,
+        "sources": fingerprint
+    }
+    tmp_path = INDEX_FILE + suffix
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f)
+    os.replace(tmp_path, INDEX_FILE)
+    return len(present)
+
+
+def indexed_variants() -> List[Variant]:
+    """磁盘上现有图集包含的尺寸 (没有图集时为空)，用于在头像更新后按原尺寸重建"""
+    try:
+        with open(INDEX_FILE, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return []
+    if index.get("format") != FORMAT_VERSION:
+        return []
+    return [tuple(v) for v in index.get("variants", [])]
+
+
+class HeroAtlas:
+    """
+    预缩放头像图集的只读视图。每种尺寸一个内存映射的 .npy，按 hero_id 切片即得 (h, w, 4) RGBA，
+    不做任何解码；多个进程映射同一文件时共享一份页缓存。
+    """
+
+    def __init__(self, index: Dict, arrays: Dict[Variant, np.ndarray]):
+        self._arrays = arrays
+        self._present = np.zeros(HERO_CAPACITY, dtype=bool)
+        self._present[index["heroes"]] = True
+        self._sources = index["sources"]
+        # Identifies the packed pixels: changes whenever a portrait is added or replaced
+        raw = json.dumps(self._sources, sort_keys=True).encode("utf-8")
+        self.version = hashlib.sha1(raw).hexdigest()[:12]
+
+    @classmethod
+    def load(cls, variants: Iterable[Variant]) -> Optional["HeroAtlas"]:
+        """索引与请求的尺寸一致时映射各文件，否则返回 None"""
+        try:
+            with open(INDEX_FILE, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return None
+        variants = [tuple(v) for v in variants]
+        if index.get("format") != FORMAT_VERSION or {tuple(v) for v in index.get("variants", [])} != set(variants):
+            return None
+        try:
+            # Plain ndarray views over the maps: slicing a np.memmap subclass is needlessly slow
+            arrays = {v: np.asarray(np.load(_variant_file(v), mmap_mode="r")) for v in variants}
+        except (OSError, ValueError):
+            return None
+        if any(arr.shape != (HERO_CAPACITY, v[1], v[0], 4) for v, arr in arrays.items()):
+            return None
+        return cls(index, arrays)
+
+    def is_stale(self, asset_dir: str = HERO_ASSET_DIR) -> bool:
+        return source_fingerprint(asset_dir) != self._sources
+
+    @property
+    def variants(self) -> List[Variant]:
+        return list(self._arrays)
+
+    def has(self, hero_id: int) -> bool:
+        return 0 < hero_id < HERO_CAPACITY and bool(self._present[hero_id])
+
+    def get(self, hero_id: int, size: Tuple[int, int], is_ban: bool = False) -> Optional[np.ndarray]:
+        """(h, w, 4) uint8 只读视图；没有该尺寸或该英雄时返回 None"""
+        arr = self._arrays.get((size[0], size[1], bool(is_ban)))
+        if arr is None or not self.has(hero_id):
+            return None
+        return arr[hero_id]
+
+    def stack(self, size: Tuple[int, int], is_ban: bool = False) -> Optional[np.ndarray]:
+        """该尺寸的整张图集 (HERO_CAPACITY, h, w, 4)，供批量合成"""
+        return self._arrays.get((size[0], size[1], bool(is_ban)))
+
+
+_atlas_lock = threading.Lock()
+_atlas: Optional[HeroAtlas] = None
+_atlas_checked = False
+
+
+def get_hero_atlas(variants: Iterable[Variant]) -> Optional[HeroAtlas]:
+    """
+    进程内共享的图集。首次调用时映射磁盘上的图集，不存在、尺寸不符或头像文件有变化时先重建。
+    没有任何头像文件时返回 None。
+    """
+    global _atlas, _atlas_checked
+    with _atlas_lock:
+        if not _atlas_checked:
+            _atlas_checked = True
+            variants = [tuple(v) for v in variants]
+            atlas = HeroAtlas.load(variants)
+            if atlas is None or atlas.is_stale():
+                atlas = None
+                if source_fingerprint():
+                    build_hero_atlas(variants)
+                    atlas = HeroAtlas.load(variants)
+            _atlas = atlas
+        return _atlas
+
+
+def invalidate_hero_atlas():
+    """头像文件变化后调用，下次 get_hero_atlas 时重新检查 / 重建"""
+    global _atlas, _atlas_checked
+    with _atlas_lock:
+        _atlas = None
+        _atlas_checked = False
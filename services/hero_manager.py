@@ -3,6 +3,7 @@ import os
 import pandas as pd
 from typing import Dict, Any, List
 from services.api_client import OpenDotaClient
+from services.hero_assets import sync_hero_assets
 
 DATA_DIR = "data"
 SYSTEM_FILE = os.path.join(DATA_DIR, "heroes_system.json")
@@ -20,7 +21,7 @@ class HeroManager:
 
     def fetch_and_update_system_data(self) -> int:
         """
-        从 OpenDota API 拉取最新数据，保存到 heroes_system.json
+        从 OpenDota API 拉取最新数据，保存到 heroes_system.json，并同步本地头像 / 图标
         """
         client = OpenDotaClient()
         data = client.fetch_heroes() # distinct from client.fetch_heroes() which returns list
@@ -60,6 +61,13 @@ class HeroManager:
             self._create_initial_custom_file(heroes_dict)
         
         self.load_heroes()
+
+        # Fetch portraits for new / changed heroes now, so rendering never has to
+        try:
+            stats = sync_hero_assets(self.heroes.values())
+            print(f"Hero assets: {stats}")
+        except Exception as e:
+            print(f"Hero asset sync failed: {e}")
         return len(heroes_dict)
 
     def _create_initial_custom_file(self, system_data: Dict):
@@ -0,0 +1,259 @@
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
+from sqlalchemy.orm import Session
+from models import Match
+from services.draft_record import DraftRecord
+from services.match_index import IncrementalIndex, db_fingerprint
+from services.patch_manager import PatchManager, find_patch
+
+DATA_DIR = "data"
+MATRIX_DIR = os.path.join(DATA_DIR, "cache", "hero_matrix")
+META_FILE = os.path.join(MATRIX_DIR, "meta.json")
+FORMAT_VERSION = 2
+
+# Hero ids are used directly as matrix indices
+HERO_CAPACITY = 256
+UNKNOWN_PATCH = "未知版本"
+
+# Planes of each per-patch array: shape (4, HERO_CAPACITY, HERO_CAPACITY)
+SYN_GAMES, SYN_WINS, VS_GAMES, VS_WINS = range(4)
+_PLANE = HERO_CAPACITY * HERO_CAPACITY
+_SHAPE = (4, HERO_CAPACITY, HERO_CAPACITY)
+
+
+@dataclass(frozen=True)
+class PairStat:
+    hero_id: int
+    games: int
+    wins: int
+
+    @property
+    def win_rate(self) -> float:
+        return self.wins / self.games if self.games else 0.0
+
+
+def _patch_file(patch: str) -> str:
+    return os.path.join(MATRIX_DIR, re.sub(r'[^0-9A-Za-z._-]', "_", patch) + ".i32")
+
+
+class HeroMatrixIndex(IncrementalIndex):
+    """
+    全库英雄 × 英雄矩阵，每个版本一个 int32 数组 (4 × 256 × 256，约 1MB)，以 memmap 存在磁盘:
+    - SYN_GAMES[a, b] / SYN_WINS[a, b]: a 与 b 同队的场次 / 胜场
+    - VS_GAMES[a, b] / VS_WINS[a, b]: a 对阵 b 的场次 / a 获胜场次
+    同一场比赛的双视角记录按 match_id 去重。启动时若落盘数据与数据库指纹一致则直接映射，
+    新比赛入库时只把新增的索引累加进去。重建时先在内存中累加，提交时写临时文件再替换，
+    不删除 / 截断仍可能被映射的文件。
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._timeline: List[Tuple[str, str]] = []
+        self._arrays: Dict[str, np.ndarray] = {}
+        self._seen: Set[str] = set()
+        # Buffered flat indices per patch, applied in one bincount on _commit
+        self._buffer: Dict[str, List[int]] = {}
+
+    def set_patch_timeline(self, timeline: List[Tuple[str, str]]):
+        if timeline != self._timeline:
+            self._timeline = list(timeline)
+            self.invalidate()
+
+    # --- IncrementalIndex hooks ---
+
+    def _rebuild(self, db: Session):
+        if not self._load(db):
+            super()._rebuild(db)
+
+    def _reset(self):
+        # Drop the maps; the rebuilt arrays are swapped in by _commit
+        self._arrays = {}
+        self._seen = set()
+        self._buffer = {}
+
+    def _add(self, d: DraftRecord):
+        game_key = d.match_id or f"pk{d.match_pk}"
+        if game_key in self._seen:
+            return
+        self._seen.add(game_key)
+
+        rad = [a.hero_id for a in d.actions if a.is_pick and a.team_side == 0 and 0 < a.hero_id < HERO_CAPACITY]
+        dire = [a.hero_id for a in d.actions if a.is_pick and a.team_side == 1 and 0 < a.hero_id < HERO_CAPACITY]
+        if not rad and not dire:
+            return
+
+        patch = d.patch_version or find_patch(self._timeline, d.match_time) or UNKNOWN_PATCH
+        buf = self._buffer.setdefault(patch, [])
+        radiant_win = d.radiant_win
+
+        for team, won in ((rad, radiant_win), (dire, not radiant_win)):
+            for a in team:
+                for b in team:
+                    if a != b:
+                        buf.append(SYN_GAMES * _PLANE + a * HERO_CAPACITY + b)
+                        if won:
+                            buf.append(SYN_WINS * _PLANE + a * HERO_CAPACITY + b)
+        for a in rad:
+            for b in dire:
+                buf.append(VS_GAMES * _PLANE + a * HERO_CAPACITY + b)
+                buf.append(VS_GAMES * _PLANE + b * HERO_CAPACITY + a)
+                if radiant_win:
+                    buf.append(VS_WINS * _PLANE + a * HERO_CAPACITY + b)
+                else:
+                    buf.append(VS_WINS * _PLANE + b * HERO_CAPACITY + a)
+
+    def _commit(self, db: Session):
+        os.makedirs(MATRIX_DIR, exist_ok=True)
+        for patch, indices in self._buffer.items():
+            if not indices:
+                continue
+            arr = self._array(patch, create=True)
+            delta = np.bincount(np.asarray(indices, dtype=np.int64), minlength=4 * _PLANE)
+            arr += delta.reshape(_SHAPE).astype(np.int32)
+            if isinstance(arr, np.memmap):
+                arr.flush()
+        self._buffer = {}
+
+        fresh = [patch for patch, arr in self._arrays.items() if not isinstance(arr, np.memmap)]
+        for patch in fresh:
+            # Like build_hero_atlas: write a temp file and rename it over the old one
+            path = _patch_file(patch)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            self._arrays[patch].tofile(tmp_path)
+            os.replace(tmp_path, path)
+            self._arrays[patch] = np.memmap(path, dtype=np.int32, mode="r+", shape=_SHAPE)
+        if fresh:
+            self._remove_unused_files()
+
+        count, max_id, version = db_fingerprint(db)
+        meta = {
+            "format": FORMAT_VERSION,
+            "fingerprint": [count, max_id, version],
+            "timeline": [list(t) for t in self._timeline],
+            "patches": sorted(self._arrays)
+        }
+        tmp_path = META_FILE + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, META_FILE)
+
+    # --- Disk ---
+
+    def _array(self, patch: str, create: bool = False) -> Optional[np.ndarray]:
+        arr = self._arrays.get(patch)
+        if arr is None and create:
+            # In memory until _commit writes it out (a file left on disk may hold stale counts)
+            arr = self._arrays[patch] = np.zeros(_SHAPE, dtype=np.int32)
+        return arr
+
+    def _remove_unused_files(self):
+        used = {os.path.basename(_patch_file(p)) for p in self._arrays}
+        for name in os.listdir(MATRIX_DIR):
+            if name.endswith(".i32") and name not in used:
+                try:
+                    os.remove(os.path.join(MATRIX_DIR, name))
+                except OSError:
+                    pass  # still mapped by another process on Windows; retried after the next rebuild
+
+    def _load(self, db: Session) -> bool:
+        """落盘数据与当前数据库 / 版本表一致时直接映射，返回是否成功"""
+        try:
+            with open(META_FILE, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        count, max_id, version = db_fingerprint(db)
+        if (meta.get("format") != FORMAT_VERSION
+                or meta.get("fingerprint") != [count, max_id, version]
+                or meta.get("timeline") != [list(t) for t in self._timeline]):
+            return False
+
+        arrays = {}
+        for patch in meta.get("patches", []):
+            path = _patch_file(patch)
+            if not os.path.exists(path) or os.path.getsize(path) != 4 * 4 * _PLANE:
+                return False
+            arrays[patch] = np.memmap(path, dtype=np.int32, mode="r+", shape=_SHAPE)
+
+        self._arrays = arrays
+        # The fingerprint matches, so every game in the database is already counted
+        self._seen = {match_id or f"pk{pk}" for match_id, pk in db.query(Match.match_id, Match.id)}
+        self._buffer = {}
+        self._max_pk = max_id
+        return True
+
+    # --- Queries ---
+
+    def patches(self) -> List[str]:
+        order = {name: start for start, name in self._timeline}
+        return sorted(self._arrays, key=lambda p: order.get(p, ""), reverse=True)
+
+    def _rows(self, planes: Tuple[int, int], hero_id: int, patches: Optional[Iterable[str]], column: bool = False):
+        games = np.zeros(HERO_CAPACITY, dtype=np.int64)
+        wins = np.zeros(HERO_CAPACITY, dtype=np.int64)
+        if not 0 < hero_id < HERO_CAPACITY:
+            return games, wins
+        for patch in (patches or list(self._arrays)):
+            arr = self._arrays.get(patch)
+            if arr is None:
+                continue
+            if column:
+                games += arr[planes[0], :, hero_id]
+                wins += arr[planes[1], :, hero_id]
+            else:
+                games += arr[planes[0], hero_id]
+                wins += arr[planes[1], hero_id]
+        return games, wins
+
+    def dense(self, patches: Optional[Iterable[str]] = None) -> np.ndarray:
+        """所选版本合计后的完整矩阵 (4, 256, 256) int64，供需要整表向量化计算的场景"""
+        total = np.zeros(_SHAPE, dtype=np.int64)
+        for patch in (patches or list(self._arrays)):
+            arr = self._arrays.get(patch)
+            if arr is not None:
+                total += arr
+        return total
+
+    def partners(self, hero_id: int, patches: Optional[Iterable[str]] = None) -> List[PairStat]:
+        """与 hero_id 同队时每个搭档的 (场次, 胜场)"""
+        games, wins = self._rows((SYN_GAMES, SYN_WINS), hero_id, patches)
+        return _to_stats(games, wins)
+
+    def counters(self, hero_id: int, patches: Optional[Iterable[str]] = None) -> List[PairStat]:
+        """对阵 hero_id 时每个英雄的 (场次, 胜场)，胜率高 = 克制 hero_id"""
+        games, wins = self._rows((VS_GAMES, VS_WINS), hero_id, patches, column=True)
+        return _to_stats(games, wins)
+
+    def best_partners(self, hero_id: int, patches: Optional[Iterable[str]] = None, min_games: int = 3, n: int = 10) -> List[PairStat]:
+        return _best(self.partners(hero_id, patches), min_games, n)
+
+    def best_counters(self, hero_id: int, patches: Optional[Iterable[str]] = None, min_games: int = 3, n: int = 10) -> List[PairStat]:
+        return _best(self.counters(hero_id, patches), min_games, n)
+
+
+def _to_stats(games: np.ndarray, wins: np.ndarray) -> List[PairStat]:
+    return [PairStat(int(hid), int(games[hid]), int(wins[hid])) for hid in np.flatnonzero(games)]
+
+
+def _best(stats: List[PairStat], min_games: int, n: int) -> List[PairStat]:
+    eligible = [s for s in stats if s.games >= min_games]
+    return sorted(eligible, key=lambda s: (s.win_rate, s.games), reverse=True)[:n]
+
+
+_index_lock = threading.Lock()
+_index: Optional[HeroMatrixIndex] = None
+
+
+def get_hero_matrix() -> HeroMatrixIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = HeroMatrixIndex()
+    _index.set_patch_timeline(PatchManager().get_patch_timeline())
+    return _index.sync()
@@ -0,0 +1,253 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Dict, List, Optional, Set, Tuple
+import numpy as np
+import pandas as pd
+from sqlalchemy.orm import Session
+from models import Match
+from services.draft_record import DraftRecord
+from services.match_index import SnapshotIndex, db_fingerprint
+from services.patch_manager import PatchManager, find_patch
+
+DATA_DIR = "data"
+TRENDS_FILE = os.path.join(DATA_DIR, "cache", "hero_trends.npz")
+FORMAT_VERSION = 2
+UNKNOWN_PATCH = "未知版本"
+
+ROLE_PICK, ROLE_BAN = 0, 1
+WEEKLY, PER_PATCH = "week", "patch"
+MAX_CACHED_SERIES = 64
+
+# Columnar frame: one row per hero action / per game perspective
+_EVENT_COLS = {"day": np.int32, "team": np.int32, "patch": np.int32, "hero": np.int16, "role": np.int8, "win": bool}
+_GAME_COLS = {"day": np.int32, "team": np.int32, "patch": np.int32, "win": bool, "primary": bool}
+SERIES_COLUMNS = ["period", "hero_id", "picks", "pick_wins", "bans", "games"]
+
+
+def _week_start(days: np.ndarray) -> np.ndarray:
+    # date.fromordinal(1) is a Monday, so this floors each day to its week's Monday
+    return days - (days - 1) % 7
+
+
+class HeroTrendIndex(SnapshotIndex):
+    """
+    英雄 Pick / Ban / 胜负的时间序列，底层是一张紧凑的列式表 (numpy 数组，不保留 ORM 对象):
+    - events: (日期, 战队, 版本, 英雄, Pick/Ban, 是否获胜)，每场比赛按双方视角各记一次自己的动作
+    - games: (日期, 战队, 版本, 是否获胜, 是否该场的首条记录)，用于计算比率
+    双视角记录按 (战队, match_id) 去重。列式表与数据库指纹一起 (按 SnapshotIndex 的节奏) 落盘，
+    重启后直接加载，去重集合从数据库推出。
+    按 (战队 / 全库, 周 / 版本) 聚合后的序列会缓存，新比赛入库时只重算受影响的周期。
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._timeline: List[Tuple[str, str]] = []
+        self._generation = 0
+        self._series: "OrderedDict[Tuple[Optional[str], str], Tuple[int, int, int, pd.DataFrame]]" = OrderedDict()
+        self._reset()
+
+    def set_patch_timeline(self, timeline: List[Tuple[str, str]]):
+        if timeline != self._timeline:
+            self._timeline = list(timeline)
+            self.invalidate()
+
+    # --- IncrementalIndex hooks ---
+
+    def _reset(self):
+        self._events = {c: np.zeros(0, dtype=t) for c, t in _EVENT_COLS.items()}
+        self._games = {c: np.zeros(0, dtype=t) for c, t in _GAME_COLS.items()}
+        self._event_buf: Dict[str, list] = {c: [] for c in _EVENT_COLS}
+        self._game_buf: Dict[str, list] = {c: [] for c in _GAME_COLS}
+        self._team_codes: Dict[str, int] = {}
+        self._patch_codes: Dict[str, int] = {}
+        self._seen: Set[str] = set()        # "team\x1fgame"
+        self._seen_games: Set[str] = set()
+        self._generation += 1
+        self._series.clear()
+
+    def _rebuild(self, db: Session):
+        if not self._load(db):
+            super()._rebuild(db)
+
+    def _add(self, d: DraftRecord):
+        game_key = d.match_id or f"pk{d.match_pk}"
+        patch = d.patch_version or find_patch(self._timeline, d.match_time) or UNKNOWN_PATCH
+        patch_code = self._patch_codes.setdefault(patch, len(self._patch_codes))
+        day = d.match_time.toordinal() if d.match_time else 0
+
+        for team, side, won in ((d.team_name, d.my_side, d.win), (d.opponent_name, d.opp_side, not d.win)):
+            seen_key = f"{team}\x1f{game_key}"
+            if not team or seen_key in self._seen:
+                continue
+            self._seen.add(seen_key)
+            team_code = self._team_codes.setdefault(team, len(self._team_codes))
+
+            for col, v in zip(_GAME_COLS, (day, team_code, patch_code, won, game_key not in self._seen_games)):
+                self._game_buf[col].append(v)
+            self._seen_games.add(game_key)
+
+            for a in d.actions:
+                if a.team_side != side:
+                    continue
+                for col, v in zip(_EVENT_COLS, (day, team_code, patch_code, a.hero_id, ROLE_PICK if a.is_pick else ROLE_BAN, won)):
+                    self._event_buf[col].append(v)
+
+    def _commit(self, db: Session):
+        for frame, buf, cols in ((self._events, self._event_buf, _EVENT_COLS), (self._games, self._game_buf, _GAME_COLS)):
+            if buf[next(iter(cols))]:
+                for c, t in cols.items():
+                    frame[c] = np.concatenate([frame[c], np.asarray(buf[c], dtype=t)])
+                    buf[c] = []
+        super()._commit(db)
+
+    # --- Disk ---
+
+    def _save(self, fingerprint: Tuple[int, int, int]):
+        meta = {
+            "format": FORMAT_VERSION,
+            "fingerprint": list(fingerprint),
+            "timeline": [list(t) for t in self._timeline],
+            "teams": sorted(self._team_codes, key=self._team_codes.get),
+            "patches": sorted(self._patch_codes, key=self._patch_codes.get)
+        }
+        arrays = {f"ev_{c}": v for c, v in self._events.items()}
+        arrays.update({f"gm_{c}": v for c, v in self._games.items()})
+        os.makedirs(os.path.dirname(TRENDS_FILE), exist_ok=True)
+        tmp_path = TRENDS_FILE + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            meta=np.array(json.dumps(meta, ensure_ascii=False)),
+            **arrays
+        )
+        os.replace(tmp_path, TRENDS_FILE)
+
+    def _load(self, db: Session) -> bool:
+        """落盘的列式表与当前数据库 / 版本表一致时直接加载，返回是否成功"""
+        try:
+            with np.load(TRENDS_FILE) as data:
+                meta = json.loads(str(data["meta"]))
+                count, max_id, version = db_fingerprint(db)
+                if (meta.get("format") != FORMAT_VERSION
+                        or meta.get("fingerprint") != [count, max_id, version]
+                        or meta.get("timeline") != [list(t) for t in self._timeline]):
+                    return False
+                events = {c: data[f"ev_{c}"].astype(t) for c, t in _EVENT_COLS.items()}
+                games = {c: data[f"gm_{c}"].astype(t) for c, t in _GAME_COLS.items()}
+        except (OSError, KeyError, ValueError):
+            return False
+
+        self._reset()
+        self._events, self._games = events, games
+        # The fingerprint matches, so both perspectives of every game in the database are in the table
+        for team_name, opponent_name, match_id, pk in db.query(Match.team_name, Match.opponent_name, Match.match_id, Match.id):
+            game_key = match_id or f"pk{pk}"
+            teams = [team for team in (team_name, opponent_name) if team]
+            if teams:
+                self._seen_games.add(game_key)
+                self._seen.update(f"{team}\x1f{game_key}" for team in teams)
+        self._team_codes = {name: i for i, name in enumerate(meta["teams"])}
+        self._patch_codes = {name: i for i, name in enumerate(meta["patches"])}
+        self._max_pk = max_id
+        self._mark_saved()
+        return True
+
+    # --- Queries ---
+
+    def teams(self) -> List[str]:
+        return sorted(self._team_codes)
+
+    def series(self, team: Optional[str] = None, freq: str = WEEKLY) -> pd.DataFrame:
+        """
+        每个周期 (周一日期 / 版本名) 每个英雄的 picks / pick_wins / bans，以及该周期的场次 games。
+        team=None 为全库 (每场比赛只计一次)。按版本时按版本开始日期排序。
+        """
+        key = (team, freq)
+        n_events, n_games = len(self._events["day"]), len(self._games["day"])
+        cached = self._series.get(key)
+        if cached is not None and cached[0] == self._generation and cached[1:3] == (n_events, n_games):
+            self._series.move_to_end(key)
+            return self._labelled(cached[3], freq)
+
+        if cached is not None and cached[0] == self._generation:
+            # Only new rows arrived: recompute just the periods they fall into
+            _, old_events, old_games, df = cached
+            ev_new = self._scope(self._events, team, old_events)
+            gm_new = self._scope(self._games, team, old_games)
+            touched = np.union1d(self._period(self._events, freq)[ev_new], self._period(self._games, freq)[gm_new])
+            if touched.size:
+                df = pd.concat([df[~df["period"].isin(touched)], self._aggregate(team, freq, touched)], ignore_index=True)
+        else:
+            df = self._aggregate(team, freq)
+
+        df = df.sort_values(["period", "hero_id"], ignore_index=True)
+        self._series[key] = (self._generation, n_events, n_games, df)
+        self._series.move_to_end(key)
+        while len(self._series) > MAX_CACHED_SERIES:
+            self._series.popitem(last=False)
+        return self._labelled(df, freq)
+
+    def _scope(self, frame: Dict[str, np.ndarray], team: Optional[str], start: int = 0) -> np.ndarray:
+        """frame 中属于该范围的行号 (从 start 开始)"""
+        n = len(frame["day"])
+        if team is None:
+            mask = frame["primary"][start:] if "primary" in frame else np.ones(n - start, dtype=bool)
+        else:
+            mask = frame["team"][start:] == self._team_codes.get(team, -1)
+        return np.flatnonzero(mask) + start
+
+    def _period(self, frame: Dict[str, np.ndarray], freq: str) -> np.ndarray:
+        return _week_start(frame["day"]) if freq == WEEKLY else frame["patch"]
+
+    def _aggregate(self, team: Optional[str], freq: str, periods: Optional[np.ndarray] = None) -> pd.DataFrame:
+        ev_rows = self._scope(self._events, team)
+        gm_rows = self._scope(self._games, team)
+        if freq == WEEKLY:
+            # Games without a match time (day 0) only count towards the per-patch series
+            ev_rows = ev_rows[self._events["day"][ev_rows] > 0]
+            gm_rows = gm_rows[self._games["day"][gm_rows] > 0]
+        ev_period = self._period(self._events, freq)[ev_rows]
+        gm_period = self._period(self._games, freq)[gm_rows]
+        if periods is not None:
+            keep = np.isin(ev_period, periods)
+            ev_rows, ev_period = ev_rows[keep], ev_period[keep]
+            gm_period = gm_period[np.isin(gm_period, periods)]
+
+        is_pick = self._events["role"][ev_rows] == ROLE_PICK
+        events = pd.DataFrame({
+            "period": ev_period,
+            "hero_id": self._events["hero"][ev_rows].astype(np.int64),
+            "picks": is_pick.astype(np.int64),
+            "pick_wins": (is_pick & self._events["win"][ev_rows]).astype(np.int64),
+            "bans": (~is_pick).astype(np.int64)
+        })
+        df = events.groupby(["period", "hero_id"], as_index=False, sort=False).sum()
+        games = pd.Series(gm_period).value_counts()
+        df["games"] = df["period"].map(games).fillna(0).astype(np.int64)
+        return df[SERIES_COLUMNS]
+
+    def _labelled(self, df: pd.DataFrame, freq: str) -> pd.DataFrame:
+        out = df.copy()
+        if freq == WEEKLY:
+            out["period"] = pd.to_datetime([date.fromordinal(int(p)) for p in out["period"]]) if len(out) else pd.Series(dtype="datetime64[ns]")
+            return out
+        names = sorted(self._patch_codes, key=self._patch_codes.get)
+        order = {name: start for start, name in self._timeline}
+        categories = sorted(names, key=lambda p: order.get(p, ""))
+        out["period"] = pd.Categorical([names[int(p)] for p in out["period"]], categories=categories, ordered=True)
+        return out.sort_values(["period", "hero_id"], ignore_index=True)
+
+
+_index_lock = threading.Lock()
+_index: Optional[HeroTrendIndex] = None
+
+
+def get_hero_trends() -> HeroTrendIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = HeroTrendIndex()
+    _index.set_patch_timeline(PatchManager().get_patch_timeline())
+    return _index.sync()
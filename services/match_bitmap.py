@@ -0,0 +1,263 @@
+import threading
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
+from sqlalchemy.orm import Session
+from services.draft_record import DraftRecord
+from services.match_index import IncrementalIndex
+from services.patch_manager import PatchManager, find_patch
+
+UNKNOWN_PATCH = "未知版本"
+
+# Dimensions. Keys are (dimension, value); hero dimensions are from the row team's point of view.
+TEAM, OPPONENT, LEAGUE, PATCH, SCRIM, RADIANT, FIRST_PICK, WIN = (
+    "team", "opponent", "league", "patch", "scrim", "radiant", "first_pick", "win"
+)
+MY_PICK, OPP_PICK, MY_BAN, OPP_BAN = "my_pick", "opp_pick", "my_ban", "opp_ban"
+MY_POS_HERO, OPP_POS_HERO = "my_pos_hero", "opp_pos_hero"   # value: (position, hero_id)
+
+Key = Tuple[str, object]
+
+
+@dataclass(frozen=True)
+class BitmapQuery:
+    """
+    以一支战队视角 (team) 的组合筛选条件。
+    同一维度内多个取值为 "或" (如多个联赛)，英雄类条件为 "且" (如 "选了 A 和 B")，
+    不同维度之间为 "且"。空元组 / None 表示不限。
+    """
+    teams: Tuple[str, ...] = ()
+    opponents: Tuple[str, ...] = ()
+    league_ids: Tuple[int, ...] = ()
+    patches: Tuple[str, ...] = ()
+    is_scrim: Optional[bool] = None
+    is_radiant: Optional[bool] = None
+    first_pick: Optional[bool] = None
+    win: Optional[bool] = None
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    my_picks: Tuple[int, ...] = ()
+    opp_picks: Tuple[int, ...] = ()
+    my_bans: Tuple[int, ...] = ()
+    opp_bans: Tuple[int, ...] = ()
+    my_pos_heroes: Tuple[Tuple[int, int], ...] = ()    # (position, hero_id)
+    opp_pos_heroes: Tuple[Tuple[int, int], ...] = ()
+    match_id_contains: str = ""
+
+
+def _bits_from_rows(rows: List[int]) -> int:
+    """行号列表 -> 位图 (Python int，第 i 位 = 第 i 行)"""
+    if not rows:
+        return 0
+    base = min(rows)
+    arr = np.zeros(max(rows) - base + 1, dtype=bool)
+    arr[np.asarray(rows) - base] = True
+    return int.from_bytes(np.packbits(arr, bitorder="little").tobytes(), "little") << base
+
+
+def _bits_from_mask(mask: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(mask, bitorder="little").tobytes(), "little")
+
+
+class MatchBitmapIndex(IncrementalIndex):
+    """
+    比赛的内存位图索引。每场比赛按双方视角各占一行 (双视角记录按 (战队, match_id) 去重，
+    只录了单方的比赛也会补出对手视角的一行；该队自己的记录入库后，这一行改指向它)，每个 (维度, 取值) 一张位图:
+    战队 / 对手 / 联赛 / 版本 / 阵营 / 先后手 / 胜负，以及每个英雄的 我方选 / 对手选 / 我方禁 / 对手禁
+    和 (位置, 英雄)。位图用 Python 大整数存储，任意组合条件都只是几次 & | 运算。
+    新比赛入库时只把新行的位 OR 进受影响的位图。
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._timeline: List[Tuple[str, str]] = []
+        self._reset()
+
+    def set_patch_timeline(self, timeline: List[Tuple[str, str]]):
+        if timeline != self._timeline:
+            self._timeline = list(timeline)
+            self.invalidate()
+
+    def _reset(self):
+        self._bitmaps: Dict[Key, int] = {}
+        self._row_of: Dict[Tuple[str, str], int] = {}   # (team, game) -> row
+        self._own_rows: Set[int] = set()                   # rows pointing at the team's own record
+        self._rows = 0
+        self._all = 0
+        self._pks = np.zeros(0, dtype=np.int64)        # row -> Match.id (source record)
+        self._days = np.zeros(0, dtype=np.int64)       # row -> match date ordinal
+        self._stamps = np.zeros(0, dtype=np.float64)   # row -> match timestamp, for ordering
+        self._match_ids: List[str] = []
+        self._pending_rows: Dict[Key, List[int]] = {}
+        self._pending_meta: List[Tuple[int, int, float, str]] = []
+
+    def _add(self, d: DraftRecord):
+        game_key = d.match_id or f"pk{d.match_pk}"
+        patch = d.patch_version or find_patch(self._timeline, d.match_time) or UNKNOWN_PATCH
+        mine_picks, opp_picks = d.my_pick_ids, d.opp_pick_ids
+        mine_bans = tuple(a.hero_id for a in d.my_bans)
+        opp_bans = tuple(a.hero_id for a in d.opp_bans)
+
+        for flipped in (False, True):
+            team = d.opponent_name if flipped else d.team_name
+            if not team:
+                continue
+            row = self._row_of.get((team, game_key))
+            if row is not None:
+                if not flipped and row not in self._own_rows:
+                    # Synthesized from the opponent's record: show this team's own record instead
+                    self._set_pk(row, d.match_pk)
+                    self._own_rows.add(row)
+                continue
+            self._row_of[(team, game_key)] = row = self._rows
+            if not flipped:
+                self._own_rows.add(row)
+            self._rows += 1
+
+            keys: List[Key] = [
+                (TEAM, team),
+                (OPPONENT, d.team_name if flipped else d.opponent_name),
+                (LEAGUE, d.league_id),
+                (PATCH, patch),
+                (SCRIM, d.is_scrim),
+                (RADIANT, d.is_radiant != flipped),
+                (FIRST_PICK, d.first_pick != flipped),
+                (WIN, d.win != flipped),
+            ]
+            picks, o_picks = (opp_picks, mine_picks) if flipped else (mine_picks, opp_picks)
+            bans, o_bans = (opp_bans, mine_bans) if flipped else (mine_bans, opp_bans)
+            pos, o_pos = (d.opp_pos_heroes, d.my_pos_heroes) if flipped else (d.my_pos_heroes, d.opp_pos_heroes)
+            keys += [(MY_PICK, h) for h in picks] + [(OPP_PICK, h) for h in o_picks]
+            keys += [(MY_BAN, h) for h in bans] + [(OPP_BAN, h) for h in o_bans]
+            keys += [(MY_POS_HERO, (i + 1, h)) for i, h in enumerate(pos) if h]
+            keys += [(OPP_POS_HERO, (i + 1, h)) for i, h in enumerate(o_pos) if h]
+
+            for key in keys:
+                self._pending_rows.setdefault(key, []).append(row)
+            when = d.match_time
+            self._pending_meta.append((
+                d.match_pk,
+                when.toordinal() if when else 0,
+                when.timestamp() if when else 0.0,
+                d.match_id or ""
+            ))
+
+    def _set_pk(self, row: int, pk: int):
+        committed = len(self._pks)
+        if row < committed:
+            self._pks[row] = pk
+        else:
+            self._pending_meta[row - committed] = (pk,) + self._pending_meta[row - committed][1:]
+
+    def _commit(self, db: Session):
+        if not self._pending_meta:
+            return
+        for key, rows in self._pending_rows.items():
+            self._bitmaps[key] = self._bitmaps.get(key, 0) | _bits_from_rows(rows)
+        pks, days, stamps, match_ids = zip(*self._pending_meta)
+        self._pks = np.concatenate([self._pks, np.asarray(pks, dtype=np.int64)])
+        self._days = np.concatenate([self._days, np.asarray(days, dtype=np.int64)])
+        self._stamps = np.concatenate([self._stamps, np.asarray(stamps, dtype=np.float64)])
+        self._match_ids.extend(match_ids)
+        self._all = (1 << self._rows) - 1
+        self._pending_rows = {}
+        self._pending_meta = []
+
+    # --- Bitmap algebra ---
+
+    def __len__(self) -> int:
+        return self._rows
+
+    def get(self, dimension: str, value) -> int:
+        return self._bitmaps.get((dimension, value), 0)
+
+    def any_of(self, dimension: str, values: Iterable) -> int:
+        bits = 0
+        for v in values:
+            bits |= self.get(dimension, v)
+        return bits
+
+    def all_of(self, dimension: str, values: Iterable) -> int:
+        bits = self._all
+        for v in values:
+            bits &= self.get(dimension, v)
+            if not bits:
+                break
+        return bits
+
+    def values(self, dimension: str) -> List:
+        return [v for dim, v in self._bitmaps if dim == dimension]
+
+    def date_range(self, start: Optional[date] = None, end: Optional[date] = None) -> int:
+        mask = np.ones(self._rows, dtype=bool)
+        if start:
+            mask &= self._days >= start.toordinal()
+        if end:
+            mask &= self._days <= end.toordinal()
+        return _bits_from_mask(mask)
+
+    def match_id_contains(self, text: str) -> int:
+        return _bits_from_rows([i for i, mid in enumerate(self._match_ids) if text in mid])
+
+    def evaluate(self, q: BitmapQuery) -> int:
+        bits = self._all
+        for dim, values in (
+            (TEAM, q.teams), (OPPONENT, q.opponents), (LEAGUE, q.league_ids), (PATCH, q.patches)
+        ):
+            if values:
+                bits &= self.any_of(dim, values)
+        for dim, value in (
+            (SCRIM, q.is_scrim), (RADIANT, q.is_radiant), (FIRST_PICK, q.first_pick), (WIN, q.win)
+        ):
+            if value is not None:
+                bits &= self.get(dim, value)
+        for dim, values in (
+            (MY_PICK, q.my_picks), (OPP_PICK, q.opp_picks), (MY_BAN, q.my_bans), (OPP_BAN, q.opp_bans),
+            (MY_POS_HERO, q.my_pos_heroes), (OPP_POS_HERO, q.opp_pos_heroes)
+        ):
+            if values and bits:
+                bits &= self.all_of(dim, values)
+        if (q.start_date or q.end_date) and bits:
+            bits &= self.date_range(q.start_date, q.end_date)
+        if q.match_id_contains and bits:
+            bits &= self.match_id_contains(q.match_id_contains)
+        return bits
+
+    # --- Results ---
+
+    def count(self, bits: int) -> int:
+        return bits.bit_count()
+
+    def rows(self, bits: int) -> np.ndarray:
+        if not bits:
+            return np.zeros(0, dtype=np.int64)
+        raw = np.frombuffer(bits.to_bytes((bits.bit_length() + 7) // 8, "little"), dtype=np.uint8)
+        return np.flatnonzero(np.unpackbits(raw, bitorder="little"))
+
+    def match_pks(self, bits: int, limit: Optional[int] = None) -> List[int]:
+        """命中行对应的 Match 主键，按比赛时间倒序，同一场比赛只返回一次"""
+        rows = self.rows(bits)
+        rows = rows[np.lexsort((-self._pks[rows], -self._stamps[rows]))]
+        pks: List[int] = []
+        seen: Set[int] = set()
+        for pk in self._pks[rows].tolist():
+            if pk not in seen:
+                seen.add(pk)
+                pks.append(pk)
+                if limit and len(pks) >= limit:
+                    break
+        return pks
+
+
+_index_lock = threading.Lock()
+_index: Optional[MatchBitmapIndex] = None
+
+
+def get_match_bitmaps() -> MatchBitmapIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = MatchBitmapIndex()
+    _index.set_patch_timeline(PatchManager().get_patch_timeline())
+    return _index.sync()
@@ -0,0 +1,113 @@
+import threading
+from typing import Callable, List, Set
+from sqlalchemy import event
+from database import SessionLocal
+
+# Tables whose rows feed the derived draft data (DraftRecord, statistics caches)
+DRAFT_TABLES = {"matches", "pick_bans", "player_performances"}
+
+_lock = threading.Lock()
+_data_version = 0
+
+# Ingest listeners: callback(version, new_match_pks, rewritten)
+_subscribers: List[Callable[[int, Set[int], bool], None]] = []
+
+
+def get_data_version() -> int:
+    """
+    进程内的比赛数据版本号。
+    任何涉及 Match / PickBan / PlayerPerformance 的提交都会让版本号 +1，
+    派生缓存以 (主键, 版本号) 作为失效依据。
+    """
+    return _data_version
+
+
+def get_stored_version(db) -> int:
+    """
+    数据库内持久化的比赛数据版本号 (SQLite PRAGMA user_version)。
+    与改动在同一事务中 +1，进程重启后仍然有效，
+    落盘的派生数据据此识别对已有比赛的修改 (比赛数 / 最大主键不变的情况)。
+    """
+    return db.connection().exec_driver_sql("PRAGMA user_version").scalar() or 0
+
+
+def _bump_stored_version(session):
+    # Once per transaction is enough: nobody else sees the intermediate flushes
+    if session.info.get("stored_version_bumped"):
+        return
+    conn = session.connection()
+    version = conn.exec_driver_sql("PRAGMA user_version").scalar() or 0
+    conn.exec_driver_sql(f"PRAGMA user_version = {version + 1}")
+    session.info["stored_version_bumped"] = True
+
+
+def subscribe(callback: Callable[[int, Set[int], bool], None]):
+    """
+    注册入库监听器，每次改动比赛数据的提交后调用:
+    callback(新版本号, 本次新增的 Match 主键, rewritten)
+    rewritten=True 表示还修改/删除了已有数据，增量结构需要整体重建；
+    否则只需把新增的比赛累加进去。
+    """
+    with _lock:
+        _subscribers.append(callback)
+
+
+def _touches_draft_tables(objects) -> bool:
+    return any(getattr(obj, "__tablename__", None) in DRAFT_TABLES for obj in objects)
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _track_flush(session, flush_context):
+    if (_touches_draft_tables(session.new)
+            or _touches_draft_tables(session.dirty)
+            or _touches_draft_tables(session.deleted)):
+        session.info["draft_data_changed"] = True
+        _bump_stored_version(session)
+
+    new_pks = session.info.setdefault("new_match_pks", set())
+    for obj in session.new:
+        table = getattr(obj, "__tablename__", None)
+        if table == "matches":
+            new_pks.add(obj.id)
+        elif table in DRAFT_TABLES and obj.match_id not in new_pks:
+            # Rows added to a match that was committed earlier
+            session.info["draft_data_rewritten"] = True
+    if _touches_draft_tables(session.dirty) or _touches_draft_tables(session.deleted):
+        session.info["draft_data_rewritten"] = True
+
+
+@event.listens_for(SessionLocal, "do_orm_execute")
+def _track_bulk(orm_execute_state):
+    # Bulk query.update()/query.delete() bypass the flush
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and mapper.local_table.name in DRAFT_TABLES:
+            orm_execute_state.session.info["draft_data_changed"] = True
+            orm_execute_state.session.info["draft_data_rewritten"] = True
+            _bump_stored_version(orm_execute_state.session)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _bump_version(session):
+    global _data_version
+    new_pks = session.info.pop("new_match_pks", set())
+    rewritten = session.info.pop("draft_data_rewritten", False)
+    session.info.pop("stored_version_bumped", None)
+    if session.info.pop("draft_data_changed", False):
+        with _lock:
+            _data_version += 1
+            version = _data_version
+            subscribers = list(_subscribers)
+        for callback in subscribers:
+            try:
+                callback(version, new_pks, rewritten)
+            except Exception as e:
+                print(f"Ingest listener failed: {e}")
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_changes(session):
+    session.info.pop("draft_data_changed", None)
+    session.info.pop("new_match_pks", None)
+    session.info.pop("draft_data_rewritten", None)
+    session.info.pop("stored_version_bumped", None)
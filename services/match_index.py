@@ -0,0 +1,158 @@
+import atexit
+import threading
+import time
+from typing import Optional, Set, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import Match
+from services.draft_record import DraftRecord
+from services.match_events import get_stored_version, subscribe
+from services.team_stats import iter_match_drafts
+
+# SQLite bound-parameter limit is 999 on older builds
+_IN_CHUNK = 500
+
+# Whole-snapshot saves (SnapshotIndex) happen at most this often while matches stream in, and at exit
+SAVE_INTERVAL = 300
+
+
+def db_fingerprint(db: Session) -> Tuple[int, int, int]:
+    """
+    (比赛数, 最大主键, 持久化数据版本号)，用于判断落盘的派生数据是否还对应当前数据库。
+    版本号覆盖对已有比赛 / BP / 选手数据的修改与删除后重新录入。
+    """
+    count, max_id = db.query(func.count(Match.id), func.max(Match.id)).one()
+    return count or 0, max_id or 0, get_stored_version(db)
+
+
+class IncrementalIndex:
+    """
+    基于全部比赛的增量派生结构 (近期状态、版本元数据等) 的基类。
+    - 首次使用或已有数据被修改/删除时，sync() 整体重建 (_reset + 逐场 _add)
+    - 只有新比赛入库时，sync() 只把新增的 Match 逐场 _add 进来，每场 O(1)
+    子类实现 _reset() / _add(draft)，需要时可覆盖 _rebuild(db) (如从磁盘加载)
+    和 _commit(db) (每次 sync 有变化后调用，如落盘)。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()          # held while syncing
+        self._pending_lock = threading.Lock()  # guards _pending / _stale
+        self._pending: Set[int] = set()
+        self._stale = True
+        self._max_pk = 0
+        subscribe(self._on_commit)
+
+    def _on_commit(self, version: int, new_pks: Set[int], rewritten: bool):
+        with self._pending_lock:
+            if rewritten:
+                self._stale = True
+                self._pending.clear()
+            elif not self._stale:
+                self._pending.update(new_pks)
+
+    def invalidate(self):
+        """外部依赖 (如版本日期表) 变化时调用，下次 sync() 整体重建"""
+        with self._pending_lock:
+            self._stale = True
+            self._pending.clear()
+
+    def sync(self):
+        """把结构更新到数据库当前状态，返回 self"""
+        with self._lock:
+            with self._pending_lock:
+                stale, self._stale = self._stale, False
+                pending, self._pending = self._pending, set()
+
+            if not stale and not pending:
+                return self
+
+            db = SessionLocal()
+            try:
+                if stale:
+                    self._max_pk = 0
+                    self._rebuild(db)
+                else:
+                    # Matches already picked up by a rebuild that ran concurrently are skipped
+                    new_pks = sorted(pk for pk in pending if pk > self._max_pk)
+                    for i in range(0, len(new_pks), _IN_CHUNK):
+                        chunk = new_pks[i:i + _IN_CHUNK]
+                        for draft in iter_match_drafts(db, db.query(Match).filter(Match.id.in_(chunk))):
+                            self._track(draft)
+                self._commit(db)
+            except Exception:
+                with self._pending_lock:
+                    self._stale = True
+                raise
+            finally:
+                db.close()
+        return self
+
+    def _track(self, draft: DraftRecord):
+        self._add(draft)
+        if draft.match_pk > self._max_pk:
+            self._max_pk = draft.match_pk
+
+    def _rebuild(self, db: Session):
+        self._reset()
+        for draft in iter_match_drafts(db, db.query(Match)):
+            self._track(draft)
+
+    def _commit(self, db: Session):
+        pass
+
+    def _reset(self):
+        raise NotImplementedError
+
+    def _add(self, draft: DraftRecord):
+        raise NotImplementedError
+
+
+class SnapshotIndex(IncrementalIndex):
+    """
+    以整体快照落盘的增量结构 (快照大小随历史增长)。
+    _commit 只记下数据库指纹并标记待保存；距上次保存超过 SAVE_INTERVAL 秒时才调用
+    _save(fingerprint)，进程退出时再保存一次。没保存上的改动只会让下次启动时指纹不符而重建。
+    子类在 _commit 末尾调用 super()._commit(db)，_load 成功时调用 _mark_saved()。
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._fingerprint: Optional[Tuple[int, int, int]] = None
+        self._dirty = False
+        self._last_save = 0.0
+        atexit.register(self.flush)
+
+    def flush(self):
+        """立即保存尚未落盘的状态"""
+        # Bounded wait: at exit a sync may still be running in another thread
+        if not self._lock.acquire(timeout=10):
+            return
+        try:
+            self._flush()
+        finally:
+            self._lock.release()
+
+    def _commit(self, db: Session):
+        self._fingerprint = db_fingerprint(db)
+        self._dirty = True
+        if time.monotonic() - self._last_save >= SAVE_INTERVAL:
+            self._flush()
+
+    def _flush(self):
+        # Caller holds self._lock
+        if not self._dirty:
+            return
+        try:
+            self._save(self._fingerprint)
+        except OSError as e:
+            print(f"Index save failed: {e}")
+            return
+        self._mark_saved()
+
+    def _mark_saved(self):
+        self._dirty = False
+        self._last_save = time.monotonic()
+
+    def _save(self, fingerprint: Tuple[int, int, int]):
+        raise NotImplementedError
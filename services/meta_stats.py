@@ -0,0 +1,180 @@
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy.orm import Session
+from models import League
+from services.draft_record import DraftRecord
+from services.match_index import IncrementalIndex
+from services.patch_manager import PatchManager, find_patch
+
+# Captain's Mode first phase: 1-based orders 1-9 (7 bans + first two picks)
+FIRST_PHASE_LAST_ORDER = 9
+
+SCRIM_TIER = "scrim"
+UNKNOWN_TIER = "unknown"
+UNKNOWN_PATCH = "未知版本"
+
+# Per-hero counter layout
+PICKS, PICK_WINS, BANS, CONTESTED, FIRST_PHASE = range(5)
+
+
+class MetaCell:
+    """一个 (版本, 联赛) 分组内每个英雄的 Pick/Ban 计数，每场比赛只计一次"""
+
+    def __init__(self):
+        self.games = 0
+        self.heroes: Dict[int, List[int]] = {}
+
+    def _counts(self, hero_id: int) -> List[int]:
+        c = self.heroes.get(hero_id)
+        if c is None:
+            c = self.heroes[hero_id] = [0, 0, 0, 0, 0]
+        return c
+
+    def add(self, d: DraftRecord):
+        self.games += 1
+        radiant_win = d.radiant_win
+        contested: Set[int] = set()
+        first_phase: Set[int] = set()
+        for a in d.actions:
+            c = self._counts(a.hero_id)
+            if a.is_pick:
+                c[PICKS] += 1
+                if (a.team_side == 0) == radiant_win:
+                    c[PICK_WINS] += 1
+            else:
+                c[BANS] += 1
+            contested.add(a.hero_id)
+            if a.order + 1 <= FIRST_PHASE_LAST_ORDER:
+                first_phase.add(a.hero_id)
+        for hid in contested:
+            self.heroes[hid][CONTESTED] += 1
+        for hid in first_phase:
+            self.heroes[hid][FIRST_PHASE] += 1
+
+    def merge(self, other: "MetaCell"):
+        self.games += other.games
+        for hid, counts in other.heroes.items():
+            c = self._counts(hid)
+            for i, v in enumerate(counts):
+                c[i] += v
+
+
+@dataclass(frozen=True)
+class HeroMeta:
+    hero_id: int
+    picks: int
+    pick_wins: int
+    bans: int
+    contested: int
+    first_phase: int
+    games: int
+
+    @property
+    def pick_rate(self) -> float:
+        return self.picks / self.games if self.games else 0.0
+
+    @property
+    def ban_rate(self) -> float:
+        return self.bans / self.games if self.games else 0.0
+
+    @property
+    def contest_rate(self) -> float:
+        return self.contested / self.games if self.games else 0.0
+
+    @property
+    def win_rate(self) -> float:
+        return self.pick_wins / self.picks if self.picks else 0.0
+
+    @property
+    def first_phase_rate(self) -> float:
+        return self.first_phase / self.games if self.games else 0.0
+
+
+class MetaIndex(IncrementalIndex):
+    """
+    全库英雄生态 (所有战队)，按 (版本, 联赛 ID / 训练赛) 预聚合。
+    同一场比赛的双视角记录按 match_id 去重；联赛级别在查询时再映射，
+    所以 League 表更新不需要重建。
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._timeline: List[Tuple[str, str]] = []
+        self._cells: Dict[Tuple[str, object], MetaCell] = {}
+        self._seen: Set[str] = set()
+
+    def set_patch_timeline(self, timeline: List[Tuple[str, str]]):
+        # Patch dates decide which cell a match lands in
+        if timeline != self._timeline:
+            self._timeline = list(timeline)
+            self.invalidate()
+
+    def _reset(self):
+        self._cells = {}
+        self._seen = set()
+
+    def _add(self, d: DraftRecord):
+        game_key = d.match_id or f"pk{d.match_pk}"
+        if game_key in self._seen:
+            return
+        self._seen.add(game_key)
+
+        patch = d.patch_version or find_patch(self._timeline, d.match_time) or UNKNOWN_PATCH
+        league_key = SCRIM_TIER if d.is_scrim else d.league_id
+        cell = self._cells.get((patch, league_key))
+        if cell is None:
+            cell = self._cells[(patch, league_key)] = MetaCell()
+        cell.add(d)
+
+    def patches(self) -> List[str]:
+        """有数据的版本，按开始日期倒序"""
+        order = {name: start for start, name in self._timeline}
+        names = {patch for patch, _ in self._cells}
+        return sorted(names, key=lambda p: order.get(p, ""), reverse=True)
+
+    def tiers(self, db: Session) -> List[str]:
+        tier_map = _league_tiers(db)
+        return sorted({_tier_of(key, tier_map) for _, key in self._cells})
+
+    def hero_meta(self, db: Session, patches: Optional[Iterable[str]] = None, tiers: Optional[Iterable[str]] = None) -> Tuple[int, List[HeroMeta]]:
+        """合并所选版本 / 联赛级别的分组，返回 (总场次, 每个英雄的统计)"""
+        patches = set(patches) if patches else None
+        tiers = set(tiers) if tiers else None
+        tier_map = _league_tiers(db) if tiers else {}
+
+        merged = MetaCell()
+        for (patch, league_key), cell in list(self._cells.items()):
+            if patches is not None and patch not in patches:
+                continue
+            if tiers is not None and _tier_of(league_key, tier_map) not in tiers:
+                continue
+            merged.merge(cell)
+
+        return merged.games, [
+            HeroMeta(hid, c[PICKS], c[PICK_WINS], c[BANS], c[CONTESTED], c[FIRST_PHASE], merged.games)
+            for hid, c in merged.heroes.items()
+        ]
+
+
+def _league_tiers(db: Session) -> Dict[int, str]:
+    return {league_id: (tier or UNKNOWN_TIER).lower() for league_id, tier in db.query(League.league_id, League.tier).all()}
+
+
+def _tier_of(league_key, tier_map: Dict[int, str]) -> str:
+    if league_key == SCRIM_TIER:
+        return SCRIM_TIER
+    return tier_map.get(league_key, UNKNOWN_TIER)
+
+
+_index_lock = threading.Lock()
+_index: Optional[MetaIndex] = None
+
+
+def get_meta_index() -> MetaIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = MetaIndex()
+    _index.set_patch_timeline(PatchManager().get_patch_timeline())
+    return _index.sync()
@@ -1,13 +1,20 @@
+import bisect
 import json
 import os
 import requests
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
 
 DATA_DIR = "data"
 PATCH_FILE = os.path.join(DATA_DIR, "patches.json")
 API_URL = "https://api.opendota.com/api/constants/patch"
 
+def find_patch(timeline: List[Tuple[str, str]], when) -> Optional[str]:
+    if not when or not timeline:
+        return None
+    idx = bisect.bisect_right(timeline, (when.strftime("%Y-%m-%d"), "\uffff")) - 1
+    return timeline[idx][1] if idx >= 0 else None
+
 class PatchManager:
     def __init__(self):
         self._ensure_file()
@@ -53,6 +60,12 @@ class PatchManager:
             return datetime.strptime(p['start_date'], "%Y-%m-%d").date()
         return None
 
+    def get_patch_timeline(self) -> List[Tuple[str, str]]:
+        """[(start_date, patch_name)]，按开始日期升序，配合 find_patch 使用"""
+        return sorted(
+            (info['start_date'], name) for name, info in self.patches.items() if info.get('start_date')
+        )
+
     def update_from_api(self) -> int:
         """
         Fetch patches from OpenDota and update local file.
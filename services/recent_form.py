@@ -0,0 +1,181 @@
+import bisect
+import math
+import threading
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+from services.draft_record import DraftRecord
+from services.match_index import IncrementalIndex
+
+# Rolling windows offered by the recent-form views
+WINDOW_DAYS = (30, 60, 90)
+LAST_N_MAX = 50
+HALF_LIFE_DAYS = 30
+
+# Decayed sums are stored as sum(w * exp(λ (t - anchor))) so that adding a
+# match never touches the existing entries; reading multiplies by exp(-λ (now - anchor)).
+_DECAY_PER_DAY = math.log(2) / HALF_LIFE_DAYS
+_ANCHOR = datetime(2020, 1, 1)
+
+
+def _days_since_anchor(t: datetime) -> float:
+    return (t - _ANCHOR).total_seconds() / 86400
+
+
+@dataclass(frozen=True)
+class FormEntry:
+    """一场比赛 (本队视角) 在近期状态统计里用到的最少信息"""
+    match_pk: int
+    match_time: datetime
+    win: bool
+    pick_ids: Tuple[int, ...]
+    players: Tuple[Tuple[int, int], ...]   # (account_id, hero_id), 本队选手
+
+    @classmethod
+    def from_draft(cls, d: DraftRecord) -> "FormEntry":
+        return cls(
+            match_pk=d.match_pk,
+            match_time=d.match_time,
+            win=d.win,
+            pick_ids=d.my_pick_ids,
+            players=tuple((p.account_id, p.hero_id) for p in d.side_players(d.my_side) if p.account_id)
+        )
+
+
+class FormCounters:
+    """
+    英雄 / 组合 / 选手英雄池的 [权重, 胜场权重] 计数。
+    窗口统计时权重为 1 (场次)，时间衰减时为浮点权重。
+    """
+
+    def __init__(self):
+        self.games = 0.0
+        self.wins = 0.0
+        self.heroes: Dict[int, List[float]] = {}
+        self.pairs: Dict[Tuple[int, int], List[float]] = {}             # (小 id, 大 id)
+        self.players: Dict[int, Dict[int, List[float]]] = {}            # account -> hero
+
+    @staticmethod
+    def _bump(counter: Dict, key, weight: float, won: bool):
+        c = counter.get(key)
+        if c is None:
+            c = counter[key] = [0.0, 0.0]
+        c[0] += weight
+        if won:
+            c[1] += weight
+
+    def add(self, e: FormEntry, weight: float = 1.0):
+        self.games += weight
+        if e.win:
+            self.wins += weight
+        picks = e.pick_ids
+        for i, hid in enumerate(picks):
+            self._bump(self.heroes, hid, weight, e.win)
+            for pid in picks[i + 1:]:
+                self._bump(self.pairs, (hid, pid) if hid < pid else (pid, hid), weight, e.win)
+        for acc_id, hid in e.players:
+            self._bump(self.players.setdefault(acc_id, {}), hid, weight, e.win)
+
+    def merge(self, other: "FormCounters", scale: float = 1.0) -> "FormCounters":
+        self.games += other.games * scale
+        self.wins += other.wins * scale
+        for target, source in ((self.heroes, other.heroes), (self.pairs, other.pairs)):
+            for key, (w, ww) in source.items():
+                c = target.setdefault(key, [0.0, 0.0])
+                c[0] += w * scale
+                c[1] += ww * scale
+        for acc_id, pool in other.players.items():
+            target = self.players.setdefault(acc_id, {})
+            for hid, (w, ww) in pool.items():
+                c = target.setdefault(hid, [0.0, 0.0])
+                c[0] += w * scale
+                c[1] += ww * scale
+        return self
+
+
+class TeamForm:
+    """
+    单支战队的近期状态，三种视角都是增量维护的:
+    - 最近 N 场: 按时间排序、长度封顶的列表
+    - 最近 30/60/90 天: 按天分桶的计数 (只保留最长窗口内的桶)
+    - 时间衰减: 相对固定锚点缩放的累计和，加一场比赛 O(1)
+    """
+
+    def __init__(self):
+        self.recent: List[Tuple[Tuple[float, int], FormEntry]] = []  # 新 -> 旧
+        self.daily: Dict[int, FormCounters] = {}                          # date.toordinal() -> counters
+        self.decayed = FormCounters()
+
+    def add(self, e: FormEntry):
+        if not e.match_time:
+            return
+        # Keep recent sorted newest first (negated key for bisect); at most LAST_N_MAX entries
+        key = (-_days_since_anchor(e.match_time), -e.match_pk)
+        idx = bisect.bisect_left([k for k, _ in self.recent], key)
+        if idx < LAST_N_MAX:
+            self.recent.insert(idx, (key, e))
+            del self.recent[LAST_N_MAX:]
+
+        day = e.match_time.date().toordinal()
+        oldest = date.today().toordinal() - max(WINDOW_DAYS)
+        if day >= oldest:
+            bucket = self.daily.get(day)
+            if bucket is None:
+                # New bucket: drop the ones that fell out of the longest window
+                for old_day in [d for d in self.daily if d < oldest]:
+                    del self.daily[old_day]
+                bucket = self.daily[day] = FormCounters()
+            bucket.add(e)
+
+        self.decayed.add(e, math.exp(_DECAY_PER_DAY * _days_since_anchor(e.match_time)))
+
+    def last_games(self, n: int) -> FormCounters:
+        counters = FormCounters()
+        for _, e in self.recent[:n]:
+            counters.add(e)
+        return counters
+
+    def last_days(self, days: int) -> FormCounters:
+        today = date.today().toordinal()
+        counters = FormCounters()
+        for day, bucket in list(self.daily.items()):
+            if day >= today - days:
+                counters.merge(bucket)
+        return counters
+
+    def time_decayed(self, now: Optional[datetime] = None) -> FormCounters:
+        """权重 = 0.5 ^ (距今天数 / HALF_LIFE_DAYS)"""
+        now = now or datetime.now()
+        return FormCounters().merge(self.decayed, math.exp(-_DECAY_PER_DAY * _days_since_anchor(now)))
+
+
+class RecentFormIndex(IncrementalIndex):
+    """全部战队的近期状态，新比赛入库时增量更新"""
+
+    def __init__(self):
+        super().__init__()
+        self.teams: Dict[str, TeamForm] = {}
+
+    def _reset(self):
+        self.teams = {}
+
+    def _add(self, draft: DraftRecord):
+        form = self.teams.get(draft.team_name)
+        if form is None:
+            form = self.teams[draft.team_name] = TeamForm()
+        form.add(FormEntry.from_draft(draft))
+
+    def team(self, team_name: str) -> Optional[TeamForm]:
+        return self.teams.get(team_name)
+
+
+_index_lock = threading.Lock()
+_index: Optional[RecentFormIndex] = None
+
+
+def get_recent_form() -> RecentFormIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = RecentFormIndex()
+    return _index.sync()
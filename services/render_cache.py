@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+DATA_DIR = "data"
+RENDER_DIR = os.path.join(DATA_DIR, "cache", "renders")
+
+# Encoded images are small (tens to hundreds of KB); bound the in-memory part by size
+MAX_MEMORY_BYTES = 128 * 1024 * 1024
+# The key includes the model's win estimate, so every retrain adds new files; bound the disk part too
+MAX_DISK_BYTES = 512 * 1024 * 1024
+# Over budget, least recently used files are deleted down to this fraction of it
+DISK_SWEEP_TARGET = 0.8
+
+
+def render_key(*parts) -> str:
+    """渲染参数 -> 内容地址 (sha1)。parts 需可 JSON 序列化，顺序有意义"""
+    raw = json.dumps(parts, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class RenderCache:
+    """
+    已编码图片 (PNG / WebP 字节) 的两级缓存: 进程内按字节数限额的 LRU + data/cache/renders 下的文件。
+    key 为渲染参数的哈希，参数不变的图片只合成一次，重启后也直接从磁盘读取。
+    磁盘部分同样限额: 文件 mtime 记录最近一次使用，超出后按 mtime 删除最久未用的文件。
+    """
+
+    def __init__(self, directory: str = RENDER_DIR, max_memory_bytes: int = MAX_MEMORY_BYTES,
+                 max_disk_bytes: int = MAX_DISK_BYTES):
+        self.directory = directory
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_lock = threading.Lock()
+        self._disk_bytes: Optional[int] = None  # scanned on the first put
+
+    def path(self, key: str, ext: str) -> str:
+        # Two-level fan-out keeps directories small on big exports
+        return os.path.join(self.directory, key[:2], f"{key}.{ext}")
+
+    def get(self, key: str, ext: str) -> Optional[bytes]:
+        mem_key = f"{key}.{ext}"
+        with self._lock:
+            data = self._memory.get(mem_key)
+            if data is not None:
+                self._memory.move_to_end(mem_key)
+                return data
+        path = self.path(key, ext)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        try:
+            os.utime(path)  # mark as recently used for the disk sweep
+        except OSError:
+            pass
+        self._remember(mem_key, data)
+        return data
+
+    def put(self, key: str, ext: str, data: bytes):
+        path = self.path(key, ext)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self._account_disk(len(data))
+        except OSError as e:
+            print(f"Render cache write failed: {e}")
+        self._remember(f"{key}.{ext}", data)
+
+    def _scan_disk(self) -> List[Tuple[float, int, str]]:
+        """缓存目录下的文件 (mtime, 字节数, 路径)，最久未用的在前"""
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue  # being written by another thread
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        return entries
+
+    def _account_disk(self, added: int):
+        with self._disk_lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(size for _, size, _ in self._scan_disk())
+            else:
+                self._disk_bytes += added
+            if self._disk_bytes <= self.max_disk_bytes:
+                return
+            # Rescan: the running total drifts when files are overwritten or removed externally
+            entries = self._scan_disk()
+            self._disk_bytes = sum(size for _, size, _ in entries)
+            target = self.max_disk_bytes * DISK_SWEEP_TARGET
+            for _, size, path in entries:
+                if self._disk_bytes <= target:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                self._disk_bytes -= size
+
+    def _remember(self, mem_key: str, data: bytes):
+        with self._lock:
+            old = self._memory.pop(mem_key, None)
+            if old is not None:
+                self._memory_bytes -= len(old)
+            self._memory[mem_key] = data
+            self._memory_bytes += len(data)
+            while self._memory_bytes > self.max_memory_bytes and len(self._memory) > 1:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+
+
+_cache_lock = threading.Lock()
+_cache: Optional[RenderCache] = None
+
+
+def get_render_cache() -> RenderCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = RenderCache()
+    return _cache
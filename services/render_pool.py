@@ -0,0 +1,77 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, List, Optional, Sequence, TypeVar
+from config import RENDER_WORKERS
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+MAX_WORKERS = 8
+# Below this many tasks the pool's pickling overhead outweighs the parallelism
+MIN_PARALLEL_TASKS = 6
+
+
+def worker_count() -> int:
+    """RENDER_WORKERS 环境变量优先，否则为 CPU 核数 - 1 (留一个核给 Streamlit)"""
+    if RENDER_WORKERS > 0:
+        return RENDER_WORKERS
+    return max(min((os.cpu_count() or 1) - 1, MAX_WORKERS), 0)
+
+
+_pool_lock = threading.Lock()
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_initializer: Optional[Callable] = None
+_pool_broken = False
+
+
+def _get_pool(initializer: Optional[Callable]) -> Optional[ProcessPoolExecutor]:
+    # Caller holds _pool_lock
+    global _pool, _pool_initializer
+    if _pool is not None and _pool_initializer is not initializer:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+    if _pool is None:
+        # spawn: forking the multi-threaded Streamlit server is unsafe, and it matches Windows
+        _pool = ProcessPoolExecutor(
+            max_workers=worker_count(),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=initializer
+        )
+        _pool_initializer = initializer
+    return _pool
+
+
+def parallel_map(fn: Callable[[T], R], items: Sequence[T], initializer: Optional[Callable] = None) -> Optional[List[R]]:
+    """
+    在常驻进程池中按顺序计算 [fn(item)] (每个 worker 启动时执行一次 initializer)。
+    任务太少、只有一个可用核或进程池已损坏时返回 None，由调用方在当前进程内串行处理。
+    fn / initializer 须为模块级函数，item 与返回值须可 pickle。
+    """
+    global _pool, _pool_broken
+    workers = worker_count()
+    if workers < 2 or len(items) < MIN_PARALLEL_TASKS or _pool_broken:
+        return None
+    chunksize = max(1, len(items) // (workers * 4))
+    try:
+        with _pool_lock:
+            pool = _get_pool(initializer)
+        return list(pool.map(fn, items, chunksize=chunksize))
+    except (BrokenProcessPool, OSError) as e:
+        print(f"Render pool unavailable, falling back to serial rendering: {e}")
+        with _pool_lock:
+            _pool_broken = True
+            if _pool is not None:
+                _pool.shutdown(wait=False, cancel_futures=True)
+                _pool = None
+        return None
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+            _pool = None
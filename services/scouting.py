@@ -0,0 +1,217 @@
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime
+from multiprocessing import get_context
+from typing import Callable, Dict, List, Optional, Sequence
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import Session, sessionmaker
+from database import engine
+from models import Match
+from services.hero_manager import HeroManager
+from services.match_events import get_stored_version
+from services.team_stats import TeamMatchFilter, TeamStatsAccumulator, iter_match_drafts, player_display_name, resolve_main_players
+
+DATA_DIR = "data"
+SCOUTING_DIR = os.path.join(DATA_DIR, "scouting")
+
+TOP_HEROES = 15
+TOP_PARTNERS = 3
+RECENT_DRAFTS = 10
+
+# Per-process state, set up by _init_worker
+_worker_session_factory = None
+_worker_hero_manager = None
+
+
+def readonly_engine(db_path: Optional[str] = None):
+    """只读 SQLite 连接 (mode=ro)，批量任务中每个进程各自创建"""
+    db_path = os.path.abspath(db_path or engine.url.database)
+    return create_engine(
+        f"sqlite:///file:{db_path}?mode=ro&uri=true",
+        connect_args={"check_same_thread": False}
+    )
+
+
+def teams_in_league(db: Session, league_id: int) -> List[str]:
+    rows = db.query(Match.team_name).filter(Match.league_id == league_id).distinct().all()
+    return sorted(r[0] for r in rows if r[0])
+
+
+def _safe_filename(name: str) -> str:
+    return re.sub(r'[\\/:*?"<>|\s]+', "_", name).strip("_") or "team"
+
+
+def _filter_fingerprint(db: Session, match_filter: TeamMatchFilter) -> List[int]:
+    # (场次, 最大主键, 持久化数据版本号): 有新比赛入库或已有比赛被修改时报告即失效
+    count, max_id = match_filter.query(db).with_entities(func.count(Match.id), func.max(Match.id)).one()
+    return [count or 0, max_id or 0, get_stored_version(db)]
+
+
+def _filter_dict(start_date: Optional[date], league_ids: Sequence[int]) -> Dict:
+    return {
+        "start_date": start_date.isoformat() if start_date else None,
+        "league_ids": list(league_ids)
+    }
+
+
+def _hero_name(hm: HeroManager, hero_id: int) -> str:
+    h = hm.get_hero(hero_id)
+    return h.get('cn_name') or h.get('en_name') or str(hero_id)
+
+
+def build_team_report(db: Session, hm: HeroManager, match_filter: TeamMatchFilter) -> Dict:
+    """单支战队的侦察报告 (可直接 json.dump)"""
+    stats = TeamStatsAccumulator(recent_limit=RECENT_DRAFTS)
+    stats.add_all(iter_match_drafts(db, match_filter.query(db)))
+
+    def hero_row(hid, games, wins=None):
+        row = {"hero_id": hid, "hero": _hero_name(hm, hid), "games": games}
+        if wins is not None:
+            row["wins"] = wins
+        return row
+
+    top_picks = sorted(stats.pick_counts.items(), key=lambda x: x[1], reverse=True)[:TOP_HEROES]
+    top_bans = sorted(stats.ban_counts.items(), key=lambda x: x[1], reverse=True)[:TOP_HEROES]
+
+    picks = []
+    for hid, games in top_picks:
+        row = hero_row(hid, games, stats.pick_wins.get(hid, 0))
+        partners = stats.pick_partners.get(hid, {})
+        partner_wins = stats.pick_partner_wins.get(hid, {})
+        row["partners"] = [
+            hero_row(pid, cnt, partner_wins.get(pid, 0))
+            for pid, cnt in sorted(partners.items(), key=lambda x: x[1], reverse=True)[:TOP_PARTNERS]
+        ]
+        row["positions"] = {str(pos): cnt for pos, cnt in sorted(stats.hero_positions.get(hid, {}).items())}
+        picks.append(row)
+
+    players = {}
+    for pos, acc_id in sorted(resolve_main_players(stats, db, match_filter.team_name).items()):
+        pool = stats.player_heroes.get(acc_id, {})
+        players[str(pos)] = {
+            "account_id": acc_id,
+            "name": player_display_name(db, acc_id),
+            "heroes": [
+                hero_row(hid, s['picks'], s['wins'])
+                for hid, s in sorted(pool.items(), key=lambda x: x[1]['picks'], reverse=True)
+            ]
+        }
+
+    recent = []
+    for d in stats.recent_drafts():
+        recent.append({
+            "match_id": d.match_id,
+            "match_time": d.match_time.isoformat() if d.match_time else None,
+            "opponent": d.opponent_name,
+            "win": d.win,
+            "is_radiant": d.is_radiant,
+            "first_pick": d.first_pick,
+            # [order, hero_id, is_pick, is_mine]
+            "actions": [[a.order, a.hero_id, a.is_pick, a.team_side == d.my_side] for a in d.actions]
+        })
+
+    return {
+        "team": match_filter.team_name,
+        "filter": _filter_dict(match_filter.start_date, match_filter.league_ids),
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "overview": {
+            "games": stats.total,
+            "wins": stats.wins,
+            "splits": {key: list(stats.split(key)) for key in stats.splits}
+        },
+        "picks": picks,
+        "bans_against": [hero_row(hid, cnt) for hid, cnt in top_bans],
+        "players": players,
+        "recent_drafts": recent
+    }
+
+
+def _init_worker(db_path: str, data_root: str):
+    global _worker_session_factory, _worker_hero_manager
+    os.chdir(data_root)  # DATA_DIR paths are relative to the project root
+    _worker_session_factory = sessionmaker(bind=readonly_engine(db_path), autoflush=False)
+    _worker_hero_manager = HeroManager()
+
+
+def _write_json(path: str, payload: Dict):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _scout_team(match_filter: TeamMatchFilter, out_path: str, force: bool) -> Dict:
+    db = _worker_session_factory()
+    try:
+        fingerprint = _filter_fingerprint(db, match_filter)
+        if not force and os.path.exists(out_path):
+            try:
+                with open(out_path, 'r', encoding='utf-8') as f:
+                    cached = json.load(f)
+                if (cached.get("fingerprint") == fingerprint
+                        and cached.get("filter") == _filter_dict(match_filter.start_date, match_filter.league_ids)):
+                    return {"team": match_filter.team_name, "file": os.path.basename(out_path), "games": cached["overview"]["games"], "cached": True}
+            except (OSError, ValueError, KeyError):
+                pass
+
+        report = build_team_report(db, _worker_hero_manager, match_filter)
+        report["fingerprint"] = fingerprint
+        _write_json(out_path, report)
+        return {"team": match_filter.team_name, "file": os.path.basename(out_path), "games": report["overview"]["games"], "cached": False}
+    finally:
+        db.close()
+
+
+def run_scouting(
+    team_names: Sequence[str],
+    label: str,
+    start_date: Optional[date] = None,
+    league_ids: Sequence[int] = (),
+    workers: Optional[int] = None,
+    force: bool = False,
+    on_done: Optional[Callable[[Dict], None]] = None
+) -> str:
+    """
+    并行生成多支战队的侦察报告。
+    每个进程使用独立的只读数据库连接；报告写入 data/scouting/<label>/<战队>.json，
+    并生成 index.json 汇总。数据未变化的战队直接复用已有报告。
+    返回输出目录。
+    """
+    out_dir = os.path.join(SCOUTING_DIR, _safe_filename(label))
+    os.makedirs(out_dir, exist_ok=True)
+
+    filters = [TeamMatchFilter(name, start_date, tuple(league_ids)) for name in team_names]
+    results = []
+    workers = max(1, min(workers or os.cpu_count() or 1, len(filters) or 1))
+
+    # spawn: Streamlit / SQLite state must not be inherited through fork
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(os.path.abspath(engine.url.database), os.getcwd())
+    ) as pool:
+        futures = {
+            pool.submit(_scout_team, f, os.path.join(out_dir, f"{_safe_filename(f.team_name)}.json"), force): f
+            for f in filters
+        }
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"team": futures[future].team_name, "error": str(e)}
+                print(f"Scouting failed for {futures[future].team_name}: {e}")
+            results.append(result)
+            if on_done:
+                on_done(result)
+
+    results.sort(key=lambda r: r["team"])
+    _write_json(os.path.join(out_dir, "index.json"), {
+        "label": label,
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "filter": _filter_dict(start_date, league_ids),
+        "teams": results
+    })
+    return out_dir
@@ -0,0 +1,45 @@
+import os
+import threading
+from typing import Callable, Optional
+
+# Streamlit serves <main script dir>/static at app/static when server.enableStaticServing is on.
+# Relative, so links in page HTML keep working under server.baseUrlPath or a proxy prefix.
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATIC_DIR = os.path.join(BASE_DIR, "static")
+STATIC_URL = "app/static"
+
+_lock = threading.Lock()
+# Names known to exist on disk, so reruns skip the filesystem check
+_published = set()
+
+
+def static_url(name: str) -> str:
+    return f"{STATIC_URL}/{name}"
+
+
+def publish_static(name: str, render: Callable[[], Optional[bytes]]) -> Optional[str]:
+    """
+    确保 static/<name> 存在并返回其 URL。name 须由内容决定 (如渲染参数的哈希)，
+    同名文件内容不变，因此已存在时不再调用 render()，浏览器也可以一直缓存。
+    render() 返回 None 时不写文件，返回 None。
+    """
+    with _lock:
+        if name in _published:
+            return static_url(name)
+    path = os.path.join(STATIC_DIR, *name.split("/"))
+    if not os.path.exists(path):
+        data = render()
+        if data is None:
+            return None
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Static file write failed: {e}")
+            return None
+    with _lock:
+        _published.add(name)
+    return static_url(name)
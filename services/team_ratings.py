@@ -0,0 +1,253 @@
+import bisect
+import json
+import math
+import os
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+from sqlalchemy.orm import Session
+from services.draft_record import DraftRecord
+from services.match_index import SnapshotIndex, db_fingerprint
+
+DATA_DIR = "data"
+RATINGS_FILE = os.path.join(DATA_DIR, "cache", "team_ratings.json")
+FORMAT_VERSION = 2
+
+# Official matches and scrims are rated independently
+OFFICIAL, SCRIM = "official", "scrim"
+TRACKS = (OFFICIAL, SCRIM)
+
+# Glicko-1 parameters
+INITIAL_RATING = 1500.0
+INITIAL_RD = 350.0
+MIN_RD = 30.0
+# RD grows back from 50 to 350 over a year without games
+RD_GROWTH_PER_DAY = (INITIAL_RD ** 2 - 50.0 ** 2) / 365
+_Q = math.log(10) / 400
+
+# Replays after an out-of-order match start from the nearest snapshot
+SNAPSHOT_EVERY = 500
+
+_EPOCH = datetime(2000, 1, 1)
+
+# Log entry: (day, game_key, track, team_a, team_b, a_won)
+LogEntry = Tuple[float, str, str, str, str, bool]
+
+
+def _g(rd: float) -> float:
+    return 1 / math.sqrt(1 + 3 * _Q ** 2 * rd ** 2 / math.pi ** 2)
+
+
+def expected_score(r: float, r_opp: float, rd_opp: float) -> float:
+    return 1 / (1 + 10 ** (-_g(rd_opp) * (r - r_opp) / 400))
+
+
+@dataclass(frozen=True)
+class TeamRating:
+    team_name: str
+    rating: float
+    rd: float
+    games: int
+    wins: int
+    last_played: Optional[datetime]
+
+    @property
+    def conservative(self) -> float:
+        """rating - 2 RD，样本少的战队不会排得过高"""
+        return self.rating - 2 * self.rd
+
+
+class GlickoTrack:
+    """一个赛道 (正式比赛 / 训练赛) 内所有战队的 Glicko 状态: team -> [rating, rd, last_day, games, wins]"""
+
+    def __init__(self, state: Optional[Dict[str, List[float]]] = None):
+        self.state: Dict[str, List[float]] = state or {}
+
+    def copy(self) -> "GlickoTrack":
+        return GlickoTrack({t: list(v) for t, v in self.state.items()})
+
+    def current(self, team: str, day: Optional[float] = None) -> Tuple[float, float]:
+        """(rating, rd)，rd 按距上一场的天数膨胀"""
+        s = self.state.get(team)
+        if s is None:
+            return INITIAL_RATING, INITIAL_RD
+        rd = s[1]
+        if day is not None and day > s[2]:
+            rd = min(math.sqrt(rd ** 2 + RD_GROWTH_PER_DAY * (day - s[2])), INITIAL_RD)
+        return s[0], rd
+
+    def update(self, day: float, team_a: str, team_b: str, a_won: bool) -> Tuple[float, float, float, float]:
+        """应用一场比赛，返回赛前的 (r_a, rd_a, r_b, rd_b)"""
+        r_a, rd_a = self.current(team_a, day)
+        r_b, rd_b = self.current(team_b, day)
+        for team, r, rd, r_o, rd_o, score in (
+            (team_a, r_a, rd_a, r_b, rd_b, 1.0 if a_won else 0.0),
+            (team_b, r_b, rd_b, r_a, rd_a, 0.0 if a_won else 1.0)
+        ):
+            g = _g(rd_o)
+            e = expected_score(r, r_o, rd_o)
+            d_sq = 1 / (_Q ** 2 * g ** 2 * e * (1 - e))
+            denom = 1 / rd ** 2 + 1 / d_sq
+            s = self.state.setdefault(team, [INITIAL_RATING, INITIAL_RD, day, 0, 0])
+            s[0] = r + _Q / denom * g * (score - e)
+            s[1] = max(math.sqrt(1 / denom), MIN_RD)
+            s[2] = day
+            s[3] += 1
+            if score:
+                s[4] += 1
+        return r_a, rd_a, r_b, rd_b
+
+
+class TeamRatingIndex(SnapshotIndex):
+    """
+    按时间顺序对全部比赛做 Glicko 评分，正式比赛与训练赛各一条赛道。
+    每场比赛只计一次 (双视角记录按 match_id 去重)。状态连同比赛日志与最近一个快照
+    (按 SnapshotIndex 的节奏) 落盘:
+    - 新比赛晚于已处理的最后一场时直接增量更新
+    - 新比赛早于它时插入日志，从之前最近的快照重放
+    同时记录每场比赛双方的赛前评分，供按对手强度加权。
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._reset()
+
+    def _reset(self):
+        self._log: List[LogEntry] = []
+        self._tracks: Dict[str, GlickoTrack] = {t: GlickoTrack() for t in TRACKS}
+        self._snapshots: List[Tuple[int, Dict[str, GlickoTrack]]] = []   # (log length, tracks)
+        self._pre: Dict[str, tuple] = {}     # game_key -> (team_a, r_a, rd_a, r_b, rd_b) before the game
+        self._seen: Set[str] = set()
+        self._buffer: List[LogEntry] = []
+
+    def _rebuild(self, db: Session):
+        if not self._load(db):
+            super()._rebuild(db)
+
+    def _add(self, d: DraftRecord):
+        game_key = d.match_id or f"pk{d.match_pk}"
+        if game_key in self._seen or not d.team_name or not d.opponent_name or not d.match_time:
+            return
+        self._seen.add(game_key)
+        day = (d.match_time - _EPOCH).total_seconds() / 86400
+        self._buffer.append((day, game_key, SCRIM if d.is_scrim else OFFICIAL, d.team_name, d.opponent_name, d.win))
+
+    def _commit(self, db: Session):
+        if self._buffer:
+            entries, self._buffer = sorted(self._buffer), []
+            if self._log and entries[0] < self._log[-1]:
+                first = len(self._log)
+                for e in entries:
+                    pos = bisect.bisect(self._log, e)
+                    self._log.insert(pos, e)
+                    first = min(first, pos)
+                self._replay_from(first)
+            else:
+                for e in entries:
+                    self._log.append(e)
+                    self._apply(len(self._log) - 1)
+        super()._commit(db)
+
+    def _apply(self, i: int):
+        day, game_key, track, team_a, team_b, a_won = self._log[i]
+        self._pre[game_key] = (team_a,) + self._tracks[track].update(day, team_a, team_b, a_won)
+        if (i + 1) % SNAPSHOT_EVERY == 0:
+            self._snapshots.append((i + 1, {t: tr.copy() for t, tr in self._tracks.items()}))
+
+    def _replay_from(self, pos: int):
+        while self._snapshots and self._snapshots[-1][0] > pos:
+            self._snapshots.pop()
+        if self._snapshots:
+            start, tracks = self._snapshots[-1]
+            self._tracks = {t: tr.copy() for t, tr in tracks.items()}
+        else:
+            start = 0
+            self._tracks = {t: GlickoTrack() for t in TRACKS}
+        for i in range(start, len(self._log)):
+            self._apply(i)
+
+    # --- Disk ---
+
+    def _save(self, fingerprint: Tuple[int, int, int]):
+        data = {
+            "format": FORMAT_VERSION,
+            "fingerprint": list(fingerprint),
+            "log": self._log,
+            "tracks": {t: tr.state for t, tr in self._tracks.items()},
+            # Older snapshots only shorten rare deep replays; without them a replay starts from the beginning
+            "snapshots": [[n, {t: tr.state for t, tr in tracks.items()}] for n, tracks in self._snapshots[-1:]],
+            "pre": self._pre
+        }
+        os.makedirs(os.path.dirname(RATINGS_FILE), exist_ok=True)
+        tmp_path = RATINGS_FILE + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, RATINGS_FILE)
+
+    def _load(self, db: Session) -> bool:
+        """落盘状态与当前数据库一致时直接恢复，返回是否成功"""
+        try:
+            with open(RATINGS_FILE, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        count, max_id, version = db_fingerprint(db)
+        if data.get("format") != FORMAT_VERSION or data.get("fingerprint") != [count, max_id, version]:
+            return False
+
+        self._reset()
+        self._log = [tuple(e) for e in data["log"]]
+        self._tracks = {t: GlickoTrack(state) for t, state in data["tracks"].items()}
+        self._snapshots = [(n, {t: GlickoTrack(state) for t, state in tracks.items()}) for n, tracks in data["snapshots"]]
+        self._pre = {k: tuple(v) for k, v in data["pre"].items()}
+        self._seen = {e[1] for e in self._log}
+        self._max_pk = max_id
+        self._mark_saved()
+        return True
+
+    # --- Queries ---
+
+    def rating(self, team: str, track: str = OFFICIAL) -> Optional[TeamRating]:
+        s = self._tracks[track].state.get(team)
+        if s is None:
+            return None
+        r, rd = self._tracks[track].current(team, (datetime.now() - _EPOCH).total_seconds() / 86400)
+        return TeamRating(team, r, rd, int(s[3]), int(s[4]), _EPOCH + timedelta(days=s[2]))
+
+    def leaderboard(self, track: str = OFFICIAL, min_games: int = 1) -> List[TeamRating]:
+        """按保守评分 (rating - 2 RD) 从高到低"""
+        teams = [team for team, s in list(self._tracks[track].state.items()) if s[3] >= min_games]
+        return sorted((self.rating(team, track) for team in teams), key=lambda t: t.conservative, reverse=True)
+
+    def pre_match(self, d: DraftRecord) -> Optional[Tuple[float, float, float, float]]:
+        """以 d 的视角: (本队赛前 rating, rd, 对手赛前 rating, rd)"""
+        pre = self._pre.get(d.match_id or f"pk{d.match_pk}")
+        if pre is None:
+            return None
+        team_a, r_a, rd_a, r_b, rd_b = pre
+        return (r_a, rd_a, r_b, rd_b) if team_a == d.team_name else (r_b, rd_b, r_a, rd_a)
+
+    def opponent_weight(self, d: DraftRecord) -> float:
+        """
+        对手强度权重: 2 × (一支 1500 分的队伍对该对手的预期负率)，
+        对手为平均水平时为 1，越强越接近 2，越弱越接近 0；无评分时为 1。
+        """
+        pre = self.pre_match(d)
+        if pre is None:
+            return 1.0
+        _, _, r_opp, rd_opp = pre
+        return 2 * (1 - expected_score(INITIAL_RATING, r_opp, rd_opp))
+
+
+_index_lock = threading.Lock()
+_index: Optional[TeamRatingIndex] = None
+
+
+def get_team_ratings() -> TeamRatingIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = TeamRatingIndex()
+    return _index.sync()
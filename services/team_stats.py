@@ -0,0 +1,272 @@
+from dataclasses import dataclass
+from datetime import date
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session, selectinload
+from models import Match, Player, PlayerAlias, Team
+from services.draft_record import DraftRecord, get_draft, peek_draft
+
+# Matches read per keyset page
+CHUNK_SIZE = 200
+
+
+@dataclass(frozen=True)
+class TeamMatchFilter:
+    """分析页的筛选条件 (战队 + 起始日期 + 联赛 + 对手)"""
+    team_name: str
+    start_date: Optional[date] = None
+    league_ids: Tuple[int, ...] = ()
+    opponents: Tuple[str, ...] = ()
+
+    def query(self, db: Session):
+        query = db.query(Match).filter(Match.team_name == self.team_name)
+        if self.start_date:
+            query = query.filter(Match.match_time >= self.start_date)
+        if self.league_ids:
+            query = query.filter(Match.league_id.in_(self.league_ids))
+        if self.opponents:
+            query = query.filter(Match.opponent_name.in_(self.opponents))
+        return query
+
+
+def iter_match_drafts(db: Session, query, chunk_size: int = CHUNK_SIZE, limit: Optional[int] = None) -> Iterator[DraftRecord]:
+    """
+    按 (match_time, id) 倒序做键集分页，逐场产出 DraftRecord。
+    - 每页只加载缓存中缺失的 pick_bans / players
+    - 每页处理完即从 Session 中移除 ORM 对象，内存占用与历史长度无关
+    query 不能带 order_by / limit，由这里负责。
+    """
+    produced = 0
+    last_key = None
+    while limit is None or produced < limit:
+        page_size = chunk_size if limit is None else min(chunk_size, limit - produced)
+        page_query = query
+        if last_key is not None:
+            last_time, last_id = last_key
+            if last_time is None:
+                page_query = page_query.filter(Match.match_time.is_(None), Match.id < last_id)
+            else:
+                # SQLite sorts NULL match_time last in descending order
+                page_query = page_query.filter(or_(
+                    Match.match_time < last_time,
+                    and_(Match.match_time == last_time, Match.id < last_id),
+                    Match.match_time.is_(None)
+                ))
+        chunk = page_query.order_by(Match.match_time.desc(), Match.id.desc()).limit(page_size).all()
+        if not chunk:
+            return
+
+        missing = [m.id for m in chunk if peek_draft(m.id) is None]
+        if missing:
+            # Populates the relationships of the matches already in the identity map
+            db.query(Match).filter(Match.id.in_(missing)).options(
+                selectinload(Match.pick_bans),
+                selectinload(Match.players)
+            ).all()
+
+        drafts = [get_draft(m) for m in chunk]
+        last_key = (chunk[-1].match_time, chunk[-1].id)
+        for m in chunk:
+            db.expunge(m)  # cascades to the loaded pick_bans / players
+
+        for d in drafts:
+            yield d
+        produced += len(chunk)
+        if len(chunk) < page_size:
+            return
+
+
+class TeamStatsAccumulator:
+    """
+    单支战队的增量统计。每次 add() 一场 DraftRecord；
+    内存只与英雄数 / 选手数相关，与比赛场数无关 (BP 链条只保留最近若干场)。
+    """
+    RECENT_LIMIT = 50
+
+    def __init__(self, recent_limit: int = RECENT_LIMIT, weight_fn: Optional[Callable[[DraftRecord], float]] = None):
+        self.recent_limit = recent_limit
+        self.weight_fn = weight_fn
+
+        # Win rates: key -> [games, wins]
+        self.total = 0
+        self.wins = 0
+        self.splits = {"rad": [0, 0], "dire": [0, 0], "fp": [0, 0], "sp": [0, 0]}
+        # Weighted by weight_fn (e.g. opponent strength): [weight, won weight]
+        self.weighted = [0.0, 0.0]
+        self.hero_weighted: Dict[int, List[float]] = {}
+
+        # Hero stats
+        self.pick_counts: Dict[int, int] = {}
+        self.pick_wins: Dict[int, int] = {}
+        self.ban_counts: Dict[int, int] = {}           # opponent bans
+        self.own_ban_counts: Dict[int, int] = {}       # this team's bans
+        self.pick_partners: Dict[int, Dict[int, int]] = {}      # my picks pairs
+        self.pick_partner_wins: Dict[int, Dict[int, int]] = {}
+        self.player_partners: Dict[int, Dict[int, int]] = {}    # my players' heroes pairs
+        self.hero_positions: Dict[int, Dict[int, int]] = {}     # hero -> {pos: count}
+
+        # Player stats
+        self.pos_player_counts: Dict[int, Dict[int, int]] = {i: {} for i in range(1, 6)}
+        self.player_last_seen: Dict[int, object] = {}  # account -> latest match_time (my side)
+        self.player_heroes: Dict[int, Dict[int, Dict[str, int]]] = {}  # account -> hero -> counters
+
+        # Recent drafts for the BP chain (stream is newest first)
+        self.recent: List[DraftRecord] = []
+        self.recent_by_opponent: Dict[str, List[DraftRecord]] = {}
+
+    def add(self, m: DraftRecord):
+        self.total += 1
+        if m.win: self.wins += 1
+        for key in ("rad" if m.is_radiant else "dire", "fp" if m.first_pick else "sp"):
+            self.splits[key][0] += 1
+            if m.win: self.splits[key][1] += 1
+        if self.weight_fn is not None:
+            w = self.weight_fn(m)
+            for c in [self.weighted] + [self.hero_weighted.setdefault(hid, [0.0, 0.0]) for hid in m.my_pick_ids]:
+                c[0] += w
+                if m.win: c[1] += w
+
+        # Picks / Bans / Pick Partners
+        my_picks = m.my_pick_ids
+        for hid in my_picks:
+            self.pick_counts[hid] = self.pick_counts.get(hid, 0) + 1
+            if m.win:
+                self.pick_wins[hid] = self.pick_wins.get(hid, 0) + 1
+            partners = self.pick_partners.setdefault(hid, {})
+            partner_wins = self.pick_partner_wins.setdefault(hid, {})
+            for pid in my_picks:
+                if hid != pid:
+                    partners[pid] = partners.get(pid, 0) + 1
+                    if m.win:
+                        partner_wins[pid] = partner_wins.get(pid, 0) + 1
+
+        for pb in m.opp_bans:
+            self.ban_counts[pb.hero_id] = self.ban_counts.get(pb.hero_id, 0) + 1
+        for pb in m.my_bans:
+            self.own_ban_counts[pb.hero_id] = self.own_ban_counts.get(pb.hero_id, 0) + 1
+
+        # My Players: Positions & Combos
+        my_players = m.side_players(m.my_side)
+        my_team_heroes = [p.hero_id for p in my_players]
+        for p in my_players:
+            if p.hero_id not in self.hero_positions: self.hero_positions[p.hero_id] = {}
+            if p.position > 0:
+                self.hero_positions[p.hero_id][p.position] = self.hero_positions[p.hero_id].get(p.position, 0) + 1
+
+            if p.account_id:
+                if 1 <= p.position <= 5:
+                    counts = self.pos_player_counts[p.position]
+                    counts[p.account_id] = counts.get(p.account_id, 0) + 1
+                seen = self.player_last_seen.get(p.account_id)
+                if seen is None or m.match_time > seen:
+                    self.player_last_seen[p.account_id] = m.match_time
+
+        for hid in my_team_heroes:
+            partners = self.player_partners.setdefault(hid, {})
+            for partner in my_team_heroes:
+                if hid != partner:
+                    partners[partner] = partners.get(partner, 0) + 1
+
+        # Per-account hero pools (any side, as in the original per-match lookup)
+        for p in m.players:
+            if not p.account_id:
+                continue
+            s = self.player_heroes.setdefault(p.account_id, {}).setdefault(
+                p.hero_id, {'picks': 0, 'wins': 0, 'rad_picks': 0, 'rad_wins': 0, 'dire_picks': 0, 'dire_wins': 0}
+            )
+            player_won = m.side_won(p.team_side)
+            s['picks'] += 1
+            if player_won: s['wins'] += 1
+            if p.team_side == 0:
+                s['rad_picks'] += 1
+                if player_won: s['rad_wins'] += 1
+            else:
+                s['dire_picks'] += 1
+                if player_won: s['dire_wins'] += 1
+
+        # Bounded recent lists
+        if len(self.recent) < self.recent_limit:
+            self.recent.append(m)
+        opp_recent = self.recent_by_opponent.setdefault(m.opponent_name, [])
+        if len(opp_recent) < self.recent_limit:
+            opp_recent.append(m)
+
+    def add_all(self, drafts: Iterable[DraftRecord]) -> "TeamStatsAccumulator":
+        for d in drafts:
+            self.add(d)
+        return self
+
+    def split(self, key: str) -> Tuple[int, int]:
+        games, wins = self.splits[key]
+        return games, wins
+
+    def recent_drafts(self, opponents: Optional[Iterable[str]] = None, limit: Optional[int] = None) -> List[DraftRecord]:
+        """最近的比赛 (新 -> 旧)，可按对手过滤"""
+        if opponents:
+            merged = []
+            for name in opponents:
+                merged.extend(self.recent_by_opponent.get(name, []))
+            merged.sort(key=lambda d: (d.match_time, d.match_pk), reverse=True)
+        else:
+            merged = self.recent
+        return merged[:limit] if limit else list(merged)
+
+
+def collect_team_stats(drafts: Iterable[DraftRecord]) -> TeamStatsAccumulator:
+    return TeamStatsAccumulator().add_all(drafts)
+
+
+def resolve_main_players(stats: TeamStatsAccumulator, db: Session, team_name: Optional[str] = None) -> Dict[int, int]:
+    """
+    Returns {pos (1-5): account_id} of the main player for each position.
+    stats: TeamStatsAccumulator of the matches in context.
+    1. Try to find players manually assigned to this team & position in DB.
+    2. If multiple manual players, use the one in the most recent match.
+    3. If no manual player, fallback to most frequent player in matches.
+    """
+    # Prepare Manual Players Map
+    # Resolve Team ID from team_name
+    manual_players = {i: [] for i in range(1, 6)}
+    if team_name:
+        target_team = db.query(Team).filter(Team.name == team_name).first()
+        if target_team:
+            # Get players in this team with default_pos set
+            team_players = db.query(Player).filter(Player.team_id == target_team.team_id, Player.default_pos != None).all()
+            for p in team_players:
+                if 1 <= p.default_pos <= 5:
+                    manual_players[p.default_pos].append(p.account_id)
+    
+    main_players = {}
+    
+    for pos in range(1, 6):
+        candidates = manual_players[pos]
+        
+        if candidates:
+            # Case 1: Manual assignment exists
+            if len(candidates) == 1:
+                main_players[pos] = candidates[0]
+            else:
+                # Conflict: Multiple players for this pos. Find most recent.
+                seen = [acc for acc in candidates if acc in stats.player_last_seen]
+                if seen:
+                    main_players[pos] = max(seen, key=lambda acc: stats.player_last_seen[acc])
+                else:
+                    # None of them played in these matches? Just pick the first one from DB
+                    main_players[pos] = candidates[0]
+                    
+        else:
+            # Case 2: No manual assignment, use statistics (fallback)
+            counts = stats.pos_player_counts[pos]
+            if counts:
+                main_players[pos] = max(counts, key=counts.get)
+    
+    return main_players
+
+
+def player_display_name(db: Session, account_id: int) -> str:
+    """选手名: 优先别名关联的主选手，其次 Player 表，最后退回账号 ID"""
+    alias = db.query(PlayerAlias).filter(PlayerAlias.account_id == account_id).first()
+    if alias and alias.player:
+        return alias.player.name
+    player = db.query(Player).filter(Player.account_id == account_id).first()
+    return player.name if player else str(account_id)
@@ -0,0 +1,330 @@
+import json
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Set
+import numpy as np
+from sqlalchemy.orm import Session
+from services.draft_record import DraftRecord
+from services.match_index import IncrementalIndex, db_fingerprint
+
+DATA_DIR = "data"
+MODEL_FILE = os.path.join(DATA_DIR, "cache", "win_model.npz")
+FORMAT_VERSION = 2
+
+# Hero ids are used directly as feature indices
+HERO_CAPACITY = 256
+TEAM_SIZE = 5
+FACTORS = 8            # rank of the synergy / counter embeddings
+L2 = 1e-3
+LEARNING_RATE = 0.05
+EPOCHS_FULL = 150      # training from scratch
+EPOCHS_WARM = 30       # warm start from the previous parameters
+RETRAIN_MIN_NEW = 10   # new games needed before an incremental retrain
+HOLDOUT_SHARE = 0.1    # newest games held out for the reported accuracy
+MIN_GAMES = 30
+
+
+def _gather(table: np.ndarray, ids: np.ndarray) -> np.ndarray:
+    """(N, 5) hero ids -> 每场 5 个英雄对应行之和 (N, K)"""
+    out = table[ids[:, 0]]
+    for k in range(1, ids.shape[1]):
+        out = out + table[ids[:, k]]
+    return out
+
+
+def _scatter_index(ids: np.ndarray, width: int) -> np.ndarray:
+    """_scatter 用的扁平下标 (hero_id * width + 列)，训练期间复用"""
+    return (ids[:, :, None] * width + np.arange(width)).ravel()
+
+
+def _scatter(index: np.ndarray, grad_rows: np.ndarray, team_size: int) -> np.ndarray:
+    """每个样本的梯度 (N, K) 累加到其 5 个英雄上 -> (H, K)，一次 bincount"""
+    n, width = grad_rows.shape
+    weights = np.broadcast_to(grad_rows[:, None, :], (n, team_size, width)).ravel()
+    out = np.bincount(index, weights=weights, minlength=HERO_CAPACITY * width).reshape(HERO_CAPACITY, width)
+    out[0] = 0.0
+    return out.astype(np.float32)
+
+
+def _sigmoid(z):
+    return 1 / (1 + np.exp(-z))
+
+
+class WinModel:
+    """
+    天辉胜率的 logit = bias + Σ w[天辉英雄] - Σ w[夜魇英雄]
+                     + 同队搭配(天辉) - 同队搭配(夜魇)       搭配(team) = Σ_{i<j} <V_i, V_j>
+                     + 克制(天辉→夜魇) - 克制(夜魇→天辉)     克制 = Σ_{i, j} <A_i, B_j>
+    即带低秩两两交互项的逻辑回归 (factorization machine)。阵容不完整时缺失的英雄不计入。
+    """
+
+    def __init__(self, params: Dict[str, np.ndarray]):
+        self.bias = float(params["bias"])
+        self.w = params["w"]
+        self.V = params["V"]
+        self.A = params["A"]
+        self.B = params["B"]
+        self._v_sq = (self.V ** 2).sum(axis=1)
+
+    def params(self) -> Dict[str, np.ndarray]:
+        return {"bias": np.float32(self.bias), "w": self.w, "V": self.V, "A": self.A, "B": self.B}
+
+    def _synergy(self, ids: List[int]) -> float:
+        if len(ids) < 2:
+            return 0.0
+        s = self.V[ids].sum(axis=0)
+        return 0.5 * (float(s @ s) - float(self._v_sq[ids].sum()))
+
+    def logit(self, radiant: Sequence[int], dire: Sequence[int]) -> float:
+        rad = [h for h in radiant if 0 < h < HERO_CAPACITY]
+        dire = [h for h in dire if 0 < h < HERO_CAPACITY]
+        z = self.bias + float(self.w[rad].sum()) - float(self.w[dire].sum())
+        z += self._synergy(rad) - self._synergy(dire)
+        if rad and dire:
+            z += float(self.A[rad].sum(axis=0) @ self.B[dire].sum(axis=0)) - float(self.A[dire].sum(axis=0) @ self.B[rad].sum(axis=0))
+        return z
+
+    def predict(self, radiant: Sequence[int], dire: Sequence[int]) -> float:
+        """天辉获胜概率"""
+        return float(_sigmoid(self.logit(radiant, dire)))
+
+    def predict_for(self, mine: Sequence[int], opp: Sequence[int], is_radiant: Optional[bool] = None) -> float:
+        """我方获胜概率；is_radiant=None 时取两种阵营的平均"""
+        if is_radiant is None:
+            return 0.5 * (self.predict_for(mine, opp, True) + self.predict_for(mine, opp, False))
+        p = self.predict(mine, opp) if is_radiant else self.predict(opp, mine)
+        return p if is_radiant else 1 - p
+
+    def pick_deltas(self, mine: Sequence[int], opp: Sequence[int], is_radiant: bool) -> np.ndarray:
+        """
+        每个英雄加入我方后的我方胜率，下标 = hero_id，一次向量运算算完所有候选。
+        """
+        mine = [h for h in mine if 0 < h < HERO_CAPACITY]
+        opp = [h for h in opp if 0 < h < HERO_CAPACITY]
+        sign = 1.0 if is_radiant else -1.0
+        base = self.logit(mine, opp) if is_radiant else self.logit(opp, mine)
+        v_mine = self.V[mine].sum(axis=0)
+        delta = self.w + self.V @ v_mine
+        if opp:
+            delta = delta + self.A @ self.B[opp].sum(axis=0) - self.B @ self.A[opp].sum(axis=0)
+        p_radiant = _sigmoid(base + sign * delta)
+        return p_radiant if is_radiant else 1 - p_radiant
+
+
+# Column layout of the stacked parameter matrix used in training: [w | V | A | B | ‖V‖²]
+_W = slice(0, 1)
+_V = slice(1, 1 + FACTORS)
+_A = slice(1 + FACTORS, 1 + 2 * FACTORS)
+_B = slice(1 + 2 * FACTORS, 1 + 3 * FACTORS)
+_VSQ = 1 + 3 * FACTORS
+
+
+def train(radiant: np.ndarray, dire: np.ndarray, y: np.ndarray, init: Optional[Dict[str, np.ndarray]] = None, epochs: int = EPOCHS_FULL) -> Dict[str, np.ndarray]:
+    """
+    全批量 Adam。每场只有 10 个英雄，所以前向按 id 取行求和，反向用一次 bincount 累加，
+    不构造 N × 256 的稠密矩阵；radiant / dire 为 (N, 5) 英雄 id (0 = 空)，y 为天辉是否获胜。
+    """
+    radiant = radiant.astype(np.int64)
+    dire = dire.astype(np.int64)
+    y = y.astype(np.float32)
+    n = len(y)
+    width = _VSQ + 1
+    index_r, index_d = _scatter_index(radiant, width), _scatter_index(dire, width)
+
+    if init is None:
+        rng = np.random.default_rng(0)
+        init = {
+            "bias": np.float32(0.0),
+            "w": np.zeros(HERO_CAPACITY, dtype=np.float32),
+            "V": rng.normal(0, 0.01, (HERO_CAPACITY, FACTORS)).astype(np.float32),
+            "A": rng.normal(0, 0.01, (HERO_CAPACITY, FACTORS)).astype(np.float32),
+            "B": rng.normal(0, 0.01, (HERO_CAPACITY, FACTORS)).astype(np.float32)
+        }
+    bias = np.float32(init["bias"])
+    P = np.concatenate([np.asarray(init["w"], dtype=np.float32)[:, None], init["V"], init["A"], init["B"]], axis=1).astype(np.float32)
+    P[0] = 0.0
+    m_b = s_b = 0.0
+    m_p = np.zeros_like(P)
+    s_p = np.zeros_like(P)
+    beta1, beta2, eps = 0.9, 0.999, 1e-8
+
+    for t in range(1, epochs + 1):
+        V = P[:, _V]
+        P_ext = np.concatenate([P, (V ** 2).sum(axis=1, keepdims=True)], axis=1)
+        RP = _gather(P_ext, radiant)   # (N, 26)
+        DP = _gather(P_ext, dire)
+        RV, DV = RP[:, _V], DP[:, _V]
+        RA, DA, RB, DB = RP[:, _A], DP[:, _A], RP[:, _B], DP[:, _B]
+        z = (bias + RP[:, 0] - DP[:, 0]
+             + 0.5 * ((RV ** 2).sum(axis=1) - RP[:, _VSQ]) - 0.5 * ((DV ** 2).sum(axis=1) - DP[:, _VSQ])
+             + (RA * DB).sum(axis=1) - (DA * RB).sum(axis=1))
+
+        g = ((_sigmoid(z) - y) / n).astype(np.float32)
+        gc = g[:, None]
+        GR = np.concatenate([gc, gc * RV, gc * DB, -gc * DA, -0.5 * gc], axis=1)
+        GD = np.concatenate([-gc, -gc * DV, -gc * RB, gc * RA, 0.5 * gc], axis=1)
+        grad_ext = _scatter(index_r, GR, radiant.shape[1]) + _scatter(index_d, GD, dire.shape[1])
+        grad = grad_ext[:, :_VSQ] + L2 * P
+        grad[:, _V] += 2 * V * grad_ext[:, _VSQ:]
+
+        g_b = float(g.sum())
+        m_b = beta1 * m_b + (1 - beta1) * g_b
+        s_b = beta2 * s_b + (1 - beta2) * g_b ** 2
+        bias = np.float32(bias - LEARNING_RATE * (m_b / (1 - beta1 ** t)) / (np.sqrt(s_b / (1 - beta2 ** t)) + eps))
+        m_p = beta1 * m_p + (1 - beta1) * grad
+        s_p = beta2 * s_p + (1 - beta2) * grad ** 2
+        P -= LEARNING_RATE * (m_p / (1 - beta1 ** t)) / (np.sqrt(s_p / (1 - beta2 ** t)) + eps)
+
+    return {"bias": bias, "w": P[:, 0].copy(), "V": P[:, _V].copy(), "A": P[:, _A].copy(), "B": P[:, _B].copy()}
+
+
+def _evaluate(model: WinModel, radiant: np.ndarray, dire: np.ndarray, y: np.ndarray) -> Dict[str, float]:
+    probs = np.array([model.predict(r, d) for r, d in zip(radiant.tolist(), dire.tolist())])
+    probs = np.clip(probs, 1e-6, 1 - 1e-6)
+    return {
+        "log_loss": float(-(y * np.log(probs) + (1 - y) * np.log(1 - probs)).mean()),
+        "accuracy": float(((probs > 0.5) == y).mean())
+    }
+
+
+class WinModelIndex(IncrementalIndex):
+    """
+    用全库比赛训练的 BP 胜率模型。训练样本 (每场一行，双视角按 match_id 去重) 与模型参数
+    一起落盘；新比赛累计到 RETRAIN_MIN_NEW 场后以当前参数为起点继续训练少量轮次。
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._model: Optional[WinModel] = None
+        self.metrics: Dict[str, float] = {}
+        self._reset()
+
+    def _reset(self):
+        # Parameters survive a rebuild and serve as the warm start
+        self._seen: Set[str] = set()
+        self._radiant = np.zeros((0, TEAM_SIZE), dtype=np.int16)
+        self._dire = np.zeros((0, TEAM_SIZE), dtype=np.int16)
+        self._y = np.zeros(0, dtype=np.float32)
+        self._stamps = np.zeros(0, dtype=np.float64)   # match timestamps, for the time-ordered holdout
+        self._buffer: List[tuple] = []
+        self._trained_games = 0
+
+    def _rebuild(self, db: Session):
+        if not self._load(db):
+            super()._rebuild(db)
+
+    def _add(self, d: DraftRecord):
+        game_key = d.match_id or f"pk{d.match_pk}"
+        if game_key in self._seen:
+            return
+        rad = [a.hero_id for a in d.actions if a.is_pick and a.team_side == 0][:TEAM_SIZE]
+        dire = [a.hero_id for a in d.actions if a.is_pick and a.team_side == 1][:TEAM_SIZE]
+        if len(rad) < TEAM_SIZE or len(dire) < TEAM_SIZE:
+            return  # only complete drafts are training samples
+        self._seen.add(game_key)
+        when = d.match_time.timestamp() if d.match_time else 0.0
+        self._buffer.append((game_key, rad, dire, d.radiant_win, when))
+
+    def _commit(self, db: Session):
+        if self._buffer:
+            self._radiant = np.concatenate([self._radiant, np.asarray([b[1] for b in self._buffer], dtype=np.int16)])
+            self._dire = np.concatenate([self._dire, np.asarray([b[2] for b in self._buffer], dtype=np.int16)])
+            self._y = np.concatenate([self._y, np.asarray([b[3] for b in self._buffer], dtype=np.float32)])
+            self._stamps = np.concatenate([self._stamps, np.asarray([b[4] for b in self._buffer], dtype=np.float64)])
+            self._buffer = []
+
+        n = len(self._y)
+        if n >= MIN_GAMES and (self._model is None or n - self._trained_games >= RETRAIN_MIN_NEW):
+            self._fit()
+        self._save(db)
+
+    def _fit(self):
+        n = len(self._y)
+        warm = self._model is not None
+        init = self._model.params() if warm else None
+        epochs = EPOCHS_WARM if warm else EPOCHS_FULL
+
+        # Accuracy reported on the newest games (by match time), trained on the older ones only.
+        # Samples arrive newest first on a rebuild, so sort rather than slice the arrays as stored.
+        holdout = int(n * HOLDOUT_SHARE)
+        if not warm and holdout >= MIN_GAMES:
+            order = np.argsort(self._stamps, kind="stable")
+            train_rows, test_rows = order[:-holdout], order[-holdout:]
+            trial = WinModel(train(self._radiant[train_rows], self._dire[train_rows], self._y[train_rows], None, epochs))
+            self.metrics = _evaluate(trial, self._radiant[test_rows], self._dire[test_rows], self._y[test_rows])
+            self.metrics["holdout_games"] = holdout
+
+        self._model = WinModel(train(self._radiant, self._dire, self._y, init, epochs))
+        self._trained_games = n
+        self.metrics["games"] = n
+
+    # --- Disk ---
+
+    def _save(self, db: Session):
+        count, max_id, version = db_fingerprint(db)
+        meta = {
+            "format": FORMAT_VERSION,
+            "fingerprint": [count, max_id, version],
+            "trained_games": self._trained_games,
+            "metrics": self.metrics
+        }
+        arrays = {f"p_{k}": v for k, v in self._model.params().items()} if self._model else {}
+        os.makedirs(os.path.dirname(MODEL_FILE), exist_ok=True)
+        tmp_path = MODEL_FILE + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            meta=np.array(json.dumps(meta)),
+            seen=np.array(sorted(self._seen), dtype=str),
+            radiant=self._radiant,
+            dire=self._dire,
+            y=self._y,
+            stamps=self._stamps,
+            **arrays
+        )
+        os.replace(tmp_path, MODEL_FILE)
+
+    def _load(self, db: Session) -> bool:
+        """落盘的样本 / 参数与当前数据库一致时直接加载，返回是否成功"""
+        try:
+            with np.load(MODEL_FILE) as data:
+                meta = json.loads(str(data["meta"]))
+                count, max_id, version = db_fingerprint(db)
+                if meta.get("format") != FORMAT_VERSION or meta.get("fingerprint") != [count, max_id, version]:
+                    return False
+                params = {k[2:]: data[k] for k in data.files if k.startswith("p_")}
+                radiant, dire, y, stamps = data["radiant"], data["dire"], data["y"], data["stamps"]
+                seen = set(data["seen"].tolist())
+        except (OSError, KeyError, ValueError):
+            return False
+
+        self._reset()
+        self._seen, self._radiant, self._dire, self._y, self._stamps = seen, radiant, dire, y, stamps
+        self._model = WinModel(params) if params else None
+        self._trained_games = meta.get("trained_games", 0)
+        self.metrics = meta.get("metrics", {})
+        self._max_pk = max_id
+        return True
+
+    # --- Queries ---
+
+    @property
+    def model(self) -> Optional[WinModel]:
+        return self._model
+
+
+_index_lock = threading.Lock()
+_index: Optional[WinModelIndex] = None
+
+
+def get_win_model() -> WinModelIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = WinModelIndex()
+    return _index.sync()
+
+
+def predict_radiant_win(radiant: Iterable[int], dire: Iterable[int]) -> Optional[float]:
+    """天辉获胜概率，模型尚未训练 (样本不足) 时返回 None"""
+    model = get_win_model().model
+    return model.predict(list(radiant), list(dire)) if model else None
@@ -0,0 +1,46 @@
+import hashlib
+import re
+import zipfile
+from io import BytesIO
+from typing import Dict
+
+MEDIA_PREFIX = "xl/media/"
+DRAWING_RELS_PREFIX = "xl/drawings/_rels/"
+# openpyxl writes absolute targets (/xl/media/...), Excel relative ones (../media/...)
+_TARGET_RE = re.compile(r'Target="(/xl/media/|\.\./media/)([^"]+)"')
+
+
+def dedupe_workbook_media(data: bytes) -> bytes:
+    """
+    openpyxl 为每个插入的图片单独写一个 xl/media 文件。这里把内容相同的图片合并为一个，
+    drawing 关系改为指向同一文件 (Excel 自己复制图片时也是这样存的)。
+    图片本身已压缩，改为 ZIP_STORED 直接存放，省去无效的 deflate。
+    没有重复图片时也会重新打包一次 (开销很小)。
+    """
+    src = zipfile.ZipFile(BytesIO(data))
+    canonical: Dict[str, str] = {}   # content hash -> kept media name
+    replace: Dict[str, str] = {}     # duplicate media name -> kept media name
+    for info in src.infolist():
+        if info.filename.startswith(MEDIA_PREFIX):
+            name = info.filename[len(MEDIA_PREFIX):]
+            digest = hashlib.sha1(src.read(info)).hexdigest()
+            kept = canonical.setdefault(digest, name)
+            if kept != name:
+                replace[name] = kept
+
+    out = BytesIO()
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as dst:
+        for info in src.infolist():
+            if info.filename.startswith(MEDIA_PREFIX):
+                if info.filename[len(MEDIA_PREFIX):] in replace:
+                    continue
+                dst.writestr(info.filename, src.read(info), compress_type=zipfile.ZIP_STORED)
+            elif replace and info.filename.startswith(DRAWING_RELS_PREFIX):
+                rels = _TARGET_RE.sub(
+                    lambda m: f'Target="{m.group(1)}{replace.get(m.group(2), m.group(2))}"',
+                    src.read(info).decode("utf-8")
+                )
+                dst.writestr(info.filename, rels.encode("utf-8"))
+            else:
+                dst.writestr(info, src.read(info))
+    return out.getvalue()
@@ -0,0 +1,47 @@
+import pytest
+from sqlalchemy import create_engine
+
+import database
+import models  # noqa: F401  registers the tables on Base
+import services.match_events  # noqa: F401  ingest listeners on SessionLocal
+from database import Base, SessionLocal
+from models import Match, PickBan
+from services.draft_record import CM_NUM_ORDERS, cm_turn
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Empty SQLite database under tmp_path, bound to SessionLocal for the duration of the test"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    SessionLocal.configure(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        SessionLocal.configure(bind=database.engine)
+        engine.dispose()
+
+
+@pytest.fixture
+def add_match(db):
+    """
+    add_match(team, opponent, **fields) -> Match with a full 24-step CM draft.
+    first_pick / is_radiant decide who acts on each turn; hero ids are 1..24 in order.
+    """
+    def _add(team_name="Alpha", opponent_name="Beta", match_id=None, match_time=None,
+             is_radiant=True, first_pick=True, win=True, patch_version="7.37", **fields):
+        match = Match(match_id=match_id, team_name=team_name, opponent_name=opponent_name,
+                      match_time=match_time, is_radiant=is_radiant, first_pick=first_pick, win=win,
+                      patch_version=patch_version, **fields)
+        db.add(match)
+        db.flush()
+        my_side = 0 if is_radiant else 1
+        for order in range(1, CM_NUM_ORDERS + 1):
+            fp_acts, is_pick = cm_turn(order)
+            side = my_side if fp_acts == first_pick else 1 - my_side
+            db.add(PickBan(match_id=match.id, hero_id=order, is_pick=is_pick, order=order - 1, team_side=side))
+        db.commit()
+        return match
+    return _add
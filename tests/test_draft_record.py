@@ -0,0 +1,29 @@
+from models import Match
+from services.draft_record import CM_NUM_ORDERS, build_draft_record, cm_turn
+from views.components import PICK_SIZE, RAD_BAN_X, RAD_PICK_X, build_coord_map
+
+
+def test_cm_turn_matches_bp_board_columns():
+    # Radiant is the first-pick team: its turns are drawn in the Radiant columns
+    coords = build_coord_map(True)
+    for order in range(1, CM_NUM_ORDERS + 1):
+        x, _, w, h = coords[order]
+        fp_acts, is_pick = cm_turn(order)
+        assert fp_acts == (x in (RAD_BAN_X, RAD_PICK_X)), order
+        assert is_pick == ((w, h) == PICK_SIZE), order
+
+
+def test_first_pick_team_opens_the_draft(db, add_match):
+    for is_radiant, first_pick in ((True, True), (True, False), (False, True), (False, False)):
+        match = add_match(is_radiant=is_radiant, first_pick=first_pick)
+        draft = build_draft_record(db.get(Match, match.id))
+        fp_side = 0 if draft.radiant_first else 1
+        first_pick_action = next(a for a in draft.actions if a.is_pick)
+        assert draft.actions[0].team_side == fp_side
+        assert first_pick_action.order + 1 == 8
+        assert first_pick_action.team_side == fp_side
+
+        coords = build_coord_map(draft.radiant_first)
+        for a in draft.actions:
+            in_radiant_column = coords[a.order + 1][0] in (RAD_BAN_X, RAD_PICK_X)
+            assert in_radiant_column == (a.team_side == 0), (is_radiant, first_pick, a.order)
@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import services.match_index as match_index
+import services.team_ratings as team_ratings
+from services.team_ratings import TRACKS, TeamRatingIndex
+
+BASE = datetime(2024, 1, 1)
+TEAMS = ["Alpha", "Beta", "Gamma", "Delta"]
+
+
+@pytest.fixture
+def ratings_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(team_ratings, "SNAPSHOT_EVERY", 3)
+    monkeypatch.setattr(team_ratings, "RATINGS_FILE", str(tmp_path / "team_ratings.json"))
+    # Indexes built here must not save to the real cache path at interpreter exit
+    monkeypatch.setattr(match_index.atexit, "register", lambda fn: fn)
+    return tmp_path
+
+
+def add_game(add_match, i, day, is_scrim=False):
+    team, opponent = TEAMS[i % 4], TEAMS[(i * 3 + 1) % 4]
+    if team == opponent:
+        opponent = TEAMS[(i + 1) % 4]
+    add_match(team_name=team, opponent_name=opponent, match_id=str(9000 + i),
+              match_time=BASE + timedelta(days=day), win=i % 3 != 0, is_scrim=is_scrim)
+
+
+def assert_same_ratings(index, expected):
+    assert index._log == expected._log
+    for track in TRACKS:
+        assert index._tracks[track].state == pytest.approx(expected._tracks[track].state)
+    assert index._pre.keys() == expected._pre.keys()
+    for game_key, (team_a, *ratings) in expected._pre.items():
+        assert index._pre[game_key][0] == team_a
+        assert list(index._pre[game_key][1:]) == pytest.approx(ratings)
+
+
+def test_older_match_replays_to_full_rebuild(db, add_match, ratings_file, monkeypatch):
+    for i in range(10):
+        add_game(add_match, i, day=2 * i, is_scrim=i == 4)
+    index = TeamRatingIndex().sync()
+    assert len(index._snapshots) == 3
+
+    replays = []
+    replay_from = TeamRatingIndex._replay_from
+    monkeypatch.setattr(TeamRatingIndex, "_replay_from", lambda self, pos: (replays.append(pos), replay_from(self, pos)))
+    # Lands between the 4th and 5th games: replayed from the snapshot after 3 games
+    add_game(add_match, 10, day=7)
+    add_game(add_match, 11, day=30)
+    index.sync()
+    assert replays == [4]
+    assert [e[1] for e in index._log].index("9010") == 4
+
+    index.flush()
+    loaded = TeamRatingIndex().sync()
+    monkeypatch.setattr(team_ratings, "RATINGS_FILE", str(ratings_file / "rebuilt.json"))
+    rebuilt = TeamRatingIndex().sync()
+    assert_same_ratings(index, rebuilt)
+    assert_same_ratings(loaded, rebuilt)
+
+
+def test_older_match_after_reload_replays_from_the_start(db, add_match, ratings_file, monkeypatch):
+    for i in range(8):
+        add_game(add_match, i, day=2 * i)
+    TeamRatingIndex().sync().flush()
+
+    # Only the latest snapshot is on disk; a match before it replays the whole log
+    loaded = TeamRatingIndex().sync()
+    assert len(loaded._snapshots) == 1
+    add_game(add_match, 8, day=1)
+    loaded.sync()
+
+    loaded.flush()
+    monkeypatch.setattr(team_ratings, "RATINGS_FILE", str(ratings_file / "rebuilt.json"))
+    rebuilt = TeamRatingIndex().sync()
+    assert_same_ratings(loaded, rebuilt)
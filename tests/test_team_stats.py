@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import Match
+from services.team_stats import iter_match_drafts
+
+BASE = datetime(2024, 1, 1)
+
+
+@pytest.fixture
+def mixed_times(add_match):
+    """Matches with distinct, tied and missing match times, inserted out of time order"""
+    times = [BASE + timedelta(days=3), None, BASE, BASE + timedelta(days=3), None,
+             BASE + timedelta(days=1), None, BASE + timedelta(days=2), BASE]
+    return [add_match(match_id=str(8000 + i), match_time=t) for i, t in enumerate(times)]
+
+
+def expected_order(matches):
+    # match_time DESC with NULLs last (SQLite), then id DESC
+    return [m.id for m in sorted(matches, key=lambda m: (m.match_time is not None, m.match_time or BASE, m.id), reverse=True)]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 4, 100])
+def test_pages_through_null_match_times(db, mixed_times, chunk_size):
+    got = [d.match_pk for d in iter_match_drafts(db, db.query(Match), chunk_size=chunk_size)]
+    assert got == expected_order(mixed_times)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 4])
+def test_limit_and_filter_with_null_match_times(db, mixed_times, chunk_size):
+    order = expected_order(mixed_times)
+    got = [d.match_pk for d in iter_match_drafts(db, db.query(Match), chunk_size=chunk_size, limit=7)]
+    assert got == order[:7]
+
+    undated = db.query(Match).filter(Match.match_time.is_(None))
+    got = [d.match_pk for d in iter_match_drafts(db, undated, chunk_size=chunk_size)]
+    assert got == [pk for pk in order if db.get(Match, pk).match_time is None]
@@ -1,9 +1,19 @@
 import streamlit as st
 from database import get_db
-from models import Match, Team, PlayerPerformance, Player, PickBan, League, PlayerAlias
+from models import Match, PlayerPerformance, Player, PickBan, League, PlayerAlias
 from services.hero_manager import HeroManager
 from services.patch_manager import PatchManager
-from views.components import render_bp_visual, generate_bp_image, generate_bp_grid_image
+from services.team_stats import CHUNK_SIZE, TeamMatchFilter, TeamStatsAccumulator, collect_team_stats, iter_match_drafts, player_display_name, resolve_main_players
+from services.recent_form import HALF_LIFE_DAYS, WINDOW_DAYS, get_recent_form
+from services.hero_matrix import get_hero_matrix
+from services.draft_slots import FIRST_PICK, SECOND_PICK, build_slot_tensor, get_slot_tensor
+from services.hero_trends import PER_PATCH, WEEKLY, get_hero_trends
+from services.team_ratings import OFFICIAL, SCRIM, get_team_ratings
+from views.components import (
+    DEFAULT_EXPORT_PRESET, EXPORT_IMAGE_PRESETS, PICK_SIZE, render_bp_visual, BpGridImageJob, bp_image_job,
+    export_image_width, fit_excel_image, hero_icon_uri, hero_thumbnail_src, render_images
+)
+from services.xlsx_media import dedupe_workbook_media
 from sqlalchemy import desc, func, or_
 import pandas as pd
 from datetime import datetime, timedelta
@@ -14,34 +24,19 @@ from openpyxl.utils import get_column_letter
 from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
 
 # --- Helper Function for Statistics Sheet ---
-def create_shared_stats_sheet(wb, matches, db, hm, team_name=None):
+def create_shared_stats_sheet(wb, drafts, db, hm, team_name=None):
     ws_stats = wb.create_sheet("统计数据")
+    stats = collect_team_stats(drafts)
     
     # 3.1 Win Rates
-    total = len(matches)
+    total = stats.total
     if total > 0:
-        wins = sum(1 for m in matches if m.win)
+        wins = stats.wins
         
-        rad_m = [m for m in matches if m.is_radiant]
-        rad_wins = sum(1 for m in rad_m if m.win)
-        
-        dire_m = [m for m in matches if not m.is_radiant]
-        dire_wins = sum(1 for m in dire_m if m.win)
-        
-        fp_m = [m for m in matches if m.first_pick]
-        fp_wins = sum(1 for m in fp_m if m.win)
-        
-        sp_m = [m for m in matches if not m.first_pick]
-        sp_wins = sum(1 for m in sp_m if m.win)
-        
-        stats_data = [
-            ["统计项", "场次", "胜场", "胜率"],
-            ["总计", total, wins, f"{wins/total:.1%}"],
-            ["天辉", len(rad_m), rad_wins, f"{rad_wins/len(rad_m):.1%}" if rad_m else "0%"],
-            ["夜魇", len(dire_m), dire_wins, f"{dire_wins/len(dire_m):.1%}" if dire_m else "0%"],
-            ["先选", len(fp_m), fp_wins, f"{fp_wins/len(fp_m):.1%}" if fp_m else "0%"],
-            ["后选", len(sp_m), sp_wins, f"{sp_wins/len(sp_m):.1%}" if sp_m else "0%"]
-        ]
+        stats_data = [["统计项", "场次", "胜场", "胜率"], ["总计", total, wins, f"{wins/total:.1%}"]]
+        for label, key in [("天辉", "rad"), ("夜魇", "dire"), ("先选", "fp"), ("后选", "sp")]:
+            games, key_wins = stats.split(key)
+            stats_data.append([label, games, key_wins, f"{key_wins/games:.1%}" if games else "0%"])
         
         for r_idx, row_data in enumerate(stats_data, start=1):
             for c_idx, val in enumerate(row_data, start=1):
@@ -53,24 +48,11 @@ def create_shared_stats_sheet(wb, matches, db, hm, team_name=None):
     # Update Header with Win Rate for partners
     ws_stats.append(["排名", "英雄", "出场次数", "胜率", "最佳搭档1", "场次", "胜率", "最佳搭档2", "场次", "胜率", "最佳搭档3", "场次", "胜率"])
     
-    # Calc Logic
-    pick_counts = {}
-    hero_wins = {}
-    hero_partners = {} # hid -> {partner_id: count}
-    
-    for m in matches:
-        my_side = 0 if m.is_radiant else 1
-        my_picks = [pb.hero_id for pb in m.pick_bans if pb.is_pick and pb.team_side == my_side]
-        
-        for hid in my_picks:
-            pick_counts[hid] = pick_counts.get(hid, 0) + 1
-            if m.win:
-                hero_wins[hid] = hero_wins.get(hid, 0) + 1
-                
-            if hid not in hero_partners: hero_partners[hid] = {}
-            for pid in my_picks:
-                if hid != pid:
-                    hero_partners[hid][pid] = hero_partners[hid].get(pid, 0) + 1
+    # Calc Logic (accumulated above)
+    pick_counts = stats.pick_counts
+    hero_wins = stats.pick_wins
+    hero_partners = stats.pick_partners # hid -> {partner_id: count}
+    partner_wins = stats.pick_partner_wins # hid -> {partner_id: wins}
                     
     sorted_heroes = sorted(pick_counts.items(), key=lambda x: x[1], reverse=True)[:10]
     
@@ -87,15 +69,7 @@ def create_shared_stats_sheet(wb, matches, db, hm, team_name=None):
         # Calculate win rates for partners
         partner_stats = []
         for pid, p_count in partners.items():
-            # Count wins where both hid and pid were on My Team
-            wins_with_partner = 0
-            for m in matches:
-                my_side = 0 if m.is_radiant else 1
-                my_picks = [pb.hero_id for pb in m.pick_bans if pb.is_pick and pb.team_side == my_side]
-                if hid in my_picks and pid in my_picks:
-                    if m.win:
-                        wins_with_partner += 1
-            
+            wins_with_partner = partner_wins[hid].get(pid, 0)
             p_wr = wins_with_partner / p_count if p_count > 0 else 0
             partner_stats.append((pid, p_count, p_wr))
 
@@ -114,77 +88,7 @@ def create_shared_stats_sheet(wb, matches, db, hm, team_name=None):
     ws_stats.cell(row=start_row + 12, column=1, value="各位置绝活列表").font = Font(bold=True)
     
     # Identify Main Players
-    # Logic:
-    # 1. Try to find players manually assigned to this team & position in DB.
-    # 2. If multiple manual players, use the one in the most recent match.
-    # 3. If no manual player, fallback to most frequent player in matches.
-    
-    # Pre-calculate fallback counts
-    pos_player_counts = {i: {} for i in range(1, 6)}
-    for m in matches: # Use all matches passed in
-        my_side = 0 if m.is_radiant else 1
-        my_ps = [p for p in m.players if p.team_side == my_side]
-        for p in my_ps:
-            if p.position and 1 <= p.position <= 5 and p.account_id:
-                pos_player_counts[p.position][p.account_id] = pos_player_counts[p.position].get(p.account_id, 0) + 1
-    
-    # Prepare Manual Players Map
-    # Resolve Team ID from team_name
-    manual_players = {i: [] for i in range(1, 6)}
-    if team_name:
-        target_team = db.query(Team).filter(Team.name == team_name).first()
-        if target_team:
-            # Get players in this team with default_pos set
-            team_players = db.query(Player).filter(Player.team_id == target_team.team_id, Player.default_pos != None).all()
-            for p in team_players:
-                if 1 <= p.default_pos <= 5:
-                    manual_players[p.default_pos].append(p.account_id)
-    
-    main_players = {}
-    
-    for pos in range(1, 6):
-        candidates = manual_players[pos]
-        
-        if candidates:
-            # Case 1: Manual assignment exists
-            if len(candidates) == 1:
-                main_players[pos] = candidates[0]
-            else:
-                # Conflict: Multiple players for this pos. Find most recent.
-                # Sort candidates by "last match time" in the provided matches list
-                best_candidate = None
-                best_time = None
-                
-                # We need to scan matches to find latest appearance
-                # Matches are sorted by time (asc) in 'matches_asc' or we iterate 'matches' (which might be desc?)
-                # 'matches' passed to this function is usually desc (latest first) based on call site, but let's be safe.
-                # Actually, let's just look at 'matches' order.
-                
-                found = False
-                # Sort matches desc by time just to be sure
-                matches_desc = sorted(matches, key=lambda m: m.match_time, reverse=True)
-                
-                for m in matches_desc:
-                    if found: break
-                    my_side = 0 if m.is_radiant else 1
-                    my_ps = [p for p in m.players if p.team_side == my_side]
-                    
-                    for p in my_ps:
-                        if p.account_id in candidates:
-                            # Found the most recent one
-                            main_players[pos] = p.account_id
-                            found = True
-                            break
-                
-                if not found:
-                    # None of them played in these matches? Just pick the first one from DB
-                    main_players[pos] = candidates[0]
-                    
-        else:
-            # Case 2: No manual assignment, use statistics (fallback)
-            counts = pos_player_counts[pos]
-            if counts:
-                main_players[pos] = max(counts, key=counts.get)
+    main_players = resolve_main_players(stats, db, team_name)
             
     base_r = start_row + 13
     # Vertical Layout: 5 Columns (one per position)
@@ -221,37 +125,81 @@ def create_shared_stats_sheet(wb, matches, db, hm, team_name=None):
         r += 1
         
         # Get Top Heroes for this player in these matches
-        p_heroes = {} # hid -> {picks, wins}
-        for m in matches:
-             p_rec = next((p for p in m.players if p.account_id == acc_id), None)
-             if p_rec:
-                 hid = p_rec.hero_id
-                 if hid not in p_heroes: p_heroes[hid] = {'picks': 0, 'wins': 0}
-                 p_heroes[hid]['picks'] += 1
-                 
-                 # Check win
-                 radiant_won = (m.is_radiant == m.win)
-                 player_won = (p_rec.team_side == 0 and radiant_won) or (p_rec.team_side == 1 and not radiant_won)
-                 if player_won:
-                     p_heroes[hid]['wins'] += 1
+        p_heroes = stats.player_heroes.get(acc_id, {}) # hid -> {picks, wins, ...}
 
         # 原来只截取前 5 个英雄，现在改为：有多少就展示多少
         sorted_ph = sorted(p_heroes.items(), key=lambda x: x[1]['picks'], reverse=True)
         
-        for hid, stats in sorted_ph:
+        for hid, h_stats in sorted_ph:
             h_data = hm.get_hero(hid)
             h_name = h_data.get('slang') or h_data.get('cn_name')
-            cnt = stats['picks']
-            wr = stats['wins'] / cnt if cnt > 0 else 0
+            cnt = h_stats['picks']
+            wr = h_stats['wins'] / cnt if cnt > 0 else 0
             
             ws_stats.cell(row=r, column=col_offset, value=h_name)
             ws_stats.cell(row=r, column=col_offset+1, value=cnt)
             ws_stats.cell(row=r, column=col_offset+2, value=f"{wr:.1%}")
             r += 1
 
-def generate_detailed_excel_export(matches, team_name, db, hm):
+# --- Helper: Draft Slot Heatmap ---
+SLOT_SIDE_LABELS = {FIRST_PICK: "先选", SECOND_PICK: "后选"}
+
+def heat_color(share):
+    """0-1 -> white..red hex (without '#')"""
+    share = max(0.0, min(1.0, share))
+    gb = int(255 - share * 155)
+    return f"FF{gb:02X}{gb:02X}"
+
+def slot_heatmap_rows(tensor, side, hm, top_n=5):
+    """[(slot_label, [(hero_name, count, share)])] for the slots this team acts in"""
+    games = int(tensor.games[side])
+    rows = []
+    for slot in tensor.team_slots(side):
+        kind = "Pick" if tensor.slot_is_pick(side, slot) else "Ban"
+        heroes = [
+            (hm.get_hero(hid).get('cn_name') or str(hid), cnt, cnt / games if games else 0)
+            for hid, cnt in tensor.top_heroes(side, slot, top_n)
+        ]
+        rows.append((f"第{slot + 1}手 {kind}", heroes))
+    return rows
+
+def create_slot_heatmap_sheet(wb, drafts, hm, top_n=5):
+    """BP 热力图: 先选 / 后选时每个顺位最常选/禁的英雄"""
+    ws = wb.create_sheet("BP热力图")
+    tensor = build_slot_tensor(drafts)
+    
+    r = 1
+    for side in (FIRST_PICK, SECOND_PICK):
+        games = int(tensor.games[side])
+        ws.cell(row=r, column=1, value=f"{SLOT_SIDE_LABELS[side]} ({games} 场)").font = Font(bold=True)
+        r += 1
+        if games == 0:
+            ws.cell(row=r, column=1, value="无数据")
+            r += 2
+            continue
+        
+        ws.cell(row=r, column=1, value="顺位").font = Font(bold=True)
+        for i in range(top_n):
+            ws.cell(row=r, column=2 + i, value=f"Top{i + 1}").font = Font(bold=True)
+        r += 1
+        
+        for label, heroes in slot_heatmap_rows(tensor, side, hm, top_n):
+            ws.cell(row=r, column=1, value=label)
+            for i, (name, cnt, share) in enumerate(heroes):
+                cell = ws.cell(row=r, column=2 + i, value=f"{name} {cnt}")
+                color = heat_color(share)
+                cell.fill = PatternFill(start_color=color, end_color=color, fill_type="solid")
+            r += 1
+        r += 1
+    
+    ws.column_dimensions['A'].width = 14
+    for i in range(top_n):
+        ws.column_dimensions[get_column_letter(2 + i)].width = 16
+
+def generate_detailed_excel_export(drafts, team_name, db, hm, image_preset=DEFAULT_EXPORT_PRESET):
     """
     Template 1: Detailed Match & Stats
+    image_preset: key of EXPORT_IMAGE_PRESETS (resolution / encoding of the BP images)
     """
     wb = Workbook()
     
@@ -261,14 +209,35 @@ def generate_detailed_excel_export(matches, team_name, db, hm):
     
     # Sort matches by time ascending (Old -> New) for the horizontal layout
     # User said: "left to right sequentially increasing time"
-    matches_asc = sorted(matches, key=lambda m: m.match_time)
+    drafts_asc = sorted(drafts, key=lambda m: m.match_time)
+
+    # BP column is 50 characters wide; images are shown at up to 300px and rendered per the preset
+    bp_col_width = 50
+    preset = EXPORT_IMAGE_PRESETS[image_preset]
+    display_width, render_width = export_image_width(bp_col_width, 300, preset)
+
+    def bp_job(m):
+        # Determine params for generation
+        rad_name = m.team_name if m.is_radiant else m.opponent_name
+        dire_name = m.opponent_name if m.is_radiant else m.team_name
+        is_radiant_first = (m.is_radiant == m.first_pick)
+        
+        # Add winner mark to team name passed to image gen?
+        # User requirement: "BP图片中谁获胜了需要文字中添加信息"
+        # We modify the names passed to the image generator
+        rad_disp = f"👑 {rad_name}" if (m.is_radiant == m.win) else rad_name
+        dire_disp = f"👑 {dire_name}" if (m.is_radiant != m.win) else dire_name
+        return bp_image_job(m, rad_disp, dire_disp, first_pick_radiant=is_radiant_first, width=render_width, fmt=preset.fmt)
+
+    # Render all BP images in one batch: cached drafts are reused, the rest fan out to the render pool
+    bp_images = dict(zip([m.match_pk for m in drafts_asc], render_images([bp_job(m) for m in drafts_asc], hm)))
     
     # --- Helper to create Match Sheet ---
     def create_match_sheet(sheet_name, filter_func):
         ws = wb.create_sheet(sheet_name)
-        filtered_matches = [m for m in matches_asc if filter_func(m)]
+        filtered_drafts = [m for m in drafts_asc if filter_func(m)]
         
-        if not filtered_matches:
+        if not filtered_drafts:
             ws.cell(row=1, column=1, value="无符合条件的比赛数据")
             return
 
@@ -283,10 +252,10 @@ def generate_detailed_excel_export(matches, team_name, db, hm):
         ws.row_dimensions[7].height = 200 # Approx height for BP image (adjust as needed)
         ws.column_dimensions['A'].width = 15
 
-        for idx, m in enumerate(filtered_matches):
+        for idx, m in enumerate(filtered_drafts):
             col_idx = idx + 2 # Start from Column B
             col_letter = get_column_letter(col_idx)
-            ws.column_dimensions[col_letter].width = 50 # Width for BP image
+            ws.column_dimensions[col_letter].width = bp_col_width # Width for BP image
 
             # 1. Match ID
             ws.cell(row=1, column=col_idx, value=str(m.match_id)).alignment = Alignment(horizontal='center')
@@ -314,37 +283,16 @@ def generate_detailed_excel_export(matches, team_name, db, hm):
             ws.cell(row=6, column=col_idx, value=f"👑 {winner_name}").alignment = Alignment(horizontal='center')
             
             # 7. BP Image
-            # Determine params for generation
-            rad_name = m.team_name if m.is_radiant else m.opponent_name
-            dire_name = m.opponent_name if m.is_radiant else m.team_name
-            is_radiant_first = (m.is_radiant == m.first_pick)
-            
-            # Add winner mark to team name passed to image gen?
-            # User requirement: "BP图片中谁获胜了需要文字中添加信息"
-            # We modify the names passed to the image generator
-            rad_disp = f"👑 {rad_name}" if (m.is_radiant == m.win) else rad_name
-            dire_disp = f"👑 {dire_name}" if (m.is_radiant != m.win) else dire_name
-            
             try:
-                img_pil = generate_bp_image(m.pick_bans, rad_disp, dire_disp, hm, first_pick_radiant=is_radiant_first)
-                if img_pil:
-                    # Scaling
-                    w_target = 300
-                    h_target = int(w_target * (img_pil.height / img_pil.width))
-                    
-                    img_resized = img_pil.resize((w_target, h_target))
-                    
-                    # Convert to Bytes for OpenPyXL
-                    img_byte_arr = BytesIO()
-                    img_resized.save(img_byte_arr, format='PNG')
-                    img_byte_arr.seek(0)
-                    
-                    xl_img = XLImage(img_byte_arr)
-                    
-                    # Anchor to cell
-                    ws.add_image(xl_img, f"{col_letter}7")
-                    
-                    ws.row_dimensions[7].height = h_target * 0.75
+                img_bytes = bp_images.get(m.match_pk)
+                if not img_bytes:
+                    raise ValueError("render failed")
+                xl_img = fit_excel_image(XLImage(BytesIO(img_bytes)), display_width)
+                
+                # Anchor to cell
+                ws.add_image(xl_img, f"{col_letter}7")
+                
+                ws.row_dimensions[7].height = xl_img.height * 0.75
             except Exception as e:
                 print(f"Error generating image for excel: {e}")
                 ws.cell(row=7, column=col_idx, value="图片生成失败")
@@ -357,15 +305,17 @@ def generate_detailed_excel_export(matches, team_name, db, hm):
     
     # --- Sheet 3: 统计信息 (Stats) ---
     # 这里必须传入 team_name，才能在“各位置绝活列表”中优先使用 Player Manager 中手动配置的主力位置
-    create_shared_stats_sheet(wb, matches, db, hm, team_name=team_name)
+    create_shared_stats_sheet(wb, drafts, db, hm, team_name=team_name)
+    create_slot_heatmap_sheet(wb, drafts, hm)
 
     output = BytesIO()
     wb.save(output)
-    return output.getvalue()
+    return dedupe_workbook_media(output.getvalue())
 
-def generate_template_2(matches, team_name, db, hm):
+def generate_template_2(drafts, team_name, db, hm, image_preset=DEFAULT_EXPORT_PRESET):
     """
     Template 2: Grid Style BP Image (Vertical List, No Text, Original Width)
+    image_preset: key of EXPORT_IMAGE_PRESETS (resolution / encoding of the grid images)
     """
     wb = Workbook()
     
@@ -374,64 +324,55 @@ def generate_template_2(matches, team_name, db, hm):
     wb.remove(default_sheet)
     
     # Sort matches by time ascending
-    matches_asc = sorted(matches, key=lambda m: m.match_time)
+    drafts_asc = sorted(drafts, key=lambda m: m.match_time)
+
+    # Analyzed Team on LEFT; shown at the column width (~50% of the 1280px grid), rendered per the preset
+    grid_col_width = 90
+    preset = EXPORT_IMAGE_PRESETS[image_preset]
+    display_width, render_width = export_image_width(grid_col_width, 640, preset)
+
+    # Rendered in one batch: cached drafts are reused, the rest fan out to the render pool.
+    grid_jobs = [
+        BpGridImageJob(
+            m, m.team_name, m.opponent_name,
+            left_is_radiant=m.is_radiant,
+            left_is_first_pick=m.first_pick,
+            winner_is_left=m.win,
+            width=render_width,
+            fmt=preset.fmt
+        )
+        for m in drafts_asc
+    ]
+    grid_images = dict(zip([m.match_pk for m in drafts_asc], render_images(grid_jobs, hm)))
     
     # --- Helper to create Match Sheet ---
     def create_match_sheet(sheet_name, filter_func):
         ws = wb.create_sheet(sheet_name)
-        filtered_matches = [m for m in matches_asc if filter_func(m)]
+        filtered_drafts = [m for m in drafts_asc if filter_func(m)]
         
         # Header
         ws.cell(row=1, column=1, value=sheet_name).font = Font(bold=True, size=14)
         
-        if not filtered_matches:
+        if not filtered_drafts:
             ws.cell(row=2, column=1, value="无符合条件的比赛数据")
             return
 
         # Set Column A Width to accommodate image width
-        # Original width ~1280px. 50% = 640px. Excel width ~90
-        ws.column_dimensions['A'].width = 90
+        ws.column_dimensions['A'].width = grid_col_width
 
-        for idx, m in enumerate(filtered_matches):
+        for idx, m in enumerate(filtered_drafts):
             row_idx = idx + 2 # Start from row 2 (row 1 is header)
             
-            # --- Generate Grid Image ---
-            # Analyzed Team on LEFT
-            left_is_radiant = m.is_radiant
-            left_team_name = m.team_name
-            right_team_name = m.opponent_name
-            
-            # Winner logic
-            winner_is_left = m.win 
-            
-            # First Pick logic
-            left_is_first_pick = m.first_pick
-            
+            # --- Grid Image ---
             try:
-                img_pil = generate_bp_grid_image(
-                    m.pick_bans, 
-                    left_team_name, right_team_name, 
-                    hm, 
-                    left_is_radiant=left_is_radiant,
-                    left_is_first_pick=left_is_first_pick,
-                    winner_is_left=winner_is_left
-                )
+                img_bytes = grid_images.get(m.match_pk)
+                if not img_bytes:
+                    raise ValueError("render failed")
+                xl_img = fit_excel_image(XLImage(BytesIO(img_bytes)), display_width)
+                ws.add_image(xl_img, f"A{row_idx}")
                 
-                if img_pil:
-                    # Resize to 50%
-                    new_w = int(img_pil.width * 0.5)
-                    new_h = int(img_pil.height * 0.5)
-                    img_resized = img_pil.resize((new_w, new_h))
-                    
-                    img_byte_arr = BytesIO()
-                    img_resized.save(img_byte_arr, format='PNG')
-                    img_byte_arr.seek(0)
-                    
-                    xl_img = XLImage(img_byte_arr)
-                    ws.add_image(xl_img, f"A{row_idx}")
-                    
-                    # Set Row Height
-                    ws.row_dimensions[row_idx].height = new_h * 0.75
+                # Set Row Height
+                ws.row_dimensions[row_idx].height = xl_img.height * 0.75
                     
             except Exception as e:
                 print(f"Error generating grid image: {e}")
@@ -444,13 +385,14 @@ def generate_template_2(matches, team_name, db, hm):
     create_match_sheet(f"{team_name}-后选", lambda m: not m.first_pick)
     
     # --- Sheet 3: 统计信息 (Stats) ---
-    create_shared_stats_sheet(wb, matches, db, hm, team_name=team_name)
+    create_shared_stats_sheet(wb, drafts, db, hm, team_name=team_name)
+    create_slot_heatmap_sheet(wb, drafts, hm)
 
     output = BytesIO()
     wb.save(output)
-    return output.getvalue()
+    return dedupe_workbook_media(output.getvalue())
 
-def generate_template_3(matches, team_name, db, hm):
+def generate_template_3(drafts, team_name, db, hm):
     """
     Template 3: Pure Text Log (Detailed BP & Positions)
     """
@@ -544,7 +486,7 @@ def generate_template_3(matches, team_name, db, hm):
     COLOR_GREEN_BAN_ORDERS = [2, 3, 5, 6]
 
     row_idx = 3
-    for idx, m in enumerate(matches, start=1):
+    for idx, m in enumerate(drafts, start=1):
         # A: Index
         ws.cell(row=row_idx, column=1, value=idx).border = border_thin
         
@@ -562,37 +504,13 @@ def generate_template_3(matches, team_name, db, hm):
         res_cell.alignment = alignment_center
         
         # --- Process Players for Positions 1-5 ---
-        def get_pos_map(is_radiant):
-            # Returns {pos (1-5): hero_id}
-            pmap = {}
-            side = 0 if is_radiant else 1
-            
-            # Filter players on this side
-            # Note: m.players is a list of PlayerPerformance objects
-            team_players = [p for p in m.players if p.team_side == side]
-            
-            for p in team_players:
-                # Use 'position' field (1-5)
-                # Fallback to internal logic if 0/None?
-                # Assuming data is clean enough or we accept gaps
-                if p.position and 1 <= p.position <= 5:
-                    pmap[p.position] = p.hero_id
-            return pmap
-
+        # {pos (1-5): hero_id}, precomputed on the DraftRecord
         my_is_radiant = m.is_radiant
-        my_pmap = get_pos_map(my_is_radiant)
-        opp_pmap = get_pos_map(not my_is_radiant)
+        my_pmap = m.pos_map(mine=True)
+        opp_pmap = m.pos_map(mine=False)
         
         # Logic for Highlighting
-        # Map hero_id -> Pick Order to determine if it needs color
-        # PickBan list has this info
-        pick_order_map = {} # hero_id -> global_order
-        ban_order_map = {}
-        for pb in m.pick_bans:
-            if pb.is_pick:
-                pick_order_map[pb.hero_id] = pb.order + 1 # 1-based
-            else:
-                ban_order_map[pb.hero_id] = pb.order + 1
+        # Pick order (1-based) per hero comes from m.pick_order(hero_id)
         
         # Determine who is FP
         # m.first_pick is True if 'team_name' (My Team) was First Pick
@@ -611,7 +529,7 @@ def generate_template_3(matches, team_name, db, hm):
                 cell.value = h_name
                 
                 # Color Logic
-                order = pick_order_map.get(hid)
+                order = m.pick_order(hid)
                 if order:
                     if order == COLOR_YELLOW_PICK_ORDER:
                         cell.fill = fill_yellow
@@ -631,7 +549,7 @@ def generate_template_3(matches, team_name, db, hm):
                 cell.value = h_name
                 
                 # Color Logic for Opponent
-                order = pick_order_map.get(hid)
+                order = m.pick_order(hid)
                 if order:
                     if order == COLOR_YELLOW_PICK_ORDER:
                         cell.fill = fill_yellow
@@ -651,23 +569,16 @@ def generate_template_3(matches, team_name, db, hm):
 
         # --- Bans ---
         # 仍按全局顺位：1/4/7 黄，2/3/5/6 绿
-        my_side_int = 0 if my_is_radiant else 1
-        my_bans = []
-        opp_bans = []
-        
-        sorted_pbs = sorted(m.pick_bans, key=lambda x: x.order)
-        
-        for pb in sorted_pbs:
-            if not pb.is_pick:
+        def ban_items(actions):
+            items = []
+            for pb in actions:
                 h_data = hm.get_hero(pb.hero_id)
                 h_name = h_data.get('slang') or h_data.get('cn_name')
-                order = pb.order + 1
-                item = {'name': h_name, 'order': order}
-                
-                if pb.team_side == my_side_int:
-                    my_bans.append(item)
-                else:
-                    opp_bans.append(item)
+                items.append({'name': h_name, 'order': pb.order + 1})
+            return items
+        
+        my_bans = ban_items(m.my_bans)
+        opp_bans = ban_items(m.opp_bans)
                     
         # 对方 Ban：P-V 列（16-22）
         for i in range(7):
@@ -708,13 +619,14 @@ def generate_template_3(matches, team_name, db, hm):
         ws.column_dimensions[get_column_letter(c)].width = 12
 
     # --- Sheet 2: 统计信息 (Stats) ---
-    create_shared_stats_sheet(wb, matches, db, hm)
+    create_shared_stats_sheet(wb, drafts, db, hm)
+    create_slot_heatmap_sheet(wb, drafts, hm)
 
     output = BytesIO()
     wb.save(output)
     return output.getvalue()
 
-def generate_template_4(matches, team_name, db, hm):
+def generate_template_4(drafts, team_name, db, hm):
     """
     Template 4: Review Template (Text Template 2)
     Customized per user request:
@@ -739,49 +651,11 @@ def generate_template_4(matches, team_name, db, hm):
     border_thin = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
 
     # --- Identify Main Players for Header ---
-    # Reuse logic from analysis tab roughly
-    pos_player_counts = {i: {} for i in range(1, 6)}
-    for m in matches:
-        my_side = 0 if m.is_radiant else 1
-        my_ps = [p for p in m.players if p.team_side == my_side]
-        for p in my_ps:
-            if p.position and 1 <= p.position <= 5 and p.account_id:
-                pos_player_counts[p.position][p.account_id] = pos_player_counts[p.position].get(p.account_id, 0) + 1
-    
-    # Manual DB Lookup
-    target_team = db.query(Team).filter(Team.name == team_name).first()
-    manual_players = {i: [] for i in range(1, 6)}
-    if target_team:
-        team_players = db.query(Player).filter(Player.team_id == target_team.team_id, Player.default_pos != None).all()
-        for p in team_players:
-            if 1 <= p.default_pos <= 5:
-                manual_players[p.default_pos].append(p.account_id)
-    
+    main_players = resolve_main_players(collect_team_stats(drafts), db, team_name)
     main_players_map = {} # pos -> name
-    matches_desc = sorted(matches, key=lambda m: m.match_time, reverse=True)
     
     for pos in range(1, 6):
-        final_acc_id = None
-        candidates = manual_players[pos]
-        if candidates:
-            if len(candidates) == 1:
-                final_acc_id = candidates[0]
-            else:
-                found = False
-                for m in matches_desc:
-                    if found: break
-                    my_side = 0 if m.is_radiant else 1
-                    my_ps = [p for p in m.players if p.team_side == my_side]
-                    for p in my_ps:
-                        if p.account_id in candidates:
-                            final_acc_id = p.account_id
-                            found = True
-                            break
-                if not found: final_acc_id = candidates[0]
-        else:
-            counts = pos_player_counts[pos]
-            if counts:
-                final_acc_id = max(counts, key=counts.get)
+        final_acc_id = main_players.get(pos)
         
         # Get Name
         p_name = f"{pos}号位"
@@ -902,7 +776,7 @@ def generate_template_4(matches, team_name, db, hm):
     
     # --- Data Rows ---
     row_idx = 3
-    for idx, m in enumerate(matches, start=1):
+    for idx, m in enumerate(drafts, start=1):
         # A: Index
         ws.cell(row=row_idx, column=1, value=m.match_id).border = border_thin
         
@@ -920,31 +794,24 @@ def generate_template_4(matches, team_name, db, hm):
         res_cell.alignment = alignment_center
         
         # Helper for content
-        def get_hero_cell_val(hid, pick_order_map):
+        def get_hero_cell_val(hid):
              if not hid: return "-"
              h_data = hm.get_hero(hid)
              h_name = h_data.get('slang') or h_data.get('cn_name')
              # Append Order #N
-             order = pick_order_map.get(hid, "?")
+             order = m.pick_order(hid) or "?"
              return f"{h_name}{order}"
 
-        pick_order_map = {pb.hero_id: pb.order + 1 for pb in m.pick_bans if pb.is_pick}
-        
         # My Side & Opp Side
         my_is_radiant = m.is_radiant
         
         # E-I: My Team
         # Find hero for each position 1-5
-        # m.players has position info.
-        my_side_int = 0 if my_is_radiant else 1
-        my_pmap = {}
-        for p in m.players:
-            if p.team_side == my_side_int and p.position and 1 <= p.position <= 5:
-                my_pmap[p.position] = p.hero_id
+        my_pmap = m.pos_map(mine=True)
                 
         for i in range(1, 6):
             hid = my_pmap.get(i)
-            val = get_hero_cell_val(hid, pick_order_map)
+            val = get_hero_cell_val(hid)
             ws.cell(row=row_idx, column=4+i, value=val).border = border_thin
             
         # J: Side
@@ -959,36 +826,28 @@ def generate_template_4(matches, team_name, db, hm):
         side_cell.alignment = alignment_center
         
         # K-O: Opponent
-        opp_side_int = 1 if my_is_radiant else 0
-        opp_pmap = {}
-        for p in m.players:
-             if p.team_side == opp_side_int and p.position and 1 <= p.position <= 5:
-                opp_pmap[p.position] = p.hero_id
+        opp_pmap = m.pos_map(mine=False)
         
         for i in range(1, 6):
             hid = opp_pmap.get(i)
-            val = get_hero_cell_val(hid, pick_order_map)
+            val = get_hero_cell_val(hid)
             ws.cell(row=row_idx, column=10+i, value=val).border = border_thin
 
         # --- Bans ---
         i_am_first_ban = m.first_pick 
         opp_is_first_ban = not i_am_first_ban
         
-        # Collect bans by team
-        my_bans = []
-        opp_bans = []
-        
-        sorted_bans = sorted([pb for pb in m.pick_bans if not pb.is_pick], key=lambda x: x.order)
+        # Collect bans by team (already ordered on the DraftRecord)
+        def ban_vals(actions):
+            vals = []
+            for b in actions:
+                h_data = hm.get_hero(b.hero_id)
+                h_name = h_data.get('slang') or h_data.get('cn_name')
+                vals.append(f"{h_name}{b.order + 1}")
+            return vals
         
-        for b in sorted_bans:
-            # Check team side
-            is_my_ban = (b.team_side == my_side_int)
-            h_data = hm.get_hero(b.hero_id)
-            h_name = h_data.get('slang') or h_data.get('cn_name')
-            val = f"{h_name}{b.order + 1}"
-            
-            if is_my_ban: my_bans.append(val)
-            else: opp_bans.append(val)
+        my_bans = ban_vals(m.my_bans)
+        opp_bans = ban_vals(m.opp_bans)
             
         # Fill P-V: Opponent Bans
         for i in range(7):
@@ -1027,12 +886,608 @@ def generate_template_4(matches, team_name, db, hm):
         ws.column_dimensions[column].width = adjusted_width
 
     # --- Sheet 2: Stats ---
-    create_shared_stats_sheet(wb, matches, db, hm, team_name=team_name)
+    create_shared_stats_sheet(wb, drafts, db, hm, team_name=team_name)
+    create_slot_heatmap_sheet(wb, drafts, hm)
     
     output = BytesIO()
     wb.save(output)
     return output.getvalue()
 
+# =================================================================
+# Page Sections (Fragments)
+# Each section is an st.fragment with explicit inputs, so interacting with a
+# widget inside it only reruns that section instead of the whole page.
+# =================================================================
+
+@st.fragment
+def render_export_panel(match_filter, total, team_name, hm):
+    """
+    Sidebar Excel export widgets.
+    Must be called inside `with st.sidebar:`.
+    The drafts are re-streamed on click, only up to the export limit.
+    """
+    st.markdown("---")
+    st.subheader("Excel 报告")
+    
+    # Template Selection
+    export_template = st.selectbox(
+        "选择导出模版",
+        options=["默认模版", "图片模板", "文字模板", "文字模板2"]
+    )
+
+    # Image size / quality (picture templates only)
+    image_preset = st.selectbox(
+        "图片质量",
+        options=list(EXPORT_IMAGE_PRESETS),
+        index=list(EXPORT_IMAGE_PRESETS).index(DEFAULT_EXPORT_PRESET),
+        format_func=lambda k: EXPORT_IMAGE_PRESETS[k].label,
+        disabled=export_template not in ("默认模版", "图片模板"),
+        help="标准: 按单元格尺寸输出 256 色 PNG；高清: 2 倍分辨率全彩 PNG (文件较大)；最小体积: JPEG"
+    )
+
+    # Export Limit
+    export_limit = st.number_input(
+        "导出条目数量 (最近 N 场)",
+        min_value=1,
+        max_value=total,
+        value=total
+    )
+    
+    if st.button("生成 Excel 报告"):
+        with st.spinner("正在生成 Excel 报告..."):
+            db = next(get_db())
+            excel_data = None
+            
+            # Most recent N matches of the current filter
+            drafts_to_export = list(iter_match_drafts(db, match_filter.query(db), limit=export_limit))
+
+            if "默认模版" in export_template:
+                excel_data = generate_detailed_excel_export(drafts_to_export, team_name, db, hm, image_preset)
+            elif "图片模板" in export_template:
+                excel_data = generate_template_2(drafts_to_export, team_name, db, hm, image_preset)
+            elif "文字模板2" in export_template:
+                excel_data = generate_template_4(drafts_to_export, team_name, db, hm)
+            elif "文字模板" in export_template:
+                # Keep this last as it matches partially
+                excel_data = generate_template_3(drafts_to_export, team_name, db, hm)
+            
+            if excel_data:
+                st.download_button(
+                    label="📥 下载 Excel",
+                    data=excel_data,
+                    file_name=f"{team_name}_{export_template.split(':')[0]}_{datetime.now().strftime('%Y%m%d')}.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                )
+
+def render_team_overview(stats, team_name, hm):
+    """
+    TAB 1: 战队概况
+    Win rates and pick/ban tables are drawn directly; the hero selector lives
+    in its own fragment and only receives the pre-aggregated dicts.
+    """
+    total = stats.total
+    wins = stats.wins
+    
+    rad_games, rad_wins = stats.split('rad')
+    dire_games, dire_wins = stats.split('dire')
+    
+    rad_wr = (rad_wins / rad_games * 100) if rad_games else 0
+    dire_wr = (dire_wins / dire_games * 100) if dire_games else 0
+    
+    st.subheader("胜率统计")
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("总胜率", f"{(wins/total*100):.1f}%", f"{wins}胜 - {total-wins}负")
+    c2.metric("天辉胜率", f"{rad_wr:.1f}%", f"{rad_games}场")
+    c3.metric("夜魇胜率", f"{dire_wr:.1f}%", f"{dire_games}场")
+    w_games, w_wins = stats.weighted
+    if w_games:
+        c4.metric("强度加权胜率", f"{w_wins / w_games * 100:.1f}%", help="每场按对手赛前评分加权: 平均水平的对手权重为 1，越强权重越高 (最高 2)")
+    
+    render_team_ratings(team_name)
+    
+    st.divider()
+    
+    # --- Hero Stats (accumulated while streaming) ---
+    pick_counts = stats.pick_counts
+    ban_counts = stats.ban_counts
+    
+    # Top Picks / Bans UI
+    c_pick, c_ban = st.columns(2)
+    
+    with c_pick:
+        st.subheader("本队常用英雄 (Pick)")
+        if pick_counts:
+            df_pick = pd.DataFrame(list(pick_counts.items()), columns=['hero_id', 'count'])
+            df_pick['英雄'] = df_pick['hero_id'].apply(lambda x: hm.get_hero(x).get('cn_name'))
+            df_pick['场次'] = df_pick['count']
+            df_pick['加权胜率'] = df_pick['hero_id'].apply(
+                lambda x: f"{stats.hero_weighted[x][1] / stats.hero_weighted[x][0]:.0%}" if stats.hero_weighted.get(x, [0])[0] else "-"
+            )
+            df_pick = df_pick.sort_values('count', ascending=False).head(10)
+            st.dataframe(df_pick[['英雄', '场次', '加权胜率']], hide_index=True)
+        else:
+            st.caption("无数据")
+            
+    with c_ban:
+        st.subheader("对手禁用英雄 (Ban)")
+        if ban_counts:
+            df_ban = pd.DataFrame(list(ban_counts.items()), columns=['hero_id', 'count'])
+            df_ban['英雄'] = df_ban['hero_id'].apply(lambda x: hm.get_hero(x).get('cn_name'))
+            df_ban['场次'] = df_ban['count']
+            df_ban = df_ban.sort_values('count', ascending=False).head(10)
+            st.dataframe(df_ban[['英雄', '场次']], hide_index=True)
+        else:
+            st.caption("无数据")
+
+    # --- Recent Form (rolling windows / time decay) ---
+    st.divider()
+    render_recent_form(team_name, hm)
+
+    # --- Detailed Analysis (Requirement #5 & #6) ---
+    st.divider()
+    render_hero_detail(pick_counts, stats.player_partners, stats.pick_partner_wins, stats.hero_positions, hm)
+
+@st.fragment
+def render_recent_form(team_name, hm):
+    """
+    近期状态: 最近 N 场 / 最近 N 天 / 时间衰减。
+    Independent of the sidebar filters; read from the incrementally
+    maintained RecentFormIndex, so switching the window is cheap.
+    """
+    st.subheader("近期状态")
+    
+    form = get_recent_form().team(team_name)
+    if not form:
+        st.caption("无数据")
+        return
+    
+    window_opts = {"最近 10 场": ("games", 10), "最近 20 场": ("games", 20)}
+    window_opts.update({f"近 {d} 天": ("days", d) for d in WINDOW_DAYS})
+    window_opts[f"时间衰减 (半衰期 {HALF_LIFE_DAYS} 天)"] = ("decay", None)
+    
+    sel_window = st.radio("统计窗口", options=list(window_opts.keys()), horizontal=True)
+    mode, n = window_opts[sel_window]
+    if mode == "games":
+        counters = form.last_games(n)
+    elif mode == "days":
+        counters = form.last_days(n)
+    else:
+        counters = form.time_decayed()
+    
+    if counters.games <= 0:
+        st.caption("该窗口内无比赛")
+        return
+    
+    # Decayed weights are shown as share of the total weight instead of games
+    def weight_label(w):
+        if mode == "decay":
+            return f"{w / counters.games:.1%}"
+        return f"{int(round(w))}"
+    
+    weight_col = "权重" if mode == "decay" else "场次"
+    
+    c1, c2 = st.columns(2)
+    c1.metric("胜率", f"{counters.wins / counters.games:.1%}")
+    if mode != "decay":
+        c2.metric("场次", int(counters.games))
+    
+    c_hero, c_pair = st.columns(2)
+    
+    with c_hero:
+        st.markdown("**英雄**")
+        if counters.heroes:
+            rows = [
+                {"英雄": hm.get_hero(hid).get('cn_name'), weight_col: weight_label(w), "胜率": f"{ww / w:.0%}", "_w": w}
+                for hid, (w, ww) in counters.heroes.items()
+            ]
+            df = pd.DataFrame(rows).sort_values("_w", ascending=False).head(10)
+            st.dataframe(df, column_config={"_w": None}, hide_index=True)
+        else:
+            st.caption("无数据")
+    
+    with c_pair:
+        st.markdown("**常用组合**")
+        if counters.pairs:
+            rows = [
+                {
+                    "组合": f"{hm.get_hero(a).get('cn_name')} + {hm.get_hero(b).get('cn_name')}",
+                    weight_col: weight_label(w),
+                    "胜率": f"{ww / w:.0%}",
+                    "_w": w
+                }
+                for (a, b), (w, ww) in counters.pairs.items()
+            ]
+            df = pd.DataFrame(rows).sort_values("_w", ascending=False).head(10)
+            st.dataframe(df, column_config={"_w": None}, hide_index=True)
+        else:
+            st.caption("无数据")
+    
+    if counters.players:
+        db = next(get_db())
+        player_opts = sorted(counters.players, key=lambda acc: sum(w for w, _ in counters.players[acc].values()), reverse=True)
+        sel_acc = st.selectbox(
+            "选手英雄池",
+            options=player_opts,
+            format_func=lambda acc: player_display_name(db, acc)
+        )
+        rows = [
+            {"英雄": hm.get_hero(hid).get('cn_name'), weight_col: weight_label(w), "胜率": f"{ww / w:.0%}", "_w": w}
+            for hid, (w, ww) in counters.players[sel_acc].items()
+        ]
+        df = pd.DataFrame(rows).sort_values("_w", ascending=False)
+        st.dataframe(df, column_config={"_w": None}, hide_index=True)
+
+@st.fragment
+def render_hero_detail(pick_counts, hero_partners, partner_wins, hero_positions, hm):
+    """
+    英雄深度分析: switching the hero only reruns this fragment.
+    """
+    st.subheader("英雄深度分析")
+    
+    # Hero Selector (sorted by pick count)
+    sorted_heroes = sorted(pick_counts.items(), key=lambda x: x[1], reverse=True)
+    hero_opts = {f"{hm.get_hero(hid).get('cn_name')} ({count}场)": hid for hid, count in sorted_heroes}
+    
+    if not hero_opts:
+        st.info("暂无英雄数据")
+        return
+        
+    sel_hero_label = st.selectbox("选择要分析的英雄", options=list(hero_opts.keys()))
+    sel_hero_id = hero_opts[sel_hero_label]
+    
+    h_data = hm.get_hero(sel_hero_id)
+    
+    dc1, dc2 = st.columns([1, 3])
+    with dc1:
+        portrait = hero_thumbnail_src(h_data, PICK_SIZE)
+        if portrait:
+            st.image(portrait, width=150) # Approx 50% width if column is small
+        
+        # Position Stats
+        st.markdown("**位置分布:**")
+        pos_stats = hero_positions.get(sel_hero_id, {})
+        if pos_stats:
+            total_p = sum(pos_stats.values())
+            for p_idx in range(1, 6):
+                c = pos_stats.get(p_idx, 0)
+                if c > 0:
+                    st.text(f"{p_idx}号位: {c} ({c/total_p*100:.0f}%)")
+        else:
+            st.caption("暂无位置数据")
+
+    with dc2:
+        st.markdown("**最佳搭档:**")
+        partners = hero_partners.get(sel_hero_id, {})
+        if partners:
+            # Win Rate for partners comes from the pre-aggregated pair wins
+            wins_map = partner_wins.get(sel_hero_id, {})
+            partner_stats = []
+            
+            for pid, p_count in partners.items():
+                wr = wins_map.get(pid, 0) / p_count if p_count > 0 else 0
+                partner_stats.append({
+                    'partner_id': pid,
+                    'count': p_count,
+                    'win_rate': wr
+                })
+            
+            df_partners = pd.DataFrame(partner_stats)
+            df_partners['搭档'] = df_partners['partner_id'].apply(lambda x: hm.get_hero(x).get('cn_name'))
+            df_partners['头像'] = df_partners['partner_id'].apply(lambda x: hero_icon_uri(hm.get_hero(x)))
+            df_partners['场次'] = df_partners['count']
+            df_partners['胜率'] = df_partners['win_rate'].apply(lambda x: f"{x:.1%}")
+            
+            df_partners = df_partners.sort_values('count', ascending=False).head(5)
+            
+            st.dataframe(
+                df_partners[['头像', '搭档', '场次', '胜率']],
+                column_config={
+                    "头像": st.column_config.ImageColumn("头像", width="small")
+                },
+                hide_index=True
+            )
+        else:
+            st.caption("暂无搭档数据")
+
+    # --- Whole-database synergy / counters (all teams) ---
+    matrix = get_hero_matrix()
+    mc1, mc2 = st.columns([2, 1])
+    sel_patch = mc1.selectbox("全库统计版本", options=["全部版本"] + matrix.patches())
+    min_games = mc2.number_input("最少场次", min_value=1, value=3)
+    patches = None if sel_patch == "全部版本" else [sel_patch]
+    
+    cc1, cc2 = st.columns(2)
+    with cc1:
+        st.markdown("**全库最佳搭档 (同队胜率):**")
+        render_pair_stats(matrix.best_partners(sel_hero_id, patches, min_games), hm)
+    with cc2:
+        st.markdown("**全库克制英雄 (对阵胜率):**")
+        render_pair_stats(matrix.best_counters(sel_hero_id, patches, min_games), hm)
+
+def render_pair_stats(pair_stats, hm):
+    if not pair_stats:
+        st.caption("暂无数据")
+        return
+    df = pd.DataFrame([
+        {
+            "头像": hero_icon_uri(hm.get_hero(s.hero_id)),
+            "英雄": hm.get_hero(s.hero_id).get('cn_name'),
+            "场次": s.games,
+            "胜率": f"{s.win_rate:.1%}"
+        }
+        for s in pair_stats
+    ])
+    st.dataframe(df, column_config={"头像": st.column_config.ImageColumn("头像", width="small")}, hide_index=True)
+
+@st.fragment
+def render_player_pools(stats, team_name, hm):
+    """
+    TAB 2: 选手绝活 (With Context Filter - Req #7)
+    The context checkbox and the five roster tabs rerun as one fragment.
+    """
+    st.subheader("主力选手英雄池")
+    
+    db = next(get_db())
+    
+    # Filter Checkbox
+    filter_context = st.checkbox("仅分析当前筛选范围内的比赛", value=True)
+    
+    # Identify Main Players from CURRENT context first
+    # Logic Update: Use Manual DB Assignment First, then most frequent player
+    # in the stats provided to this view (already filtered by time/league).
+    main_players = resolve_main_players(stats, db, team_name)
+    
+    pos_tabs = st.tabs([f"{i}号位" for i in range(1, 6)])
+    
+    for i, tab in enumerate(pos_tabs):
+        pos = i + 1
+        acc_id = main_players.get(pos)
+        
+        with tab:
+            if not acc_id:
+                st.warning(f"当前范围内未检测到固定的 {pos}号位 选手。")
+                continue
+            
+            # Get Player Info
+            p_info = db.query(Player).filter(Player.account_id == acc_id).first()
+            # Or Alias
+            alias = db.query(PlayerAlias).filter(PlayerAlias.account_id == acc_id).first()
+            p_name_display = f"未知 ({acc_id})"
+            if alias and alias.player: p_name_display = alias.player.name
+            elif p_info: p_name_display = p_info.name
+            
+            st.markdown(f"**选手: {p_name_display}**")
+            
+            # Determine data source
+            if filter_context:
+                source = stats
+            else:
+                # Stream ALL matches for this player in last 3 years
+                three_years_ago = datetime.now() - timedelta(days=3*365)
+                player_query = db.query(Match).filter(
+                    Match.players.any(PlayerPerformance.account_id == acc_id),
+                    Match.match_time >= three_years_ago
+                )
+                source = TeamStatsAccumulator(recent_limit=0).add_all(iter_match_drafts(db, player_query))
+            
+            hero_stats = source.player_heroes.get(acc_id, {})
+            
+            if hero_stats:
+                data = []
+                for hid, s in hero_stats.items():
+                    total = s['picks']
+                    if total == 0: continue
+                    
+                    wr = s['wins']/total*100
+                    rad_wr = (s['rad_wins']/s['rad_picks']*100) if s['rad_picks'] else 0
+                    dire_wr = (s['dire_wins']/s['dire_picks']*100) if s['dire_picks'] else 0
+                    
+                    h = hm.get_hero(hid)
+                    data.append({
+                        "英雄": h.get('cn_name'),
+                        "使用率": f"{(total/source.total*100):.1f}% ({total})",
+                        "胜率": f"{wr:.1f}%",
+                        "天辉% (胜率)": f"{(s['rad_picks']/total*100):.0f}% ({rad_wr:.0f}%)",
+                        "夜魇% (胜率)": f"{(s['dire_picks']/total*100):.0f}% ({dire_wr:.0f}%)",
+                        "icon": hero_icon_uri(h),
+                        "_sort_pick": total
+                    })
+                
+                df = pd.DataFrame(data).sort_values("_sort_pick", ascending=False)
+                
+                st.dataframe(
+                    df, 
+                    column_config={
+                        "icon": st.column_config.ImageColumn("头像", width="small"),
+                        "_sort_pick": None 
+                    },
+                    hide_index=True
+                )
+            else:
+                st.info("无数据")
+
+@st.fragment
+def render_bp_chain(stats, hm):
+    """
+    TAB 3: BP 链条 (BP Log)
+    Opponent filter and the "最近多少场" number only rerun this fragment.
+    """
+    st.subheader("最近比赛 BP 链条")
+    
+    # 1. Filter Opponent
+    opponents = sorted(stats.recent_by_opponent)
+    selected_opponents = st.multiselect("过滤对手", options=opponents)
+    
+    limit_bp = st.number_input("显示最近多少场?", 5, stats.recent_limit, 10)
+    
+    # Apply filter (only the most recent drafts per opponent are kept)
+    bp_matches = stats.recent_drafts(selected_opponents, limit_bp)
+    
+    if not bp_matches:
+        st.info("无符合条件的比赛。")
+    
+    for m in bp_matches:
+        res_emoji = "✅" if m.win else "❌"
+        # Determine side for display
+        my_side_str = "天辉" if m.is_radiant else "夜魇"
+        header = f"{m.match_time.strftime('%m-%d')} | vs {m.opponent_name} ({my_side_str}) | {res_emoji}"
+        
+        with st.expander(header, expanded=True):
+            rad_name = m.radiant_name
+            dire_name = m.dire_name
+            
+            is_radiant_first = m.radiant_first
+            
+            # Center the visual - or standard layout
+            # User requested "side-by-side" compact view for BP chain too?
+            # "优化一下比赛列表和统计分析中BP显示的排版" -> "Stats Analysis BP Chain" also implied.
+            # So we use the new layout here too.
+            
+            render_bp_visual(m, rad_name, dire_name, hm, first_pick_radiant=is_radiant_first, layout="side-by-side")
+
+@st.fragment
+def render_slot_heatmap(match_filter, hm):
+    """
+    TAB 4: BP 热力图
+    Per-order pick/ban distribution, cached per filter set.
+    """
+    st.subheader("BP 顺位热力图")
+    
+    db = next(get_db())
+    tensor = get_slot_tensor(db, match_filter)
+    
+    c1, c2 = st.columns([1, 3])
+    side = c1.radio("本队", options=[FIRST_PICK, SECOND_PICK], format_func=lambda x: SLOT_SIDE_LABELS[x], horizontal=True)
+    top_n = c2.slider("每个顺位显示英雄数", 3, 10, 5)
+    
+    games = int(tensor.games[side])
+    st.caption(f"{SLOT_SIDE_LABELS[side]}场次: {games}。单元格颜色 = 该英雄在该顺位的出现场次占比。")
+    if games == 0:
+        st.info("无数据")
+        return
+    
+    rows = slot_heatmap_rows(tensor, side, hm, top_n)
+    cols = [f"Top{i + 1}" for i in range(top_n)]
+    data = []
+    shares = []
+    for label, heroes in rows:
+        row = {"顺位": label}
+        share_row = {}
+        for i, col in enumerate(cols):
+            if i < len(heroes):
+                name, cnt, share = heroes[i]
+                row[col] = f"{name} ({cnt})"
+                share_row[col] = share
+            else:
+                row[col] = ""
+                share_row[col] = 0
+        data.append(row)
+        shares.append(share_row)
+    
+    df = pd.DataFrame(data)
+    df_share = pd.DataFrame(shares, columns=cols)
+    styled = df.style.apply(
+        lambda _: df_share.map(lambda v: f"background-color: #{heat_color(v)}" if v else "").reindex(columns=df.columns, fill_value=""),
+        axis=None
+    )
+    st.dataframe(styled, hide_index=True, width="stretch", height=38 + 35 * len(data))
+
+RATING_MIN_GAMES = 5
+OPPONENT_TOP_N = (8, 16, 32)
+
+def render_team_ratings(team_name):
+    """战队评分 (Glicko) 与排行榜"""
+    ratings = get_team_ratings()
+    c1, c2 = st.columns(2)
+    for col, track, label in ((c1, OFFICIAL, "正式比赛评分"), (c2, SCRIM, "训练赛评分")):
+        r = ratings.rating(team_name, track)
+        if r:
+            board = ratings.leaderboard(track, min_games=RATING_MIN_GAMES)
+            rank = next((i + 1 for i, t in enumerate(board) if t.team_name == team_name), None)
+            col.metric(label, f"{r.rating:.0f} ± {2 * r.rd:.0f}", f"第 {rank} 名" if rank else f"{r.games} 场", delta_color="off")
+        else:
+            col.metric(label, "-")
+    
+    with st.expander("评分排行榜"):
+        track = st.radio("赛道", options=[OFFICIAL, SCRIM], format_func=lambda t: "正式比赛" if t == OFFICIAL else "训练赛", horizontal=True)
+        board = ratings.leaderboard(track, min_games=RATING_MIN_GAMES)
+        if not board:
+            st.caption("无数据")
+            return
+        st.dataframe(
+            pd.DataFrame([
+                {
+                    "排名": i + 1,
+                    "战队": r.team_name,
+                    "评分": round(r.rating),
+                    "RD": round(r.rd),
+                    "场次": r.games,
+                    "胜率": f"{r.wins / r.games:.0%}",
+                    "最近比赛": r.last_played.strftime("%Y-%m-%d") if r.last_played else "-"
+                }
+                for i, r in enumerate(board)
+            ]),
+            hide_index=True,
+            width="stretch"
+        )
+        st.caption(f"Glicko 评分，按 评分 - 2×RD 排序；至少 {RATING_MIN_GAMES} 场。长时间不比赛 RD 会逐渐变大。")
+
+TREND_METRICS = {
+    "选取次数": lambda df: df["picks"],
+    "选取率": lambda df: df["picks"] / df["games"] * 100,
+    "禁用率": lambda df: df["bans"] / df["games"] * 100,
+    "胜率": lambda df: (df["pick_wins"] / df["picks"] * 100).where(df["picks"] > 0)
+}
+TREND_SPANS = {"近 3 个月": 13, "近半年": 26, "近 1 年": 52, "近 2 年": 104, "全部": None}
+
+@st.fragment
+def render_hero_trends(team_name, hm):
+    """
+    TAB 5: 英雄趋势
+    Weekly / per-patch series from the columnar HeroTrendIndex; independent of
+    the sidebar filters and never touches ORM objects.
+    """
+    st.subheader("英雄使用趋势")
+    
+    trends = get_hero_trends()
+    c1, c2, c3, c4 = st.columns(4)
+    scope = c1.radio("范围", options=[team_name, None], format_func=lambda t: "本队" if t else "全库", horizontal=True)
+    freq = c2.radio("周期", options=[WEEKLY, PER_PATCH], format_func=lambda f: "按周" if f == WEEKLY else "按版本", horizontal=True)
+    metric = c3.selectbox("指标", options=list(TREND_METRICS))
+    span = c4.selectbox("时间跨度", options=list(TREND_SPANS), index=3, disabled=freq != WEEKLY)
+    
+    df = trends.series(scope, freq)
+    if df.empty:
+        st.info("无数据")
+        return
+    if freq == WEEKLY and TREND_SPANS[span]:
+        df = df[df["period"] >= df["period"].max() - pd.Timedelta(weeks=TREND_SPANS[span])]
+    
+    totals = df.groupby("hero_id")[["picks", "bans"]].sum()
+    ranked = (totals["picks"] + totals["bans"]).sort_values(ascending=False).index.tolist()
+    sel_heroes = st.multiselect(
+        "英雄",
+        options=ranked,
+        default=ranked[:5],
+        format_func=lambda hid: hm.get_hero(hid).get('cn_name') or str(hid)
+    )
+    if not sel_heroes:
+        return
+    
+    periods = df[["period", "games"]].drop_duplicates("period").set_index("period")["games"]
+    sel = df[df["hero_id"].isin(sel_heroes)].copy()
+    sel["value"] = TREND_METRICS[metric](sel)
+    chart = sel.pivot_table(index="period", columns="hero_id", values="value", observed=True)
+    chart = chart.reindex(periods.index)
+    if metric != "胜率":
+        chart = chart.fillna(0)  # no action that period = 0, not unknown
+    chart.columns = [hm.get_hero(hid).get('cn_name') or str(hid) for hid in chart.columns]
+    if freq == PER_PATCH:
+        chart.index = chart.index.astype(str)
+    
+    st.line_chart(chart, y_label=metric + ("" if metric == "选取次数" else " (%)"))
+    st.caption(f"共 {int(periods.sum())} 场，{len(periods)} 个周期。" + ("按周统计时周期起点为周一。" if freq == WEEKLY else ""))
+
 def show():
     st.title("统计分析")
     
@@ -1079,436 +1534,55 @@ def show():
             st.sidebar.caption(f"起始日期: {start_date}")
     else:
         start_date = st.sidebar.date_input("起始日期", value=datetime.today().date() - timedelta(days=90))
-        
-    # Build Query
-    query = db.query(Match).filter(Match.team_name == selected_team)
-    
-    if start_date:
-        query = query.filter(Match.match_time >= start_date)
+
+    # Opponent strength filter: current Glicko leaderboard (official matches)
+    ratings = get_team_ratings()
+    ranked_teams = [r.team_name for r in ratings.leaderboard(OFFICIAL, min_games=RATING_MIN_GAMES) if r.team_name != selected_team]
+    strength_opts = {"全部对手": None}
+    strength_opts.update({f"评分前 {n} 的对手": n for n in OPPONENT_TOP_N if n < len(ranked_teams)})
+    selected_strength = st.sidebar.selectbox("对手强度", options=list(strength_opts.keys()))
+    top_n = strength_opts[selected_strength]
+    opponents = tuple(ranked_teams[:top_n]) if top_n else ()
+        
+    # Stream the filtered matches in keyset pages and aggregate on the fly,
+    # so memory does not grow with the length of the history.
+    match_filter = TeamMatchFilter(selected_team, start_date, tuple(selected_league_ids), opponents)
     
-    if selected_league_ids:
-        query = query.filter(Match.league_id.in_(selected_league_ids))
-        
-    matches = query.order_by(Match.match_time.desc()).all()
+    progress = st.sidebar.empty()
+    stats = TeamStatsAccumulator(weight_fn=ratings.opponent_weight)
+    for draft in iter_match_drafts(db, match_filter.query(db)):
+        stats.add(draft)
+        if stats.total % CHUNK_SIZE == 0:
+            progress.caption(f"已加载 {stats.total} 场比赛...")
     
-    if not matches:
+    if stats.total == 0:
+        progress.empty()
         st.warning("该范围内无比赛数据。")
         db.close()
         return
     
-    st.sidebar.success(f"已加载 {len(matches)} 场比赛")
+    progress.success(f"已加载 {stats.total} 场比赛")
     
     # --- Excel Export Button ---
-    st.sidebar.markdown("---")
-    st.sidebar.subheader("Excel 报告")
-    
-    # Template Selection
-    export_template = st.sidebar.selectbox(
-        "选择导出模版",
-        options=["默认模版", "图片模板", "文字模板", "文字模板2"]
-    )
-
-    # Export Limit
-    export_limit = st.sidebar.number_input(
-        "导出条目数量 (最近 N 场)",
-        min_value=1,
-        max_value=len(matches),
-        value=len(matches)
-    )
-    
-    if st.sidebar.button("生成 Excel 报告"):
-        with st.spinner("正在生成 Excel 报告..."):
-            # Ensure filtering context is passed/used implicitly by passing 'matches' which is already filtered.
-            excel_data = None
-            
-            # Slice matches for export only
-            matches_to_export = matches[:export_limit]
-
-            if "默认模版" in export_template:
-                excel_data = generate_detailed_excel_export(matches_to_export, selected_team, db, hm)
-            elif "图片模板" in export_template:
-                excel_data = generate_template_2(matches_to_export, selected_team, db, hm)
-            elif "文字模板2" in export_template:
-                excel_data = generate_template_4(matches_to_export, selected_team, db, hm)
-            elif "文字模板" in export_template:
-                # Keep this last as it matches partially
-                excel_data = generate_template_3(matches_to_export, selected_team, db, hm)
-            
-            if excel_data:
-                st.sidebar.download_button(
-                    label="📥 下载 Excel",
-                    data=excel_data,
-                    file_name=f"{selected_team}_{export_template.split(':')[0]}_{datetime.now().strftime('%Y%m%d')}.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                )
+    with st.sidebar:
+        render_export_panel(match_filter, stats.total, selected_team, hm)
 
     # =================================================================
     # TABS
     # =================================================================
-    tab_team, tab_player, tab_bp = st.tabs(["🛡️ 战队概况", "👤 选手绝活", "⛓️ BP 链条"])
+    tab_team, tab_player, tab_bp, tab_heat, tab_trend = st.tabs(["🛡️ 战队概况", "👤 选手绝活", "⛓️ BP 链条", "🔥 BP 热力图", "📈 英雄趋势"])
     
-    # -----------------------------------------------------------------
-    # TAB 1: 战队概况
-    # -----------------------------------------------------------------
     with tab_team:
-        total = len(matches)
-        wins = sum(1 for m in matches if m.win)
-        
-        rad_m = [m for m in matches if m.is_radiant]
-        rad_wins = sum(1 for m in rad_m if m.win)
-        
-        dire_m = [m for m in matches if not m.is_radiant]
-        dire_wins = sum(1 for m in dire_m if m.win)
-        
-        rad_wr = (sum(1 for m in rad_m if m.win) / len(rad_m) * 100) if rad_m else 0
-        dire_wr = (sum(1 for m in dire_m if m.win) / len(dire_m) * 100) if dire_m else 0
-        
-        st.subheader("胜率统计")
-        c1, c2, c3 = st.columns(3)
-        c1.metric("总胜率", f"{(wins/total*100):.1f}%", f"{wins}胜 - {total-wins}负")
-        c2.metric("天辉胜率", f"{rad_wr:.1f}%", f"{len(rad_m)}场")
-        c3.metric("夜魇胜率", f"{dire_wr:.1f}%", f"{len(dire_m)}场")
-        
-        st.divider()
-        
-        # --- Hero Stats ---
-        pick_counts = {} 
-        ban_counts = {}  
-        
-        # Combo Analysis Data Preparation
-        hero_partners = {} 
-        hero_positions = {} # hero_id -> {pos: count}
-        
-        for m in matches:
-            my_side = 0 if m.is_radiant else 1
-            
-            # Picks/Bans
-            for pb in m.pick_bans:
-                if pb.is_pick and pb.team_side == my_side:
-                    pick_counts[pb.hero_id] = pick_counts.get(pb.hero_id, 0) + 1
-                
-                if not pb.is_pick and pb.team_side != my_side:
-                    ban_counts[pb.hero_id] = ban_counts.get(pb.hero_id, 0) + 1
-            
-            # Player Performance for Combos & Positions
-            my_team_heroes = []
-            my_team_performances = [p for p in m.players if p.team_side == my_side]
-            
-            for p in my_team_performances:
-                my_team_heroes.append(p.hero_id)
-                
-                # Position Stats
-                if p.hero_id not in hero_positions: hero_positions[p.hero_id] = {}
-                pos = p.position
-                if pos > 0:
-                    hero_positions[p.hero_id][pos] = hero_positions[p.hero_id].get(pos, 0) + 1
-
-            # Combo Counting
-            for hid in my_team_heroes:
-                if hid not in hero_partners: hero_partners[hid] = {}
-                for partner in my_team_heroes:
-                    if hid != partner:
-                        hero_partners[hid][partner] = hero_partners[hid].get(partner, 0) + 1
-
-        # Top Picks / Bans UI
-        c_pick, c_ban = st.columns(2)
-        
-        with c_pick:
-            st.subheader("本队常用英雄 (Pick)")
-            if pick_counts:
-                df_pick = pd.DataFrame(list(pick_counts.items()), columns=['hero_id', 'count'])
-                df_pick['英雄'] = df_pick['hero_id'].apply(lambda x: hm.get_hero(x).get('cn_name'))
-                df_pick['场次'] = df_pick['count']
-                df_pick = df_pick.sort_values('count', ascending=False).head(10)
-                st.dataframe(df_pick[['英雄', '场次']], hide_index=True)
-            else:
-                st.caption("无数据")
-                
-        with c_ban:
-            st.subheader("对手禁用英雄 (Ban)")
-            if ban_counts:
-                df_ban = pd.DataFrame(list(ban_counts.items()), columns=['hero_id', 'count'])
-                df_ban['英雄'] = df_ban['hero_id'].apply(lambda x: hm.get_hero(x).get('cn_name'))
-                df_ban['场次'] = df_ban['count']
-                df_ban = df_ban.sort_values('count', ascending=False).head(10)
-                st.dataframe(df_ban[['英雄', '场次']], hide_index=True)
-            else:
-                st.caption("无数据")
+        render_team_overview(stats, selected_team, hm)
 
-        # --- Detailed Analysis (Requirement #5 & #6) ---
-        st.divider()
-        st.subheader("英雄深度分析")
-        
-        # Hero Selector (sorted by pick count)
-        sorted_heroes = sorted(pick_counts.items(), key=lambda x: x[1], reverse=True)
-        hero_opts = {f"{hm.get_hero(hid).get('cn_name')} ({count}场)": hid for hid, count in sorted_heroes}
-        
-        if not hero_opts:
-            st.info("暂无英雄数据")
-        else:
-            sel_hero_label = st.selectbox("选择要分析的英雄", options=list(hero_opts.keys()))
-            sel_hero_id = hero_opts[sel_hero_label]
-            
-            h_data = hm.get_hero(sel_hero_id)
-            
-            dc1, dc2 = st.columns([1, 3])
-            with dc1:
-                st.image(h_data.get('img_url'), width=150) # Approx 50% width if column is small
-                
-                # Position Stats
-                st.markdown("**位置分布:**")
-                pos_stats = hero_positions.get(sel_hero_id, {})
-                if pos_stats:
-                    total_p = sum(pos_stats.values())
-                    for p_idx in range(1, 6):
-                        c = pos_stats.get(p_idx, 0)
-                        if c > 0:
-                            st.text(f"{p_idx}号位: {c} ({c/total_p*100:.0f}%)")
-                else:
-                    st.caption("暂无位置数据")
-
-            with dc2:
-                st.markdown("**最佳搭档:**")
-                partners = hero_partners.get(sel_hero_id, {})
-                if partners:
-                    # Logic to calculate Win Rate for partners
-                    # Need to go back to matches and find when both were picked
-                    partner_stats = []
-                    
-                    for pid, p_count in partners.items():
-                        # Count wins where both sel_hero_id and pid were on My Team
-                        wins_with_partner = 0
-                        for m in matches:
-                            my_side = 0 if m.is_radiant else 1
-                            # Check if both heroes are in My Picks
-                            my_picks = [pb.hero_id for pb in m.pick_bans if pb.is_pick and pb.team_side == my_side]
-                            
-                            if sel_hero_id in my_picks and pid in my_picks:
-                                if m.win:
-                                    wins_with_partner += 1
-                                    
-                        wr = wins_with_partner / p_count if p_count > 0 else 0
-                        partner_stats.append({
-                            'partner_id': pid,
-                            'count': p_count,
-                            'win_rate': wr
-                        })
-                    
-                    df_partners = pd.DataFrame(partner_stats)
-                    df_partners['搭档'] = df_partners['partner_id'].apply(lambda x: hm.get_hero(x).get('cn_name'))
-                    df_partners['头像'] = df_partners['partner_id'].apply(lambda x: hm.get_hero(x).get('icon_url'))
-                    df_partners['场次'] = df_partners['count']
-                    df_partners['胜率'] = df_partners['win_rate'].apply(lambda x: f"{x:.1%}")
-                    
-                    df_partners = df_partners.sort_values('count', ascending=False).head(5)
-                    
-                    st.dataframe(
-                        df_partners[['头像', '搭档', '场次', '胜率']],
-                        column_config={
-                            "头像": st.column_config.ImageColumn("头像", width="small")
-                        },
-                        hide_index=True
-                    )
-                else:
-                    st.caption("暂无搭档数据")
-
-    # -----------------------------------------------------------------
-    # TAB 2: 选手绝活 (With Context Filter - Req #7)
-    # -----------------------------------------------------------------
     with tab_player:
-        st.subheader("主力选手英雄池")
-        
-        # Filter Checkbox
-        filter_context = st.checkbox("仅分析当前筛选范围内的比赛", value=True)
-        
-        # Identify Main Players from CURRENT context first
-        # Logic Update: Use Manual DB Assignment First
-        
-        # 1. Pre-calculate auto-detected stats (fallback)
-        pos_player_counts = {i: {} for i in range(1, 6)} 
-        # Use full matches for detection if context filter is off? 
-        # User said "Use recent matches" for conflict resolution.
-        # But 'main_players' logic should probably align with the excel export one.
-        # Let's use the 'matches' list provided to this view (which is already filtered by time/league).
-        
-        for m in matches:
-            my_side = 0 if m.is_radiant else 1
-            my_ps = [p for p in m.players if p.team_side == my_side]
-            for p in my_ps:
-                if p.position and 1 <= p.position <= 5 and p.account_id:
-                    pos_player_counts[p.position][p.account_id] = pos_player_counts[p.position].get(p.account_id, 0) + 1
-        
-        # 2. Manual DB Lookup
-        target_team = db.query(Team).filter(Team.name == selected_team).first()
-        manual_players = {i: [] for i in range(1, 6)}
-        
-        if target_team:
-            team_players = db.query(Player).filter(Player.team_id == target_team.team_id, Player.default_pos != None).all()
-            for p in team_players:
-                if 1 <= p.default_pos <= 5:
-                    manual_players[p.default_pos].append(p.account_id)
-        
-        main_players = {}
-        matches_desc = sorted(matches, key=lambda m: m.match_time, reverse=True)
-        
-        for pos in range(1, 6):
-            candidates = manual_players[pos]
-            if candidates:
-                if len(candidates) == 1:
-                    main_players[pos] = candidates[0]
-                else:
-                    # Conflict: most recent in current matches
-                    found = False
-                    for m in matches_desc:
-                        if found: break
-                        my_side = 0 if m.is_radiant else 1
-                        my_ps = [p for p in m.players if p.team_side == my_side]
-                        for p in my_ps:
-                            if p.account_id in candidates:
-                                main_players[pos] = p.account_id
-                                found = True
-                                break
-                    if not found:
-                        main_players[pos] = candidates[0]
-            else:
-                # Fallback
-                counts = pos_player_counts[pos]
-                if counts:
-                    main_players[pos] = max(counts, key=counts.get)
-        
-        pos_tabs = st.tabs([f"{i}号位" for i in range(1, 6)])
-        
-        for i, tab in enumerate(pos_tabs):
-            pos = i + 1
-            acc_id = main_players.get(pos)
-            
-            with tab:
-                if not acc_id:
-                    st.warning(f"当前范围内未检测到固定的 {pos}号位 选手。")
-                    continue
-                
-                # Get Player Info
-                p_info = db.query(Player).filter(Player.account_id == acc_id).first()
-                # Or Alias
-                alias = db.query(PlayerAlias).filter(PlayerAlias.account_id == acc_id).first()
-                p_name_display = f"未知 ({acc_id})"
-                if alias and alias.player: p_name_display = alias.player.name
-                elif p_info: p_name_display = p_info.name
-                
-                st.markdown(f"**选手: {p_name_display}**")
-                
-                # Determine data source
-                player_matches = []
-                if filter_context:
-                    player_matches = matches
-                else:
-                    # Query ALL matches for this player in last 3 years
-                    three_years_ago = datetime.now() - timedelta(days=3*365)
-                    perfs = db.query(PlayerPerformance).join(Match).filter(
-                        PlayerPerformance.account_id == acc_id,
-                        Match.match_time >= three_years_ago
-                    ).all()
-                    player_matches = [p.match for p in perfs if p.match]
-                
-                # Calculate Stats
-                hero_stats = {} 
-                for m in player_matches:
-                    p_rec = next((p for p in m.players if p.account_id == acc_id), None)
-                    
-                    if p_rec:
-                        hid = p_rec.hero_id
-                        if hid not in hero_stats:
-                            hero_stats[hid] = {'picks':0, 'wins':0, 'rad_picks':0, 'rad_wins':0, 'dire_picks':0, 'dire_wins':0}
-                        
-                        s = hero_stats[hid]
-                        s['picks'] += 1
-                        
-                        radiant_won = (m.is_radiant == m.win)
-                        player_won = (p_rec.team_side == 0 and radiant_won) or (p_rec.team_side == 1 and not radiant_won)
-                        
-                        if player_won: s['wins'] += 1
-                        
-                        if p_rec.team_side == 0: # Radiant
-                            s['rad_picks'] += 1
-                            if player_won: s['rad_wins'] += 1
-                        else: # Dire
-                            s['dire_picks'] += 1
-                            if player_won: s['dire_wins'] += 1
-                
-                if hero_stats:
-                    data = []
-                    for hid, s in hero_stats.items():
-                        total = s['picks']
-                        if total == 0: continue
-                        
-                        wr = s['wins']/total*100
-                        rad_wr = (s['rad_wins']/s['rad_picks']*100) if s['rad_picks'] else 0
-                        dire_wr = (s['dire_wins']/s['dire_picks']*100) if s['dire_picks'] else 0
-                        
-                        h = hm.get_hero(hid)
-                        data.append({
-                            "英雄": h.get('cn_name'),
-                            "使用率": f"{(total/len(player_matches)*100):.1f}% ({total})",
-                            "胜率": f"{wr:.1f}%",
-                            "天辉% (胜率)": f"{(s['rad_picks']/total*100):.0f}% ({rad_wr:.0f}%)",
-                            "夜魇% (胜率)": f"{(s['dire_picks']/total*100):.0f}% ({dire_wr:.0f}%)",
-                            "icon": h.get('icon_url'),
-                            "_sort_pick": total
-                        })
-                    
-                    df = pd.DataFrame(data).sort_values("_sort_pick", ascending=False)
-                    
-                    st.dataframe(
-                        df, 
-                        column_config={
-                            "icon": st.column_config.ImageColumn("头像", width="small"),
-                            "_sort_pick": None 
-                        },
-                        hide_index=True
-                    )
-                else:
-                    st.info("无数据")
-
-    # -----------------------------------------------------------------
-    # TAB 3: BP 链条 (BP Log)
-    # -----------------------------------------------------------------
+        render_player_pools(stats, selected_team, hm)
+
     with tab_bp:
-        st.subheader("最近比赛 BP 链条")
-        
-        # 1. Filter Opponent
-        opponents = list(set([m.opponent_name for m in matches]))
-        opponents.sort()
-        selected_opponents = st.multiselect("过滤对手", options=opponents)
-        
-        limit_bp = st.number_input("显示最近多少场?", 5, 50, 10)
-        
-        # Apply filter
-        bp_matches = matches
-        if selected_opponents:
-            bp_matches = [m for m in bp_matches if m.opponent_name in selected_opponents]
-            
-        bp_matches = bp_matches[:limit_bp]
-        
-        if not bp_matches:
-            st.info("无符合条件的比赛。")
-        
-        for m in bp_matches:
-            res_emoji = "✅" if m.win else "❌"
-            # Determine side for display
-            my_side_str = "天辉" if m.is_radiant else "夜魇"
-            header = f"{m.match_time.strftime('%m-%d')} | vs {m.opponent_name} ({my_side_str}) | {res_emoji}"
-            
-            with st.expander(header, expanded=True):
-                rad_name = m.team_name if m.is_radiant else m.opponent_name
-                dire_name = m.opponent_name if m.is_radiant else m.team_name
-                
-                is_radiant_first = (m.is_radiant == m.first_pick)
-                
-                # Center the visual - or standard layout
-                # User requested "side-by-side" compact view for BP chain too?
-                # "优化一下比赛列表和统计分析中BP显示的排版" -> "Stats Analysis BP Chain" also implied.
-                # So we use the new layout here too.
-                
-                render_bp_visual(m.pick_bans, rad_name, dire_name, hm, first_pick_radiant=is_radiant_first, layout="side-by-side")
+        render_bp_chain(stats, hm)
+
+    with tab_heat:
+        render_slot_heatmap(match_filter, hm)
 
-    db.close()
\ No newline at end of file
+    with tab_trend:
+        render_hero_trends(selected_team, hm)
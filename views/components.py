@@ -1,16 +1,39 @@
 import streamlit as st
-from PIL import Image, ImageDraw, ImageFont
-import requests
+from PIL import Image, ImageFont
 from io import BytesIO
+import base64
+import html
 import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+import numpy as np
+from typing import Dict, Optional, Tuple
+from services.bp_compositor import TemplateLayer, blit, scratch_canvas, text_layer
+from services.draft_record import DraftRecord
+from services.hero_assets import hero_asset_path
+from services.hero_atlas import get_hero_atlas, hero_variant
+from services.hero_manager import HeroManager
+from services.render_cache import get_render_cache, render_key
+from services.render_pool import parallel_map
+from services.static_files import publish_static
+from services.win_model import predict_radiant_win
 
 # ---------------------------------------------------------
 # CONFIGURATION: Coordinates & Sizes
 # ---------------------------------------------------------
 
+# Dark background under the template holes
+BP_BACKGROUND = (20, 23, 26, 255)
+
 # Icon Sizes
 PICK_SIZE = (183, 105)  # Width, Height
 BAN_SIZE = (112, 70)
+# Template 2 (grid)
+GRID_PICK_SIZE = (120, 70)
+GRID_BAN_SIZE = (85, 50)
+# Table / strip thumbnails
+THUMB_SIZE = (64, 36)
 
 # X Coordinates (Fixed by Side)
 RAD_BAN_X = 120
@@ -98,315 +121,675 @@ def build_coord_map(is_radiant_first):
 
 # ---------------------------------------------------------
 
+# ---------------------------------------------------------
+# Process-wide image caches
+# ---------------------------------------------------------
+
+# Decoded portraits keyed by (hero_id, size, is_ban), ready to paste.
+# 125 heroes x 4 variants fit comfortably; the bound only guards against odd sizes.
+MAX_CACHED_PORTRAITS = 1024
+
+# (size, is_ban) variants used by compose_bp_image / compose_bp_grid_image
+RENDER_VARIANTS = ((PICK_SIZE, False), (BAN_SIZE, True), (GRID_PICK_SIZE, False), (GRID_BAN_SIZE, True))
+# Pre-scaled in the memory-mapped hero atlas: the render sizes plus color / gray thumbnails
+ATLAS_VARIANTS = tuple((w, h, is_ban) for (w, h), is_ban in RENDER_VARIANTS) + (
+    (THUMB_SIZE[0], THUMB_SIZE[1], False), (THUMB_SIZE[0], THUMB_SIZE[1], True)
+)
+
+_image_lock = threading.Lock()
+_portraits: "OrderedDict[Tuple[int, Optional[Tuple[int, int]], bool], Image.Image]" = OrderedDict()
+_templates: Dict[str, Image.Image] = {}
+_template_layers: Dict[object, object] = {}   # first_pick_radiant -> TemplateLayer, "grid" -> empty grid canvas
+_fonts: Dict[Tuple[Tuple[str, ...], int], ImageFont.ImageFont] = {}
+_seen_atlas = None
+
+
+def _load_hero_source(hero_data):
+    """
+    Load the original portrait from assets/heroes. Never downloads: missing portraits
+    are fetched by services.hero_assets.sync_hero_assets (hero data update / CLI).
+    """
+    hid = hero_data.get('id')
+    local_path = hero_asset_path(hid) if hid else None
+    if not local_path or not os.path.exists(local_path):
+        return None
+    try:
+        img = Image.open(local_path)
+        img.load()
+    except Exception as e:
+        print(f"Failed to load image for hero {hid}: {e}")
+        return None
+    return img
+
+
+def _hero_atlas():
+    """
+    The shared hero atlas. When it was rebuilt (e.g. after an asset sync), portraits and
+    flattened template slots cached from the previous one are dropped.
+    """
+    global _seen_atlas
+    atlas = get_hero_atlas(ATLAS_VARIANTS)
+    if atlas is not _seen_atlas:
+        with _image_lock:
+            _portraits.clear()
+            for layer in _template_layers.values():
+                if isinstance(layer, TemplateLayer):
+                    layer.clear_cache()
+            _seen_atlas = atlas
+    return atlas
+
+
 def get_hero_image(hero_data, size=None, is_ban=False):
     """
-    Download and cache hero image.
+    Hero portrait as RGBA, resized and grayscaled for bans.
+    Results are cached process-wide by (hero_id, size, is_ban); the returned image
+    is shared, so callers must treat it as read-only (paste it, don't draw on it).
     """
     if not hero_data: return None
     
     hid = hero_data.get('id')
-    # Use img_url (Large) usually.
-    url = hero_data.get('img_url') 
-    if not url: return None
-    
-    local_path = f"assets/heroes/{hid}.png"
-    
-    if not os.path.exists("assets/heroes"):
-        os.makedirs("assets/heroes", exist_ok=True)
-        
-    img = None
-    if os.path.exists(local_path):
-        try:
-            img = Image.open(local_path)
-            img.load()
-        except:
-            pass
-            
-    if not img:
-        # Download
-        try:
-            if not url.startswith("http"):
-                url = f"https://api.opendota.com{url}"
-                
-            resp = requests.get(url, timeout=5)
-            if resp.status_code == 200:
-                img = Image.open(BytesIO(resp.content))
-                img.save(local_path)
-        except Exception as e:
-            print(f"Failed to download image for hero {hid}: {e}")
+    key = (hid, tuple(size) if size else None, bool(is_ban))
+    with _image_lock:
+        img = _portraits.get(key)
+        if img is not None:
+            _portraits.move_to_end(key)
+            return img
+
+    atlas = _hero_atlas() if key[1] else None
+    pixels = atlas.get(hid, key[1], key[2]) if atlas else None
+    if pixels is not None:
+        # Pre-scaled in the atlas: a memcpy from the mapped file, no decoding
+        img = Image.frombytes("RGBA", key[1], pixels.tobytes())
+    else:
+        if key[1:] != (None, False):
+            # Variants are derived from the cached original, so each PNG is decoded once
+            source = get_hero_image(hero_data)
+        else:
+            source = _load_hero_source(hero_data)
+        if source is None:
+            # Misses are not cached, so a portrait downloaded later is picked up
             return None
+        img = hero_variant(source, key[1], key[2])
 
-    if img:
-        if size: 
-            img = img.resize(size)
-        
-        # FIX: Ensure RGBA mode before any further processing to avoid bad transparency mask error
-        if img.mode != 'RGBA':
-            img = img.convert('RGBA')
-
-        if is_ban:
-            # Grayscale for bans
-            # Convert to L (grayscale) then back to RGBA to keep alpha but lose color
-            # Extract alpha
-            alpha = img.split()[3]
-            img = img.convert('L').convert('RGB')
-            # Put alpha back
-            img.putalpha(alpha)
-            
-        return img
-        
-    return None
+    with _image_lock:
+        _portraits[key] = img
+        while len(_portraits) > MAX_CACHED_PORTRAITS:
+            _portraits.popitem(last=False)
+    return img
+
+
+def get_bp_template(first_pick_radiant):
+    """BP template (RGBA) for the first-pick side, loaded once; None if the file is missing."""
+    template_path = "assets/bp_template_RF.png" if first_pick_radiant else "assets/bp_template_DF.png"
+    with _image_lock:
+        img = _templates.get(template_path)
+    if img is None:
+        if not os.path.exists(template_path):
+            return None
+        img = Image.open(template_path).convert("RGBA")
+        with _image_lock:
+            _templates[template_path] = img
+    return img
+
+
+def get_font(candidates, size):
+    """First loadable TrueType font among candidates at this size, cached; PIL default as a fallback."""
+    key = (tuple(candidates), size)
+    with _image_lock:
+        font = _fonts.get(key)
+    if font is None:
+        font = ImageFont.load_default()
+        for path in candidates:
+            try:
+                font = ImageFont.truetype(path, size)
+                break
+            except OSError:
+                continue
+        with _image_lock:
+            _fonts[key] = font
+    return font
+
+
+def bp_win_estimate(draft):
+    """Radiant win probability printed on the BP image, None without a model or picks."""
+    rad_picks = [a.hero_id for a in draft.actions if a.is_pick and a.team_side == 0]
+    dire_picks = [a.hero_id for a in draft.actions if a.is_pick and a.team_side == 1]
+    return predict_radiant_win(rad_picks, dire_picks) if rad_picks and dire_picks else None
+
+def _hero_pixels(atlas, hero_manager, hero_id, size, is_ban):
+    """(h, w, 4) RGBA pixels: a view into the atlas, or the PIL fallback for heroes not packed yet."""
+    pixels = atlas.get(hero_id, size, is_ban) if atlas else None
+    if pixels is None:
+        h_img = get_hero_image(hero_manager.get_hero(hero_id), size=size, is_ban=is_ban)
+        pixels = np.asarray(h_img) if h_img else None
+    return pixels
+
+def get_bp_template_layer(first_pick_radiant):
+    """Precomputed TemplateLayer (mask, premultiplied template, empty board) for the first-pick side."""
+    with _image_lock:
+        layer = _template_layers.get(first_pick_radiant)
+    if layer is None:
+        template_img = get_bp_template(first_pick_radiant)
+        if template_img is None:
+            return None
+        layer = TemplateLayer(np.asarray(template_img), BP_BACKGROUND)
+        with _image_lock:
+            _template_layers[first_pick_radiant] = layer
+    return layer
 
-def generate_bp_image(pick_bans, radiant_name, dire_name, hero_manager, first_pick_radiant=True, winner_name=None):
+def compose_bp_image(draft, radiant_name, dire_name, hero_manager, first_pick_radiant=True, winner_name=None,
+                     win_estimate=None, out=None):
     """
-    Generate the BP image using the template.
+    Composite the template BP image into an (H, W, 4) uint8 array (into `out` when given).
+    win_estimate: radiant win probability printed at the bottom (see bp_win_estimate), omitted when None.
+    None if the template is missing.
     """
     # Select Template
-    template_path = "assets/bp_template_RF.png" if first_pick_radiant else "assets/bp_template_DF.png"
-    
-    if not os.path.exists(template_path):
-        return None 
+    layer = get_bp_template_layer(first_pick_radiant)
+    if layer is None:
+        return None
+    h, w = layer.shape[:2]
 
+    # Build Coords for this specific match
+    current_coords = build_coord_map(first_pick_radiant)
+    atlas = _hero_atlas()
+
+    # Heroes go underneath the template holes
+    slots = []
+    for pb in draft.actions:
+        order = pb.order + 1 # 1-based
+        if order in current_coords:
+            x, y, width, height = current_coords[order]
+            key = (pb.hero_id, width, height, not pb.is_pick)
+            pixels = _hero_pixels(atlas, hero_manager, pb.hero_id, (width, height), not pb.is_pick)
+            if pixels is not None:
+                slots.append((x, y, key, pixels))
+    canvas = layer.compose(slots, out)
+
+    # Draw Names (On Top of Template)
     try:
-        template_img = Image.open(template_path).convert("RGBA")
-        w, h = template_img.size 
-        
-        # Create base canvas
-        base_img = Image.new("RGBA", (w, h), (20, 23, 26, 255)) # Dark background
-        
-        # Build Coords for this specific match
-        current_coords = build_coord_map(first_pick_radiant)
-        
-        # Draw Heroes (Underneath Template holes)
-        for pb in pick_bans:
-            order = pb.order + 1 # 1-based
-            
-            if order in current_coords:
-                x, y, width, height = current_coords[order]
-                
-                # Get Hero Image
-                hero = hero_manager.get_hero(pb.hero_id)
-                is_ban = not pb.is_pick
-                
-                h_img = get_hero_image(hero, size=(width, height), is_ban=is_ban)
-                
-                if h_img:
-                    # FIX: Paste with mask only if image has alpha.
-                    # h_img is guaranteed RGBA by get_hero_image fix.
-                    base_img.paste(h_img, (x, y), h_img)
+        # Try common Chinese fonts
+        font = get_font(("msyh.ttc", "simhei.ttf", "arial.ttf"), 30)
 
-        # Paste Template ON TOP
-        base_img.paste(template_img, (0, 0), template_img)
-        
-        # Draw Names (On Top of Template)
-        draw_top = ImageDraw.Draw(base_img)
-        try:
-            font_size = 30
-            try:
-                # Try common Chinese fonts
-                font_path = "arial.ttf"
-                if os.path.exists("msyh.ttc"): font_path = "msyh.ttc"
-                elif os.path.exists("simhei.ttf"): font_path = "simhei.ttf"
-                
-                font = ImageFont.truetype(font_path, font_size)
-            except:
-                font = ImageFont.load_default()
-                
-            # Approximate text positions (User didn't specify, keeping previous guess)
-            # Assuming centered on top L/R
-            
-            display_rad_name = f"👑 {radiant_name}" if radiant_name == winner_name else radiant_name
-            display_dire_name = f"👑 {dire_name}" if dire_name == winner_name else dire_name
+        display_rad_name = f"👑 {radiant_name}" if radiant_name == winner_name else radiant_name
+        display_dire_name = f"👑 {dire_name}" if dire_name == winner_name else dire_name
 
-            draw_top.text((100, 20), display_rad_name, fill=(0, 255, 0, 255), font=font)
-            draw_top.text((450, 20), display_dire_name, fill=(255, 0, 0, 255), font=font)
-        except:
-            pass
+        text_layer(display_rad_name, font).draw(canvas, (100, 20), (0, 255, 0, 255))
+        text_layer(display_dire_name, font).draw(canvas, (450, 20), (255, 0, 0, 255))
 
-        return base_img
-        
+        # Pre-game win estimate from the draft model
+        p_rad = win_estimate
+        if p_rad is not None:
+            text_layer(f"BP 胜率预测  {p_rad:.0%} : {1 - p_rad:.0%}", font, anchor="ms").draw(
+                canvas, (w // 2, h - 25), (255, 255, 255, 255)
+            )
     except Exception as e:
-        print(f"Image Gen Error: {e}")
-        return None
+        print(f"BP text error: {e}")
+
+    return canvas
 
-def generate_bp_grid_image(pick_bans, team_name_left, team_name_right, hero_manager, 
-                         left_is_radiant, left_is_first_pick, winner_is_left):
+# Template 2 layout
+GRID_GAP = 5
+GRID_PADDING = 10
+# Picks row is widest: padding + 5 * pick_w + 4 * gap + padding = 10 + 600 + 20 + 10
+GRID_COL_WIDTH = 640
+GRID_HEADER_HEIGHT = 50
+GRID_BG = (28, 36, 45, 255) # Dark Blue/Grey
+GRID_HEADER_BG = (34, 43, 54, 255)
+
+def _grid_base():
+    """Empty grid canvas (background + both header bars), built once."""
+    with _image_lock:
+        base = _template_layers.get("grid")
+    if base is None:
+        pick_row_height = GRID_PICK_SIZE[1] + 10
+        ban_row_height = GRID_BAN_SIZE[1] + 10
+        total_h = GRID_HEADER_HEIGHT + pick_row_height + ban_row_height + GRID_PADDING * 2
+        base = np.empty((total_h, GRID_COL_WIDTH * 2, 4), dtype=np.uint8)
+        base[...] = GRID_BG
+        for offset_x in (0, GRID_COL_WIDTH):
+            # Same extent as ImageDraw.rectangle (inclusive corners)
+            base[0:GRID_HEADER_HEIGHT + 1, offset_x:offset_x + GRID_COL_WIDTH - 1] = GRID_HEADER_BG
+        with _image_lock:
+            _template_layers["grid"] = base
+    return base
+
+def compose_bp_grid_image(draft, team_name_left, team_name_right, hero_manager,
+                          left_is_radiant, left_is_first_pick, winner_is_left, out=None):
     """
-    Generates a 2-column grid BP image (Template 2).
+    Composite the 2-column grid BP image (Template 2) into an (H, W, 4) uint8 array.
     Layout:
     Left Column (Team Left) | Right Column (Team Right)
     Header Info             | Header Info
     Picks (Row)             | Picks (Row)
     Bans (Row)              | Bans (Row)
     """
-    # Canvas Settings
-    # Adjusted for landscape hero icons (approx 1.7 ratio)
-    # Pick: 120x70, Ban: 85x50
-    pick_w, pick_h = 120, 70
-    ban_w, ban_h = 85, 50
-    gap = 5
-    padding = 10
-    
-    # Calculate Column Width required
-    # Picks row is widest: 5 items
-    # Width = padding + (5 * pick_w) + (4 * gap) + padding
-    #       = 10 + 600 + 20 + 10 = 640
-    col_width = 640
-    
-    header_height = 50
-    pick_row_height = pick_h + 10 # 80
-    ban_row_height = ban_h + 10 # 60
-    
-    total_w = col_width * 2
-    total_h = header_height + pick_row_height + ban_row_height + padding * 2
-    
-    bg_color = (28, 36, 45, 255) # Dark Blue/Grey
-    
-    img = Image.new("RGBA", (total_w, total_h), bg_color)
-    draw = ImageDraw.Draw(img)
-    
-    # Load Fonts
-    try:
-        font_header = ImageFont.truetype("msyh.ttc", 24)
-        font_num = ImageFont.truetype("arial.ttf", 16)
-    except:
-        try:
-            font_header = ImageFont.truetype("simhei.ttf", 24)
-            font_num = ImageFont.truetype("arial.ttf", 16)
-        except:
-            font_header = ImageFont.load_default()
-            font_num = ImageFont.load_default()
-
-    # --- Process Data into Left/Right Arrays ---
-    # Left Team
-    left_picks = []
-    left_bans = []
-    # Right Team
-    right_picks = []
-    right_bans = []
-    
-    sorted_pbs = sorted(pick_bans, key=lambda x: x.order)
-    
-    for pb in sorted_pbs:
-        h_data = hero_manager.get_hero(pb.hero_id)
-        item = {'hero': h_data, 'order': pb.order + 1}
-        
-        is_radiant_side = (pb.team_side == 0)
-        is_left_side = (is_radiant_side == left_is_radiant)
-        
-        if is_left_side:
-            if pb.is_pick: left_picks.append(item)
-            else: left_bans.append(item)
-        else:
-            if pb.is_pick: right_picks.append(item)
-            else: right_bans.append(item)
-            
-    # --- Draw Helper ---
-    def draw_team_section(offset_x, team_name, is_radiant, is_first_pick, is_winner, picks, bans):
+    base = _grid_base()
+    canvas = out if out is not None else np.empty_like(base)
+    np.copyto(canvas, base)
+
+    pick_w, pick_h = GRID_PICK_SIZE
+    ban_w, ban_h = GRID_BAN_SIZE
+    atlas = _hero_atlas()
+
+    font_header = get_font(("msyh.ttc", "simhei.ttf"), 24)
+    font_num = get_font(("arial.ttf",), 16)
+
+    left_side = 0 if left_is_radiant else 1
+
+    def draw_team_section(offset_x, side, team_name, is_radiant, is_first_pick, is_winner):
         # 1. Header
-        # Draw background for header?
-        header_bg = (34, 43, 54, 255)
-        draw.rectangle([offset_x, 0, offset_x + col_width - 2, header_height], fill=header_bg)
-        
-        # Logo/Team Name
         side_str = "Radiant" if is_radiant else "Dire"
-        side_color = (0, 255, 0) if is_radiant else (255, 100, 100)
-        
         pick_str = "1st Pick" if is_first_pick else "2nd Pick"
         win_str = "(胜)" if is_winner else ""
-        
         full_text = f"{team_name} | {side_str} | {pick_str} {win_str}"
-        draw.text((offset_x + 10, 10), full_text, fill=(255, 255, 255), font=font_header)
-        
-        # 2. Picks Row
-        # 5 items
-        start_y = header_height + padding
-        
-        for i, p in enumerate(picks):
-            if i >= 5: break
-            h_img = get_hero_image(p['hero'], size=(pick_w, pick_h), is_ban=False)
-            pos_x = offset_x + 10 + i * (pick_w + gap)
-            pos_y = start_y
-            
-            if h_img:
-                img.paste(h_img, (pos_x, pos_y))
-                
-            # Draw Order Number
-            draw.text((pos_x + 2, pos_y + 2), str(p['order']), fill=(0, 255, 0), font=font_num) # Green for picks
+        text_layer(full_text, font_header).draw(canvas, (offset_x + 10, 10), (255, 255, 255, 255))
 
-        # 3. Bans Row
-        # 7 items
-        start_y_ban = start_y + pick_h + padding
-        
-        for i, b in enumerate(bans):
-            if i >= 7: break
-            h_img = get_hero_image(b['hero'], size=(ban_w, ban_h), is_ban=True)
-            pos_x = offset_x + 10 + i * (ban_w + gap)
-            pos_y = start_y_ban
-            
-            if h_img:
-                img.paste(h_img, (pos_x, pos_y))
-                
-            # Draw Order Number
-            draw.text((pos_x + 2, pos_y + 2), str(b['order']), fill=(255, 50, 50), font=font_num) # Red for bans
+        # 2. Picks Row (5 items), 3. Bans Row (7 items)
+        start_y = GRID_HEADER_HEIGHT + GRID_PADDING
+        rows = (
+            (draft.side_actions(side, True), 5, GRID_PICK_SIZE, False, start_y, (0, 255, 0, 255)), # Green for picks
+            (draft.side_actions(side, False), 7, GRID_BAN_SIZE, True, start_y + pick_h + GRID_PADDING, (255, 50, 50, 255)) # Red for bans
+        )
+        for actions, limit, size, is_ban, pos_y, num_color in rows:
+            for i, a in enumerate(actions[:limit]):
+                pos_x = offset_x + 10 + i * (size[0] + GRID_GAP)
+                pixels = _hero_pixels(atlas, hero_manager, a.hero_id, size, is_ban)
+                if pixels is not None:
+                    blit(canvas, pos_x, pos_y, pixels)
+                # Draw Order Number
+                text_layer(str(a.order + 1), font_num).draw(canvas, (pos_x + 2, pos_y + 2), num_color)
 
     # Draw Left
-    draw_team_section(0, team_name_left, left_is_radiant, left_is_first_pick, winner_is_left, left_picks, left_bans)
-    
+    draw_team_section(0, left_side, team_name_left, left_is_radiant, left_is_first_pick, winner_is_left)
+
     # Draw Right
-    draw_team_section(col_width, team_name_right, not left_is_radiant, not left_is_first_pick, not winner_is_left, right_picks, right_bans)
-    
-    return img
+    draw_team_section(GRID_COL_WIDTH, 1 - left_side, team_name_right, not left_is_radiant, not left_is_first_pick, not winner_is_left)
+
+    return canvas
+
+# ---------------------------------------------------------
+# Encoded image cache (content-addressed)
+# ---------------------------------------------------------
+
+# Bump when the look of either renderer changes so stale cached images are not reused
+RENDER_VERSION = 2
+
+def _flatten_on_white(img):
+    """RGB as the image looks over a white worksheet cell (template edges are semi-transparent)."""
+    if img.mode != "RGBA":
+        return img.convert("RGB")
+    return Image.alpha_composite(Image.new("RGBA", img.size, (255, 255, 255, 255)), img).convert("RGB")
+
+def encode_image(img, width=None, fmt="PNG"):
+    """
+    PIL image -> encoded bytes, optionally resized to `width` keeping the aspect ratio.
+    fmt: "PNG", "WEBP", "PNG8" (256-colour palette PNG) or "JPEG"; the last two are
+    flattened onto white and are what Excel exports embed (openpyxl passes PNG / JPEG through).
+    """
+    if width and img.width != width:
+        img = img.resize((width, int(width * img.height / img.width)))
+    out = BytesIO()
+    if fmt == "WEBP":
+        img.save(out, format="WEBP", quality=90, method=4)
+    elif fmt == "PNG8":
+        # Flat UI colours plus small portraits: ~4x smaller than full colour, and faster to encode
+        _flatten_on_white(img).quantize(256, method=Image.Quantize.FASTOCTREE).save(out, format="PNG")
+    elif fmt == "JPEG":
+        _flatten_on_white(img).save(out, format="JPEG", quality=80, optimize=True)
+    else:
+        img.save(out, format=fmt)
+    return out.getvalue()
+
+# ---------------------------------------------------------
+# Excel export images
+# ---------------------------------------------------------
+
+@dataclass(frozen=True)
+class ExportImagePreset:
+    label: str
+    scale: float    # embedded pixels per displayed pixel
+    fmt: str
+
+EXPORT_IMAGE_PRESETS = {
+    "standard": ExportImagePreset("标准 (256 色 PNG)", 1.0, "PNG8"),
+    "hd": ExportImagePreset("高清 (2x 全彩 PNG)", 2.0, "PNG"),
+    "small": ExportImagePreset("最小体积 (JPEG)", 1.0, "JPEG"),
+}
+DEFAULT_EXPORT_PRESET = "standard"
+
+def excel_column_pixels(column_width):
+    """Pixel width of an Excel column of `column_width` characters (Calibri 11, 7px max digit width)."""
+    return int(((256 * column_width + int(128 / 7)) / 256) * 7)
 
-def render_bp_visual(pick_bans, radiant_name, dire_name, hero_manager, first_pick_radiant=True, layout="default", winner_name=None):
+def export_image_width(column_width, max_width, preset):
+    """
+    (displayed width, rendered width) for an image placed in a column of `column_width`:
+    shown at the cell width (at most max_width) and rendered at preset.scale times that.
+    """
+    display_width = min(excel_column_pixels(column_width), max_width)
+    return display_width, int(round(display_width * preset.scale))
+
+def fit_excel_image(xl_img, display_width):
+    """Show an openpyxl image at display_width (keeping the aspect ratio), whatever its pixel size."""
+    xl_img.height = int(round(xl_img.height * display_width / xl_img.width))
+    xl_img.width = display_width
+    return xl_img
+
+def _draft_signature(draft):
+    """
+    Ordered picks/bans, heroes whose portrait is not on disk yet (so they re-render once fetched)
+    and the atlas version (so replaced portraits are not served from stale images).
+    """
+    actions = [(a.order, a.hero_id, bool(a.is_pick), a.team_side) for a in draft.actions]
+    missing = sorted({a.hero_id for a in draft.actions if not os.path.exists(hero_asset_path(a.hero_id))})
+    atlas = _hero_atlas()
+    return actions, missing, atlas.version if atlas else None
+
+@dataclass(frozen=True)
+class BpImageJob:
+    """One template BP image to render and encode (picklable, for the render pool)."""
+    draft: DraftRecord
+    radiant_name: str
+    dire_name: str
+    first_pick_radiant: bool = True
+    winner_name: Optional[str] = None
+    win_estimate: Optional[float] = None   # rounded radiant win probability, part of the cache key
+    width: Optional[int] = None
+    fmt: str = "PNG"
+
+    def key(self):
+        return render_key(
+            "bp", RENDER_VERSION, _draft_signature(self.draft), self.radiant_name, self.dire_name,
+            bool(self.first_pick_radiant), self.winner_name, self.win_estimate, self.width, self.fmt
+        )
+
+    def render(self, hero_manager):
+        # Composite into this thread's reusable canvas and encode straight away
+        layer = get_bp_template_layer(self.first_pick_radiant)
+        if layer is None:
+            return None
+        canvas = compose_bp_image(
+            self.draft, self.radiant_name, self.dire_name, hero_manager, self.first_pick_radiant, self.winner_name,
+            win_estimate=self.win_estimate, out=scratch_canvas(layer.shape)
+        )
+        return encode_image(Image.fromarray(canvas), self.width, self.fmt)
+
+@dataclass(frozen=True)
+class BpGridImageJob:
+    """One grid (Template 2) BP image to render and encode."""
+    draft: DraftRecord
+    team_name_left: str
+    team_name_right: str
+    left_is_radiant: bool
+    left_is_first_pick: bool
+    winner_is_left: bool
+    width: Optional[int] = None
+    fmt: str = "PNG"
+
+    def key(self):
+        return render_key(
+            "grid", RENDER_VERSION, _draft_signature(self.draft), self.team_name_left, self.team_name_right,
+            bool(self.left_is_radiant), bool(self.left_is_first_pick), bool(self.winner_is_left), self.width, self.fmt
+        )
+
+    def render(self, hero_manager):
+        canvas = compose_bp_grid_image(
+            self.draft, self.team_name_left, self.team_name_right, hero_manager,
+            self.left_is_radiant, self.left_is_first_pick, self.winner_is_left,
+            out=scratch_canvas(_grid_base().shape)
+        )
+        return encode_image(Image.fromarray(canvas), self.width, self.fmt)
+
+def bp_image_job(draft, radiant_name, dire_name, first_pick_radiant=True, winner_name=None, width=None, fmt="PNG"):
+    """BpImageJob with the win estimate filled in (computed here, so pool workers never load the model)."""
+    p_rad = bp_win_estimate(draft)
+    return BpImageJob(
+        draft, radiant_name, dire_name, bool(first_pick_radiant), winner_name,
+        None if p_rad is None else round(p_rad, 2), width, fmt
+    )
+
+# --- Render pool workers ---
+_worker_hero_manager = None
+
+def _init_render_worker():
+    """Runs once per pool worker: load hero data and map / precompute every render asset."""
+    global _worker_hero_manager
+    _worker_hero_manager = HeroManager()
+    _hero_atlas()
+    get_bp_template_layer(True)
+    get_bp_template_layer(False)
+    _grid_base()
+    get_font(("msyh.ttc", "simhei.ttf", "arial.ttf"), 30)
+    get_font(("msyh.ttc", "simhei.ttf"), 24)
+    get_font(("arial.ttf",), 16)
+
+def _render_job(job):
+    try:
+        return job.render(_worker_hero_manager)
+    except Exception as e:
+        print(f"Image Gen Error: {e}")
+        return None
+
+def render_images(jobs, hero_manager):
+    """
+    Encoded bytes for each job, in order (None where rendering failed).
+    Cached images are returned directly; the rest are rendered in the process pool
+    when there are enough of them (see services.render_pool), otherwise in this process.
+    """
+    cache = get_render_cache()
+    keys = [job.key() for job in jobs]
+    results = [cache.get(key, job.fmt.lower()) for key, job in zip(keys, jobs)]
+    missing = [i for i, data in enumerate(results) if data is None]
+    if not missing:
+        return results
+
+    rendered = parallel_map(_render_job, [jobs[i] for i in missing], initializer=_init_render_worker)
+    if rendered is None:
+        rendered = []
+        for i in missing:
+            try:
+                rendered.append(jobs[i].render(hero_manager))
+            except Exception as e:
+                print(f"Image Gen Error: {e}")
+                rendered.append(None)
+    for i, data in zip(missing, rendered):
+        if data is not None:
+            cache.put(keys[i], jobs[i].fmt.lower(), data)
+        results[i] = data
+    return results
+
+# ---------------------------------------------------------
+# Static image URLs
+# ---------------------------------------------------------
+
+MAX_CACHED_THUMBNAILS = 2048
+_thumbnails: "OrderedDict[str, bytes]" = OrderedDict()
+_icon_uris: Dict[str, Optional[str]] = {}
+
+def static_serving_enabled():
+    """True when Streamlit serves ./static (server.enableStaticServing), so images can be referenced by URL."""
+    try:
+        return bool(st.get_option("server.enableStaticServing"))
+    except Exception:
+        return False
+
+def _thumbnail_name(hero_id, size, is_ban):
+    atlas = _hero_atlas()
+    # The atlas version changes whenever a portrait is replaced, so the name changes with it
+    return f"heroes/{hero_id}_{size[0]}x{size[1]}{'_ban' if is_ban else ''}_{atlas.version if atlas else 0}.webp"
+
+def _encoded_webp(name, load):
+    """WebP bytes of load() (a PIL image or None), cached by name."""
+    with _image_lock:
+        data = _thumbnails.get(name)
+        if data is not None:
+            _thumbnails.move_to_end(name)
+            return data
+    img = load()
+    if img is None:
+        return None
+    data = encode_image(img, fmt="WEBP")
+    with _image_lock:
+        _thumbnails[name] = data
+        while len(_thumbnails) > MAX_CACHED_THUMBNAILS:
+            _thumbnails.popitem(last=False)
+    return data
+
+def hero_thumbnail_src(hero_data, size=THUMB_SIZE, is_ban=False):
+    """
+    Locally generated hero thumbnail for st.image: a static URL (bytes without static serving).
+    None when the portrait is not on disk.
+    """
+    hid = hero_data.get('id') if hero_data else None
+    if not hid:
+        return None
+    name = _thumbnail_name(hid, size, is_ban)
+    render = lambda: _encoded_webp(name, lambda: get_hero_image(hero_data, size=size, is_ban=is_ban))
+    if not static_serving_enabled():
+        return render()
+    url = publish_static(name, render)
+    # st.image only takes /app/static/... as a URL, and prefixes it with the server base path itself
+    return f"/{url}" if url else None
+
+def hero_icon_uri(hero_data, size=THUMB_SIZE, is_ban=False):
+    """
+    Thumbnail as a data: URI for st.column_config.ImageColumn cells (~2 KB each, works offline).
+    None when the portrait is not on disk.
+    """
+    hid = hero_data.get('id') if hero_data else None
+    if not hid:
+        return None
+    name = _thumbnail_name(hid, size, is_ban)
+    return _data_uri(name, lambda: get_hero_image(hero_data, size=size, is_ban=is_ban))
+
+def _data_uri(name, load):
+    with _image_lock:
+        if name in _icon_uris:
+            return _icon_uris[name]
+    data = _encoded_webp(name, load)
+    uri = f"data:image/webp;base64,{base64.b64encode(data).decode('ascii')}" if data else None
+    if uri is not None:
+        with _image_lock:
+            _icon_uris[name] = uri
+    return uri
+
+# ---------------------------------------------------------
+# SVG BP renderer (interactive pages)
+# ---------------------------------------------------------
+# Same layout as compose_bp_image (the Excel export image), but the page only receives a
+# few KB of markup: portraits and the template are separate, browser-cached images.
+
+SVG_FONT_FAMILY = "'Microsoft YaHei', SimHei, Arial, sans-serif"
+
+def _image_href(name, load):
+    """Relative app/static URL when static serving is on (cached by the browser), else an inline data: URI."""
+    if static_serving_enabled():
+        return publish_static(name, lambda: _encoded_webp(name, load))
+    return _data_uri(name, load)
+
+def _hero_href(hero_manager, hero_id, size, is_ban):
+    hero_data = hero_manager.get_hero(hero_id)
+    return _image_href(_thumbnail_name(hero_id, size, is_ban), lambda: get_hero_image(hero_data, size=size, is_ban=is_ban))
+
+def _template_href(first_pick_radiant):
+    template_path = "assets/bp_template_RF.png" if first_pick_radiant else "assets/bp_template_DF.png"
+    try:
+        mtime = os.stat(template_path).st_mtime_ns
+    except OSError:
+        return None
+    name = f"bp/{os.path.splitext(os.path.basename(template_path))[0]}_{mtime}.webp"
+    return _image_href(name, lambda: get_bp_template(first_pick_radiant))
+
+def _svg_color(color):
+    return f"rgb({color[0]},{color[1]},{color[2]})"
+
+def _svg_image(href, x, y, size):
+    return f'<image href="{href}" x="{x}" y="{y}" width="{size[0]}" height="{size[1]}" preserveAspectRatio="none"/>'
+
+def _svg_text(text, x, y, size, color, anchor="start", baseline="text-before-edge"):
+    # PIL draws from the top-left by default ("la"), hence the text-before-edge baseline
+    return (f'<text x="{x}" y="{y}" font-size="{size}" fill="{_svg_color(color)}" text-anchor="{anchor}" '
+            f'dominant-baseline="{baseline}">{html.escape(str(text))}</text>')
+
+def _svg_document(width, height, body, display_width=None):
+    size_attr = f' width="{display_width}"' if display_width else ""
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {width} {height}"{size_attr} '
+            f'style="max-width:100%;height:auto;font-family:{SVG_FONT_FAMILY}">{"".join(body)}</svg>')
+
+def bp_svg(draft, radiant_name, dire_name, hero_manager, first_pick_radiant=True, winner_name=None, display_width=None):
+    """
+    compose_bp_image as SVG markup (show with st.markdown(..., unsafe_allow_html=True)).
+    None if the template is missing.
+    """
+    template_img = get_bp_template(first_pick_radiant)
+    template_href = _template_href(first_pick_radiant)
+    if template_img is None or template_href is None:
+        return None
+    w, h = template_img.size
+
+    current_coords = build_coord_map(first_pick_radiant)
+    body = [f'<rect width="{w}" height="{h}" fill="{_svg_color(BP_BACKGROUND)}"/>']
+    # Heroes go underneath the template holes
+    for pb in draft.actions:
+        order = pb.order + 1 # 1-based
+        if order in current_coords:
+            x, y, width, height = current_coords[order]
+            href = _hero_href(hero_manager, pb.hero_id, (width, height), not pb.is_pick)
+            if href:
+                body.append(_svg_image(href, x, y, (width, height)))
+    body.append(_svg_image(template_href, 0, 0, (w, h)))
+
+    display_rad_name = f"👑 {radiant_name}" if radiant_name == winner_name else radiant_name
+    display_dire_name = f"👑 {dire_name}" if dire_name == winner_name else dire_name
+    body.append(_svg_text(display_rad_name, 100, 20, 30, (0, 255, 0)))
+    body.append(_svg_text(display_dire_name, 450, 20, 30, (255, 0, 0)))
+
+    p_rad = bp_win_estimate(draft)
+    if p_rad is not None:
+        body.append(_svg_text(f"BP 胜率预测  {p_rad:.0%} : {1 - p_rad:.0%}", w // 2, h - 25, 30, (255, 255, 255),
+                              anchor="middle", baseline="alphabetic"))
+    return _svg_document(w, h, body, display_width)
+
+def render_bp_visual(draft, radiant_name, dire_name, hero_manager, first_pick_radiant=True, layout="default", winner_name=None):
     """
     Main entry point for UI.
     layout: "default" (top-down) or "side-by-side" (image left, html right)
     """
-    img = generate_bp_image(pick_bans, radiant_name, dire_name, hero_manager, first_pick_radiant, winner_name)
-    
+    def show_svg(display_width):
+        # Vector markup; raster images (compose_bp_image) are only produced for Excel export
+        svg = bp_svg(draft, radiant_name, dire_name, hero_manager, first_pick_radiant, winner_name, display_width)
+        if svg:
+            st.markdown(svg, unsafe_allow_html=True)
+        return svg is not None
+
     if layout == "side-by-side":
         # Requested: Image scaled to 66% and side-by-side with HTML
         c1, c2 = st.columns([1, 2]) # Image takes 1/3, HTML takes 2/3
         with c1:
-            if img:
-                st.image(img, width=250) 
-            else:
+            if not show_svg(250):
                 st.write("Image N/A")
                 
         with c2:
-            render_html_strip(pick_bans, radiant_name, dire_name, hero_manager)
+            render_html_strip(draft, radiant_name, dire_name, hero_manager)
             
     else:
         # Default top-down behavior
-        if img:
-            st.image(img, width=400) 
+        show_svg(400)
         
-        render_html_strip(pick_bans, radiant_name, dire_name, hero_manager)
+        render_html_strip(draft, radiant_name, dire_name, hero_manager)
 
-def render_html_strip(pick_bans, radiant_name, dire_name, hero_manager):
+def render_html_strip(draft, radiant_name, dire_name, hero_manager):
     """
     Legacy HTML/Streamlit Component rendering
     """
-    rad_picks = []
-    rad_bans = []
-    dire_picks = []
-    dire_bans = []
-    
-    sorted_pbs = sorted(pick_bans, key=lambda x: x.order)
+    def to_items(actions):
+        return [{'hero': hero_manager.get_hero(a.hero_id), 'order': a.order + 1, 'is_pick': a.is_pick} for a in actions]
     
-    for pb in sorted_pbs:
-        item = {
-            'hero': hero_manager.get_hero(pb.hero_id),
-            'order': pb.order + 1,
-            'is_pick': pb.is_pick
-        }
-        if pb.team_side == 0: # Radiant
-            if pb.is_pick: rad_picks.append(item)
-            else: rad_bans.append(item)
-        else: # Dire
-            if pb.is_pick: dire_picks.append(item)
-            else: dire_bans.append(item)
+    rad_picks = to_items(draft.side_actions(0, True))
+    rad_bans = to_items(draft.side_actions(0, False))
+    dire_picks = to_items(draft.side_actions(1, True))
+    dire_bans = to_items(draft.side_actions(1, False))
 
     def render_row(label, items, is_ban=False):
         st.caption(label)
@@ -415,8 +798,12 @@ def render_html_strip(pick_bans, radiant_name, dire_name, hero_manager):
             if i < 12:
                 with cols[i]:
                     h = item['hero']
-                    url = h.get('img_url') or h.get('icon_url')
-                    st.image(url, width="stretch")
+                    src = hero_thumbnail_src(h, GRID_BAN_SIZE if is_ban else GRID_PICK_SIZE, is_ban)
+                    if src:
+                        st.image(src, width="stretch")
+                    else:
+                        # Portrait not synced yet: name only, no remote fallback
+                        st.caption(h.get('cn_name') or h.get('en_name'))
                     st.markdown(f"<div style='text-align:center; font-size:10px;'>#{item['order']}</div>", unsafe_allow_html=True)
     
     render_row(f"🟢 {radiant_name} Picks", rad_picks)
@@ -0,0 +1,241 @@
+import time
+import streamlit as st
+import pandas as pd
+from database import get_db
+from models import Match
+from services.hero_manager import HeroManager
+from services.patch_manager import PatchManager
+from services.match_events import get_data_version
+from services.hero_matrix import get_hero_matrix
+from services.draft_trie import get_draft_tries
+from services.draft_record import CM_NUM_ORDERS, cm_turn
+from services.draft_assistant import build_draft_context, recommend
+from services.win_model import get_win_model
+from views.components import hero_icon_uri
+
+# st.session_state keys
+CTX_KEY = "draft_ctx"
+CTX_ID_KEY = "draft_ctx_id"
+ACTIONS_KEY = "draft_actions"   # [(is_mine, is_pick, hero_id)] in draft order
+HERO_KEY = "draft_hero"
+FIRST_PICK_KEY = "draft_my_first_pick"
+
+
+def _confirm_action(is_mine, is_pick):
+    hero_id = st.session_state.get(HERO_KEY)
+    if hero_id is not None:
+        st.session_state[ACTIONS_KEY].append((is_mine, is_pick, hero_id))
+        st.session_state[HERO_KEY] = None
+
+
+def _undo_action():
+    if st.session_state[ACTIONS_KEY]:
+        st.session_state[ACTIONS_KEY].pop()
+
+
+def _reset_actions():
+    st.session_state[ACTIONS_KEY] = []
+
+
+def _reassign_sides():
+    """切换先 / 后选后，已录入的动作按 CM 顺序重新归属我方 / 对手"""
+    my_first_pick = st.session_state[FIRST_PICK_KEY]
+    st.session_state[ACTIONS_KEY] = [
+        (cm_turn(i + 1)[0] == my_first_pick, is_pick, hid)
+        for i, (_, is_pick, hid) in enumerate(st.session_state.get(ACTIONS_KEY, []))
+    ]
+
+
+def hero_label(hm, hid):
+    h = hm.get_hero(hid)
+    return h.get('cn_name') or h.get('en_name') or str(hid)
+
+
+def render_draft_summary(actions, hm):
+    """当前 BP 进度: 我方 / 对手 的 Pick 与 Ban"""
+    c_mine, c_opp = st.columns(2)
+    for col, is_mine, title in ((c_mine, True, "我方"), (c_opp, False, "对手")):
+        picks = [hero_label(hm, hid) for mine, is_pick, hid in actions if mine == is_mine and is_pick]
+        bans = [hero_label(hm, hid) for mine, is_pick, hid in actions if mine == is_mine and not is_pick]
+        col.markdown(f"**{title} Pick:** {' / '.join(picks) or '-'}")
+        col.markdown(f"**{title} Ban:** {' / '.join(bans) or '-'}")
+
+
+@st.fragment
+def render_draft_board(ctx, my_first_pick, my_radiant, hm):
+    """
+    BP 录入与推荐。每一手只重跑这个 fragment，推荐只做预计算结构上的向量运算。
+    my_radiant 为 None 时胜率预测取天辉 / 夜魇两种阵营的平均。
+    """
+    actions = st.session_state.setdefault(ACTIONS_KEY, [])
+    render_draft_summary(actions, hm)
+    st.divider()
+
+    order = len(actions) + 1
+    if order > CM_NUM_ORDERS:
+        st.success("BP 已完成。")
+        st.button("重新开始", on_click=_reset_actions)
+        return
+
+    fp_acts, is_pick = cm_turn(order)
+    is_mine = fp_acts == my_first_pick
+    actor = "我方" if is_mine else "对手"
+    st.subheader(f"第 {order} 手: {actor} {'Pick' if is_pick else 'Ban'}")
+
+    used = {hid for _, _, hid in actions}
+    hero_opts = sorted(
+        (hid for hid in hm.heroes if hid not in used),
+        key=lambda hid: hm.get_hero(hid).get('en_name') or ""
+    )
+
+    c_sel, c_ok, c_undo, c_reset = st.columns([3, 1, 1, 1])
+    sel_hero = c_sel.selectbox(
+        "英雄",
+        options=hero_opts,
+        index=None,
+        format_func=lambda hid: f"{hm.get_hero(hid).get('cn_name')} ({hm.get_hero(hid).get('en_name')})",
+        key=HERO_KEY,
+        label_visibility="collapsed",
+        placeholder="选择英雄..."
+    )
+    c_ok.button("确认", type="primary", disabled=sel_hero is None, on_click=_confirm_action, args=(is_mine, is_pick))
+    c_undo.button("撤销", disabled=not actions, on_click=_undo_action)
+    c_reset.button("重置", disabled=not actions, on_click=_reset_actions)
+
+    t0 = time.perf_counter()
+    my_picks = [hid for mine, p, hid in actions if mine and p]
+    opp_picks = [hid for mine, p, hid in actions if not mine and p]
+
+    # Opponent tendency: their prefix is our prefix with sides flipped
+    opp_prefix = [(not mine, p, hid) for mine, p, hid in actions]
+    prediction = get_draft_tries().predict(ctx.opp.team_name, not my_first_pick, opp_prefix, ctx.patches or None)
+
+    rec = recommend(ctx, my_picks, opp_picks, used, is_pick if is_mine else True)
+
+    # Draft model: current win estimate and our win rate after each candidate pick
+    model = get_win_model().model
+    win_now = model.predict_for(my_picks, opp_picks, my_radiant) if model else None
+    pick_win = None
+    if model and len(my_picks) < 5:
+        if my_radiant is None:
+            pick_win = 0.5 * (model.pick_deltas(my_picks, opp_picks, True) + model.pick_deltas(my_picks, opp_picks, False))
+        else:
+            pick_win = model.pick_deltas(my_picks, opp_picks, my_radiant)
+    elapsed_ms = (time.perf_counter() - t0) * 1000
+
+    if win_now is not None:
+        st.metric("BP 胜率预测 (我方)", f"{win_now:.1%}")
+
+    c_rec, c_pred = st.columns([3, 2])
+
+    with c_rec:
+        st.markdown(f"**推荐{'选取' if (is_pick or not is_mine) else '禁用'}**" + ("" if is_mine else " (我方下一手 Pick 参考)"))
+        rows = []
+        for hid in rec.hero_ids:
+            h = hm.get_hero(hid)
+            mine_picks = int(ctx.mine.picks[hid])
+            opp_picks_n = int(ctx.opp.picks[hid])
+            rows.append({
+                "icon": hero_icon_uri(h),
+                "英雄": h.get('cn_name'),
+                "综合": round(float(rec.score[hid]), 3),
+                "搭档": f"{rec.partner[hid] * 100:+.1f}",
+                "克制": f"{rec.counter[hid] * 100:+.1f}",
+                "威胁": f"{rec.threat[hid] * 100:+.1f}",
+                "选后胜率": f"{pick_win[hid]:.1%}" if pick_win is not None else "-",
+                "我方选取": f"{mine_picks} ({ctx.mine.pick_wins[hid] / mine_picks:.0%})" if mine_picks else "-",
+                "我方禁用": int(ctx.mine.bans[hid]),
+                "对手选取": f"{opp_picks_n} ({ctx.opp.pick_wins[hid] / opp_picks_n:.0%})" if opp_picks_n else "-",
+                "对手禁用": int(ctx.opp.bans[hid]),
+                "我方熟练": f"{ctx.mine.comfort_player[hid]} {int(ctx.mine.comfort[hid])}" if hid in ctx.mine.comfort_player else "-",
+                "对手熟练": f"{ctx.opp.comfort_player[hid]} {int(ctx.opp.comfort[hid])}" if hid in ctx.opp.comfort_player else "-"
+            })
+        if rows:
+            st.dataframe(
+                pd.DataFrame(rows),
+                column_config={"icon": st.column_config.ImageColumn("头像", width="small")},
+                hide_index=True,
+                width="stretch"
+            )
+        else:
+            st.caption("无可选英雄")
+
+    with c_pred:
+        st.markdown(f"**{ctx.opp.team_name} 历史上的下一手**")
+        source = f"完全匹配当前顺序 ({prediction.games} 场)" if prediction.exact else f"按顺位统计 ({prediction.games} 场，当前顺序匹配到第 {prediction.matched_depth} 手)"
+        st.caption(source)
+        if prediction.actions:
+            st.dataframe(
+                pd.DataFrame([
+                    {
+                        "动作": "Pick" if a.is_pick else "Ban",
+                        "英雄": hero_label(hm, a.hero_id),
+                        "次数": a.count,
+                        "占比": f"{a.share:.0%}",
+                        "胜率": f"{a.win_rate:.0%}"
+                    }
+                    for a in prediction.actions
+                ]),
+                hide_index=True,
+                width="stretch"
+            )
+        else:
+            st.caption("无历史数据")
+
+    st.caption(f"推荐计算耗时 {elapsed_ms:.1f} ms")
+
+
+def show():
+    st.title("实时 BP 助手")
+
+    db = next(get_db())
+    hm = HeroManager()
+    pm = PatchManager()
+
+    team_rows = db.query(Match.team_name).distinct().all() + db.query(Match.opponent_name).distinct().all()
+    teams = sorted({r[0] for r in team_rows if r[0]})
+    if not teams:
+        st.info("暂无比赛数据。")
+        return
+
+    c1, c2, c3, c4, c5 = st.columns(5)
+    my_team = c1.selectbox("我方战队", options=teams)
+    opp_team = c2.selectbox("对手战队", options=[t for t in teams if t != my_team])
+    selected_patch = c3.selectbox("起始版本", options=pm.get_all_patches())
+    my_first_pick = c4.radio(
+        "我方", options=[True, False], format_func=lambda x: "先选" if x else "后选", horizontal=True,
+        key=FIRST_PICK_KEY, on_change=_reassign_sides
+    )
+    my_radiant = c5.radio("我方阵营", options=[None, True, False], format_func=lambda x: {None: "未知", True: "天辉", False: "夜魇"}[x], horizontal=True)
+
+    if not opp_team:
+        st.info("请选择对手。")
+        return
+
+    start_date = pm.get_patch_date(selected_patch) if selected_patch else None
+    start_str = start_date.strftime("%Y-%m-%d") if start_date else ""
+    timeline = pm.get_patch_timeline()
+    patches = [name for start, name in timeline if start >= start_str]
+
+    # Precompute once per (teams, patch, data version); every draft action reuses it
+    ctx_id = (my_team, opp_team, selected_patch, get_data_version())
+    if st.session_state.get(CTX_ID_KEY) != ctx_id:
+        with st.spinner("正在加载历史数据..."):
+            get_hero_matrix()
+            get_draft_tries()
+            get_win_model()
+            prev_id = st.session_state.get(CTX_ID_KEY)
+            st.session_state[CTX_KEY] = build_draft_context(db, my_team, opp_team, start_date, patches, hm.heroes.keys())
+            st.session_state[CTX_ID_KEY] = ctx_id
+            # New matches arriving mid-draft refresh the numbers but keep the draft
+            if not prev_id or prev_id[:3] != ctx_id[:3]:
+                st.session_state[ACTIONS_KEY] = []
+    ctx = st.session_state[CTX_KEY]
+
+    st.caption(f"{my_team}: {ctx.mine.games} 场 | {opp_team}: {ctx.opp.games} 场 | 全库矩阵版本: {', '.join(patches) or '全部'}")
+
+    win_metrics = get_win_model().metrics
+    if win_metrics.get("accuracy") is not None:
+        st.caption(f"胜率模型: {win_metrics['games']} 场训练，最近 {win_metrics['holdout_games']} 场验证准确率 {win_metrics['accuracy']:.1%}")
+
+    render_draft_board(ctx, my_first_pick, my_radiant, hm)
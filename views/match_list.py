@@ -3,14 +3,75 @@ import pandas as pd
 from database import get_db
 from models import Match, PickBan, PlayerPerformance, League, Player, Team, PlayerAlias
 from services.hero_manager import HeroManager
-from views.components import render_bp_visual
-from sqlalchemy import or_
+from services.draft_record import get_draft
+from services.draft_search import get_draft_search
+from services.match_bitmap import PATCH, BitmapQuery, get_match_bitmaps
+from views.components import THUMB_SIZE, hero_thumbnail_src, render_bp_visual
+from sqlalchemy.orm import selectinload
+
+SIMILAR_MAX_RESULTS = 30
+
+def hero_option_label(hm, hid):
+    h = hm.get_hero(hid)
+    return f"{h.get('cn_name')} ({h.get('en_name')})"
+
+def render_similar_drafts(db, hm):
+    """相似 BP 搜索: 在全库位图索引上按 Jaccard 排序，结果用 BP 图展示"""
+    hero_ids = sorted(hm.heroes, key=lambda hid: hm.get_hero(hid).get('en_name') or "")
+    fmt = lambda hid: hero_option_label(hm, hid)
+
+    c1, c2 = st.columns(2)
+    q_picks = c1.multiselect("阵容 (Pick)", options=hero_ids, format_func=fmt, max_selections=5)
+    q_bans = c2.multiselect("禁用 (Ban，可选)", options=hero_ids, format_func=fmt)
+
+    match_teams = sorted({r[0] for r in db.query(Match.team_name).distinct().all() if r[0]})
+    c3, c4, c5 = st.columns(3)
+    team = c3.selectbox("限定战队", options=[None] + match_teams, format_func=lambda t: t or "所有战队")
+    min_overlap = c4.number_input("至少包含几个所选 Pick", min_value=0, max_value=max(len(q_picks), 0), value=min(3, len(q_picks)))
+    since = c5.date_input("比赛日期 (起始)", value=None, key="similar_since")
+
+    if not q_picks and not q_bans:
+        st.info("选择英雄后按相似度搜索历史比赛。")
+        return
+
+    index = get_draft_search()
+    results = index.search(q_picks, q_bans, team=team, start_date=since, min_overlap=min_overlap, n=SIMILAR_MAX_RESULTS)
+    if not results:
+        st.info("没有找到相似的比赛。")
+        return
+
+    wins = sum(r.win for r in results)
+    st.caption(f"在 {len(index)} 场比赛中找到 {len(results)} 场 (最多显示 {SIMILAR_MAX_RESULTS} 场)，匹配一方战绩 {wins}-{len(results) - wins}")
+
+    matches = {
+        m.id: m for m in db.query(Match).options(
+            selectinload(Match.pick_bans),
+            selectinload(Match.players)
+        ).filter(Match.id.in_([r.match_pk for r in results])).all()
+    }
+    for r in results:
+        match = matches.get(r.match_pk)
+        if match is None:
+            continue
+        draft = get_draft(match)
+        res_emoji = "✅" if r.win else "❌"
+        when = r.match_time.strftime('%Y-%m-%d') if r.match_time else "-"
+        header_text = f"{r.similarity:.0%} | {when} | {r.team_name} vs {r.opponent_name} | {res_emoji} | Pick 重合 {r.overlap}" + (f" / Ban 重合 {r.ban_overlap}" if q_bans else "")
+        with st.expander(header_text):
+            st.caption(f"ID: {r.match_id}")
+            render_bp_visual(draft, draft.radiant_name, draft.dire_name, hm, first_pick_radiant=draft.radiant_first, layout="side-by-side")
 
 def show():
     st.title("比赛列表")
     
     db = next(get_db())
     hm = HeroManager()
+
+    mode = st.radio("模式", ["按条件筛选", "相似 BP 搜索"], horizontal=True, label_visibility="collapsed")
+    if mode == "相似 BP 搜索":
+        render_similar_drafts(db, hm)
+        db.close()
+        return
     
     # --- Sidebar Filters ---
     st.sidebar.header("筛选条件")
@@ -19,41 +80,56 @@ def show():
     
     leagues = db.query(League).order_by(League.league_id.desc()).all()
     league_options = {f"{l.name} ({l.tier})" : l.league_id for l in leagues}
-    league_options["所有联赛"] = None
     
-    selected_league_label = st.sidebar.selectbox(
+    selected_league_labels = st.sidebar.multiselect(
         "联赛", 
-        options=list(league_options.keys()), 
-        index=len(league_options)-1
+        options=list(league_options.keys()),
+        placeholder="所有联赛"
     )
-    selected_league_id = league_options[selected_league_label]
+    selected_league_ids = tuple(league_options[l] for l in selected_league_labels)
     
     match_teams = [r[0] for r in db.query(Match.team_name).distinct().all()]
     selected_teams = st.sidebar.multiselect("队伍", options=match_teams)
     
     date_filter = st.sidebar.date_input("比赛日期 (起始)", value=None)
 
-    # --- Query Data ---
-    query = db.query(Match)
-    
-    if search_id:
-        query = query.filter(Match.match_id.contains(search_id))
-    
-    if selected_league_id:
-        query = query.filter(Match.league_id == selected_league_id)
+    index = get_match_bitmaps()
+    selected_patches = st.sidebar.multiselect("版本", options=index.values(PATCH), placeholder="所有版本")
+
+    tri_state = {"不限": None, "是": True, "否": False}
+    with st.sidebar.expander("BP 条件 (以所选队伍为我方)"):
+        side = st.radio("阵营", ["不限", "天辉", "夜魇"], horizontal=True)
+        first_pick = st.radio("先选", list(tri_state), horizontal=True)
+        hero_ids = sorted(hm.heroes, key=lambda hid: hm.get_hero(hid).get('en_name') or "")
+        fmt = lambda hid: hero_option_label(hm, hid)
+        my_picks = st.multiselect("我方选了", options=hero_ids, format_func=fmt)
+        opp_picks = st.multiselect("对手选了", options=hero_ids, format_func=fmt)
+        my_bans = st.multiselect("我方禁了", options=hero_ids, format_func=fmt)
+        opp_bans = st.multiselect("对手禁了", options=hero_ids, format_func=fmt)
+
+    # --- Query Data (bitmap index, no SQL per filter) ---
+    bits = index.evaluate(BitmapQuery(
+        teams=tuple(selected_teams),
+        league_ids=selected_league_ids,
+        patches=tuple(selected_patches),
+        is_radiant={"不限": None, "天辉": True, "夜魇": False}[side],
+        first_pick=tri_state[first_pick],
+        start_date=date_filter,
+        my_picks=tuple(my_picks),
+        opp_picks=tuple(opp_picks),
+        my_bans=tuple(my_bans),
+        opp_bans=tuple(opp_bans),
+        match_id_contains=search_id
+    ))
+    pks = index.match_pks(bits, limit=50)
     
-    if selected_teams:
-        query = query.filter(
-            or_(
-                Match.team_name.in_(selected_teams),
-                Match.opponent_name.in_(selected_teams)
-            )
-        )
-        
-    if date_filter:
-        query = query.filter(Match.match_time >= date_filter)
-        
-    matches = query.order_by(Match.match_time.desc()).limit(50).all()
+    by_pk = {
+        m.id: m for m in db.query(Match).options(
+            selectinload(Match.pick_bans),
+            selectinload(Match.players)
+        ).filter(Match.id.in_(pks)).all()
+    } if pks else {}
+    matches = [by_pk[pk] for pk in pks if pk in by_pk]
     
     if not matches:
         st.info("暂无符合条件的比赛数据。")
@@ -80,13 +156,14 @@ def show():
 
     # --- Display List ---
     for match in matches:
+        draft = get_draft(match)
         res_emoji = "✅" if match.win else "❌"
         header_text = f"{match.match_time.strftime('%Y-%m-%d %H:%M')} | {match.team_name} vs {match.opponent_name} | {res_emoji}"
         
         with st.expander(header_text):
             # --- Header with Logos ---
-            rad_name = match.team_name if match.is_radiant else match.opponent_name
-            dire_name = match.opponent_name if match.is_radiant else match.team_name
+            rad_name = draft.radiant_name
+            dire_name = draft.dire_name
             
             rad_logo = get_team_logo(rad_name)
             dire_logo = get_team_logo(dire_name)
@@ -110,7 +187,7 @@ def show():
             st.write("#### BP 流程")
             
             # Determine First Pick Team
-            is_radiant_first = (match.is_radiant == match.first_pick)
+            is_radiant_first = draft.radiant_first
             
             # Render visual (side-by-side with HTML strip if needed, or controlled by component)
             # User Req: "图像缩小到原来的66 % 并且和后面的html左右放置在页面中。不要上下放置"
@@ -119,49 +196,52 @@ def show():
             # Ideally, render_bp_visual should return the image and we handle layout here.
             
             # Refactored usage:
-            render_bp_visual(match.pick_bans, rad_name, dire_name, hm, first_pick_radiant=is_radiant_first, layout="side-by-side")
+            render_bp_visual(draft, rad_name, dire_name, hm, first_pick_radiant=is_radiant_first, layout="side-by-side")
             
             st.divider()
             
             # --- Player Data ---
             st.write("#### 选手详情")
             
-            rad_players = sorted([p for p in match.players if p.team_side == 0], key=lambda x: x.position if x.position > 0 else 99)
-            dire_players = sorted([p for p in match.players if p.team_side == 1], key=lambda x: x.position if x.position > 0 else 99)
+            def ordered_players(side):
+                # Returns [(display_pos, PlayerSlot)]
+                players = draft.side_players(side)
+                by_pos = sorted(players, key=lambda x: x.position if x.position > 0 else 99)
+                # Fallback: no position data -> keep entry order as Pos 1-5
+                if by_pos and by_pos[0].position == 0:
+                    return [(i + 1, p) for i, p in enumerate(players)]
+                return [(p.position, p) for p in by_pos]
             
-            # Fallback sort
-            if rad_players and rad_players[0].position == 0:
-                rad_players.sort(key=lambda x: x.id)
-                for i, p in enumerate(rad_players): p.position = i + 1
-            if dire_players and dire_players[0].position == 0:
-                dire_players.sort(key=lambda x: x.id)
-                for i, p in enumerate(dire_players): p.position = i + 1
+            rad_players = ordered_players(0)
+            dire_players = ordered_players(1)
             
             c_left, c_right = st.columns(2)
             
             with c_left:
                 st.caption(f"🟢 {rad_name}")
-                for p in rad_players:
+                for pos, p in rad_players:
                     h = hm.get_hero(p.hero_id)
                     p_name = get_player_display_name(p)
                     
                     r1, r2, r3, r4 = st.columns([1, 1, 3, 3])
-                    with r1: st.markdown(f"**Pos {p.position}**")
+                    with r1: st.markdown(f"**Pos {pos}**")
                     with r2: 
-                        if h.get('icon_url'): st.image(h.get('icon_url'), width=30)
+                        icon = hero_thumbnail_src(h, THUMB_SIZE)
+                        if icon: st.image(icon, width=30)
                     with r3: st.caption(h.get('cn_name'))
                     with r4: st.write(p_name)
 
             with c_right:
                 st.caption(f"🔴 {dire_name}")
-                for p in dire_players:
+                for pos, p in dire_players:
                     h = hm.get_hero(p.hero_id)
                     p_name = get_player_display_name(p)
                     
                     r1, r2, r3, r4 = st.columns([1, 1, 3, 3])
-                    with r1: st.markdown(f"**Pos {p.position}**")
+                    with r1: st.markdown(f"**Pos {pos}**")
                     with r2: 
-                        if h.get('icon_url'): st.image(h.get('icon_url'), width=30)
+                        icon = hero_thumbnail_src(h, THUMB_SIZE)
+                        if icon: st.image(icon, width=30)
                     with r3: st.caption(h.get('cn_name'))
                     with r4: st.write(p_name)
 
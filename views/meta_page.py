@@ -0,0 +1,69 @@
+import streamlit as st
+import pandas as pd
+from database import get_db
+from services.hero_manager import HeroManager
+from services.meta_stats import FIRST_PHASE_LAST_ORDER, get_meta_index
+from views.components import hero_icon_uri
+
+
+def show():
+    st.title("版本生态")
+    st.caption("全库所有战队的英雄 Pick / Ban 数据，同一场比赛的双视角记录只计一次。")
+
+    db = next(get_db())
+    hm = HeroManager()
+    meta = get_meta_index()
+
+    patches = meta.patches()
+    if not patches:
+        st.info("暂无比赛数据。")
+        return
+
+    c1, c2, c3 = st.columns([1, 2, 1])
+    selected_patches = c1.multiselect("版本", options=patches, default=patches[:1])
+    selected_tiers = c2.multiselect("联赛级别", options=meta.tiers(db), help="scrim = 训练赛")
+    min_games = c3.number_input("最少争夺场次", min_value=0, value=1)
+
+    games, rows = meta.hero_meta(db, selected_patches, selected_tiers)
+    if games == 0:
+        st.warning("该范围内无比赛数据。")
+        return
+
+    st.metric("比赛场次", games)
+
+    data = []
+    for r in rows:
+        if r.contested < min_games:
+            continue
+        h = hm.get_hero(r.hero_id)
+        data.append({
+            "icon": hero_icon_uri(h),
+            "英雄": h.get('cn_name') or h.get('en_name'),
+            "争夺率": r.contest_rate * 100,
+            "选取率": r.pick_rate * 100,
+            "禁用率": r.ban_rate * 100,
+            "胜率": r.win_rate * 100,
+            "一阶段优先级": r.first_phase_rate * 100,
+            "选取": r.picks,
+            "禁用": r.bans
+        })
+
+    if not data:
+        st.info("无符合条件的英雄。")
+        return
+
+    df = pd.DataFrame(data).sort_values("争夺率", ascending=False)
+    pct = lambda label, help_text=None: st.column_config.NumberColumn(label, format="%.1f%%", help=help_text)
+    st.dataframe(
+        df,
+        column_config={
+            "icon": st.column_config.ImageColumn("头像", width="small"),
+            "争夺率": pct("争夺率", "被 Pick 或 Ban 的场次占比"),
+            "选取率": pct("选取率"),
+            "禁用率": pct("禁用率"),
+            "胜率": pct("胜率", "被选取时的胜率"),
+            "一阶段优先级": pct("一阶段优先级", f"在前 {FIRST_PHASE_LAST_ORDER} 手 (第一轮 Ban/Pick) 被 Pick 或 Ban 的场次占比")
+        },
+        hide_index=True,
+        width="stretch"
+    )
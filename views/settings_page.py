@@ -231,6 +231,13 @@ def show():
     with tab2:
         st.write("配置英雄别名 (Slang)。")
         hm = HeroManager()
+        if st.button("从 OpenDota 更新英雄列表与头像"):
+            with st.spinner("正在拉取英雄数据并同步头像..."):
+                count = hm.fetch_and_update_system_data()
+            if count:
+                st.success(f"已更新 {count} 个英雄。")
+            else:
+                st.error("拉取英雄数据失败")
         csv_data = hm.export_csv()
         st.download_button("下载 CSV", data=csv_data, file_name="heroes_config.csv", mime="text/csv")
         uploaded_file = st.file_uploader("上传 CSV", type=["csv"])